@@ -6,9 +6,17 @@ import warnings
 os.environ["HF_HUB_DISABLE_SYMLINKS_WARNING"] = "1"
 warnings.filterwarnings("ignore", category=FutureWarning, module="google.generativeai")
 
-from ui.sidebar import render_sidebar
+from ui.sidebar import render_sidebar, render_timings
 from ui.styles import apply_styles
-from core.rag_pipeline import get_rag_response, index_document
+from core.config import get_setting
+from core.service_client import RemoteCorpus
+from core.telemetry import Trace
+from core.warmup import start_warmup
+
+# The RAG pipeline (LangChain, Gemini SDK, local model) is only imported on the
+# Chat page; meanwhile a background thread imports and loads it once per process.
+if not get_setting("RAG_SERVICE_URL"):
+    start_warmup()
 
 # ✅ Base directory & Icon
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -124,44 +132,60 @@ if page == "Home":
 # 4️⃣ CHAT PAGE (Your existing RAG page)
 # ----------------------------
 elif page == "Chat":
+    from core.rag_pipeline import get_rag_response
+    from core.corpus import Corpus
+    from core.memory import ConversationMemory
 
     st.title("💬 Chat with your Documents")
 
     # ----------------------------
     # Controls (Search & Upload)
     # ----------------------------
-    uploaded_file = st.sidebar.file_uploader(
-        "📂 Upload your document",
-        type=["pdf", "txt", "docx", "xlsx", "csv", "md"]
+    uploaded_files = st.sidebar.file_uploader(
+        "📂 Upload your documents",
+        type=["pdf", "txt", "docx", "xlsx", "csv", "md"],
+        accept_multiple_files=True
     )
     
     # ----------------------------
     # 🧠 Efficient Caching Logic
     # ----------------------------
-    if uploaded_file:
-        # Only process if it's a new file
-        if "last_uploaded_file" not in st.session_state or st.session_state.last_uploaded_file != uploaded_file.name:
-            with st.spinner("🧠 Processing document... (This happens only once)"):
-                vectorstore, chunks = index_document(uploaded_file)
-                st.session_state.vector_store = vectorstore
-                st.session_state.chunks = chunks
-                st.session_state.last_uploaded_file = uploaded_file.name
-                st.sidebar.success("Document indexed successfully!")
-    else:
-        # Reset if file is removed
-        if "last_uploaded_file" in st.session_state:
-            del st.session_state.last_uploaded_file
-            del st.session_state.vector_store
-            del st.session_state.chunks
-
-    if uploaded_file is not None:
-        pass # Success message handled above
+    # All uploads share one corpus index: only new files are embedded,
+    # removed files are deleted from the index without a rebuild.
+    # With RAG_SERVICE_URL set, indexing and answering run in the service (server.py).
+    if "corpus" not in st.session_state:
+        service_url = get_setting("RAG_SERVICE_URL")
+        st.session_state.corpus = RemoteCorpus(service_url) if service_url else Corpus()
+    corpus = st.session_state.corpus
+    remote = isinstance(corpus, RemoteCorpus)
+
+    with st.spinner("🧠 Processing documents... (Each file is indexed only once)"):
+        added, removed = corpus.sync(uploaded_files or [])
+    if added:
+        st.sidebar.success(f"Indexed {added} new document(s)!")
+    for error in corpus.failures.values():
+        st.sidebar.error(f"⚠️ {error}")
+
+    # Restrict answers to some documents
+    selected_sources = None
+    if len(corpus) > 1:
+        selected_sources = st.sidebar.multiselect(
+            "🔎 Search in",
+            corpus.sources,
+            default=corpus.sources
+        )
 
     # Clear Chat Button
     if st.sidebar.button("🗑️ Clear Conversation"):
         st.session_state.messages = []
+        st.session_state.memory = ConversationMemory()
+        if remote:
+            corpus.new_session()
         st.rerun()
 
+    # Optional per-stage timing breakdown of the last answer
+    show_timings = st.sidebar.toggle("⏱️ Show timings", value=False)
+
     # Search Toggle - Placed in main area for visibility
     enable_search = st.toggle("🌍 Enable Web Search", value=False)
 
@@ -170,6 +194,9 @@ elif page == "Chat":
     # ----------------------------
     if "messages" not in st.session_state:
         st.session_state.messages = []
+    # Bounded prompt history: recent window + running summary + recall of older turns
+    if "memory" not in st.session_state:
+        st.session_state.memory = ConversationMemory()
 
     # Welcome Placeholder
     if not st.session_state.messages:
@@ -199,14 +226,25 @@ elif page == "Chat":
             status_placeholder = st.empty()
             status_placeholder.markdown("Thinking... 🤔")
 
-            # Retrieve cached data
-            vectorstore = st.session_state.get("vector_store")
-            chunks = st.session_state.get("chunks")
-
             # Get chat history (excluding the current message which was just appended)
             chat_history = st.session_state.messages[:-1]
 
-            stream = get_rag_response(user_prompt, vectorstore, chunks, chat_history=chat_history, enable_search=enable_search)
+            if remote:
+                stream = corpus.query(
+                    user_prompt, chat_history=chat_history, enable_search=enable_search, sources=selected_sources
+                )
+            else:
+                # Retrieve cached data
+                vectorstore = corpus.vectorstore
+                chunks = corpus.get_chunks(selected_sources)
+
+                st.session_state.last_trace = Trace("query")
+                stream = get_rag_response(
+                    user_prompt, vectorstore, chunks,
+                    chat_history=chat_history, enable_search=enable_search, sources=selected_sources,
+                    lexical_index=corpus.lexical_index, corpus_key=corpus.fingerprint,
+                    memory=st.session_state.memory, trace=st.session_state.last_trace, tables=corpus.tables
+                )
             
             def stream_with_status():
                 first = True
@@ -219,6 +257,10 @@ elif page == "Chat":
             
             ai_response = st.write_stream(stream_with_status())
             status_placeholder.empty()
+            if remote:
+                st.session_state.last_trace = corpus.last_trace
 
         st.session_state.messages.append({"role": "assistant", "content": ai_response})
 
+    if show_timings:
+        render_timings(st.session_state.get("last_trace"))
@@ -0,0 +1,220 @@
+"""
+Answers a file of questions against indexed documents, without the UI.
+
+    python batch_qa.py report.pdf notes.docx --questions questions.jsonl --output answers.jsonl
+    python batch_qa.py report.pdf --questions questions.jsonl --output answers.jsonl --offline
+
+Each question line is a JSON object {"question", "id"?, "sources"?, "enable_search"?,
+"chat_history"?} or a bare JSON string. Files are indexed through `index_document`,
+so documents already in the index cache are loaded instead of re-embedded.
+
+Each answer line holds the question's id, the answer, the docstore IDs of the
+chunks in the prompt and the per-stage timings. Rerunning with the same output
+file skips questions already answered and retries those that failed.
+Questions run on a pool of `--workers` threads (by default BATCH_QA_WORKERS_PER_KEY
+per configured API key), started at most `--requests-per-minute` per key.
+
+With --offline, the LLM, embeddings and web search are replaced by the
+deterministic stand-ins in benchmarks/fakes.py: no API key or network needed.
+Progress goes to stderr; pipeline log output is hidden unless --verbose.
+"""
+import argparse
+import contextlib
+import hashlib
+import json
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from core.config import get_google_api_keys, get_setting
+from core.telemetry import Trace
+from core.throttle import RateLimiter
+
+DEFAULT_WORKERS_PER_KEY = 2
+# Seconds between progress lines
+PROGRESS_INTERVAL = 2.0
+
+
+def question_id(record):
+    """The question's "id", or a stable hash of its text so reruns can match it."""
+    if record.get("id") is not None:
+        return str(record["id"])
+    return hashlib.sha256(record["question"].encode("utf-8")).hexdigest()[:16]
+
+
+def read_questions(path):
+    """Yields question records (dicts with "id" and "question") from a JSONL file."""
+    with open(path, encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError as e:
+                print(f"⚠️ Skipping line {line_number} of {path}: {e}", file=sys.stderr)
+                continue
+            if isinstance(record, str):
+                record = {"question": record}
+            question = (record.get("question") or record.get("query") or "").strip()
+            if not question:
+                print(f"⚠️ Skipping line {line_number} of {path}: no question", file=sys.stderr)
+                continue
+            record["question"] = question
+            record["id"] = question_id(record)
+            yield record
+
+
+def load_answered(path):
+    """
+    IDs already answered in an earlier run's output. The file is rewritten
+    without failed or truncated lines, so retried questions appear only once.
+    """
+    if not os.path.exists(path):
+        return set()
+    kept = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if "error" not in record:
+                kept.append(record)
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        for record in kept:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+    os.replace(temp_path, path)
+    return {record["id"] for record in kept}
+
+
+def load_corpus(paths):
+    """Indexes the files into one Corpus (through the index cache)."""
+    from core.corpus import Corpus
+    from core.corpus_registry import UploadedBytes
+
+    from ingestion.loader import DocumentLoadError
+
+    corpus = Corpus()
+    for path in paths:
+        with open(path, "rb") as f:
+            file = UploadedBytes(f.read(), os.path.basename(path))
+        try:
+            fingerprint = corpus.add_document(file)
+        except DocumentLoadError as e:
+            print(f"⚠️ {e}", file=sys.stderr)
+            continue
+        if fingerprint is None:
+            print(f"⚠️ No text could be extracted from {path}", file=sys.stderr)
+    return corpus
+
+
+def answer_question(record, corpus, corpus_key, limiter):
+    """Runs one question through `get_rag_response`; returns its output record."""
+    from core.rag_pipeline import get_rag_response
+
+    limiter.acquire()
+    trace = Trace("query", question=record["id"])
+    result = {"id": record["id"], "question": record["question"]}
+    try:
+        answer = "".join(get_rag_response(
+            record["question"], corpus.vectorstore, corpus.get_chunks(record.get("sources")),
+            chat_history=record.get("chat_history"), enable_search=bool(record.get("enable_search")),
+            sources=record.get("sources"), lexical_index=corpus.lexical_index,
+            corpus_key=corpus_key, trace=trace, tables=corpus.tables,
+        ))
+    except Exception as e:
+        result["error"] = f"{type(e).__name__}: {e}"
+        return result
+    result.update({
+        "answer": answer,
+        "chunk_ids": trace.attributes.get("chunk_ids", []),
+        "cached": bool(trace.attributes.get("cached")),
+        "seconds": round(trace.seconds if trace.seconds is not None else trace.elapsed(), 4),
+        "timings": {stage: round(seconds, 4) for stage, seconds in trace.breakdown().items()},
+    })
+    return result
+
+
+def run(args):
+    """Answers every unanswered question; returns {"answered", "failed", "skipped", "seconds"}."""
+    answered = load_answered(args.output)
+    corpus = load_corpus(args.files)
+    corpus_key = corpus.fingerprint
+    print(f"✅ Indexed {len(corpus)} document(s)", file=sys.stderr)
+
+    keys = max(1, len(get_google_api_keys()))
+    workers = args.workers or keys * get_setting("BATCH_QA_WORKERS_PER_KEY", DEFAULT_WORKERS_PER_KEY, cast=int)
+    limiter = RateLimiter(args.requests_per_minute * keys)
+
+    counts = {"answered": 0, "failed": 0, "skipped": 0}
+    started = last_report = time.perf_counter()
+    pending = set()
+    questions = iter(read_questions(args.questions))
+
+    def report(final=False):
+        elapsed = time.perf_counter() - started
+        done = counts["answered"] + counts["failed"]
+        rate = done / elapsed if elapsed else 0.0
+        prefix = "✅ Finished:" if final else "⏳"
+        print(f"{prefix} {counts['answered']} answered, {counts['failed']} failed, "
+              f"{counts['skipped']} skipped ({rate:.2f} questions/s, {elapsed:.1f}s)", file=sys.stderr)
+
+    with open(args.output, "a", encoding="utf-8") as out, \
+            ThreadPoolExecutor(max_workers=workers, thread_name_prefix="batch-qa") as executor:
+        exhausted = False
+        while pending or not exhausted:
+            # Keep a bounded number of questions in flight, so huge files are streamed
+            while not exhausted and len(pending) < workers * 2:
+                record = next(questions, None)
+                if record is None:
+                    exhausted = True
+                elif record["id"] in answered:
+                    counts["skipped"] += 1
+                else:
+                    answered.add(record["id"])
+                    pending.add(executor.submit(answer_question, record, corpus, corpus_key, limiter))
+            if not pending:
+                break
+            finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in finished:
+                result = future.result()
+                counts["failed" if "error" in result else "answered"] += 1
+                out.write(json.dumps(result, ensure_ascii=False) + "\n")
+            out.flush()
+            if time.perf_counter() - last_report >= PROGRESS_INTERVAL:
+                last_report = time.perf_counter()
+                report()
+    report(final=True)
+    return {**counts, "seconds": round(time.perf_counter() - started, 3)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Answer a JSONL file of questions against documents.")
+    parser.add_argument("files", nargs="+", help="documents to index (pdf, txt, md, docx, xlsx, csv)")
+    parser.add_argument("--questions", required=True, help="JSONL file of questions")
+    parser.add_argument("--output", required=True, help="JSONL file answers are appended to")
+    parser.add_argument("--workers", type=int, default=0,
+                        help="questions answered concurrently (default: BATCH_QA_WORKERS_PER_KEY per API key)")
+    parser.add_argument("--requests-per-minute", type=float,
+                        default=get_setting("BATCH_QA_REQUESTS_PER_MINUTE", 0, cast=float),
+                        help="questions started per minute per API key (default: unlimited)")
+    parser.add_argument("--offline", action="store_true", help="use the offline stand-ins from benchmarks/fakes.py")
+    parser.add_argument("--verbose", action="store_true", help="show pipeline log output")
+    args = parser.parse_args(argv)
+
+    if args.offline:
+        from benchmarks.fakes import install_fakes
+        install_fakes()
+
+    with contextlib.ExitStack() as stack:
+        if not args.verbose:
+            stack.enter_context(contextlib.redirect_stdout(stack.enter_context(open(os.devnull, "w"))))
+        summary = run(args)
+    return 1 if summary["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
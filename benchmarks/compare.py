@@ -0,0 +1,91 @@
+"""
+Compares two benchmark reports and exits non-zero on regressions.
+
+    python -m benchmarks.compare baseline.json current.json --tolerance 0.1
+"""
+import argparse
+import json
+import sys
+
+DEFAULT_TOLERANCE = 0.10
+# Config keys that do not change what is measured
+OUTPUT_OPTIONS = ("output", "verbose")
+# Metric name suffixes and whether a larger value is better
+HIGHER_IS_BETTER = ("_per_s",)
+LOWER_IS_BETTER = ("_ms", "_seconds", "_bytes")
+
+
+def flatten(report, prefix=""):
+    """{"query.latency.p95_ms": 12.3, ...} for every numeric leaf outside meta/config."""
+    flat = {}
+    for key, value in report.items():
+        if not prefix and key in ("meta", "config"):
+            continue
+        path = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(flatten(value, f"{path}."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[path] = value
+    return flat
+
+
+def direction(metric):
+    """+1 if higher is better, -1 if lower is better, 0 if the metric is informational."""
+    name = metric.rsplit(".", 1)[-1]
+    if name.startswith("recall") or name.endswith(HIGHER_IS_BETTER):
+        return 1
+    if name.endswith(LOWER_IS_BETTER) or name == "peak_rss_mb":
+        return -1
+    return 0
+
+
+def compare(baseline, current, tolerance=DEFAULT_TOLERANCE):
+    """
+    Returns [(metric, baseline, current, relative change, regressed)] for metrics
+    present in both reports. A metric regresses when it moves the wrong way by
+    more than `tolerance` (a fraction of the baseline).
+    """
+    before, after = flatten(baseline), flatten(current)
+    rows = []
+    for metric in sorted(before.keys() & after.keys()):
+        sign = direction(metric)
+        old, new = before[metric], after[metric]
+        change = (new - old) / abs(old) if old else 0.0
+        rows.append((metric, old, new, change, sign != 0 and sign * change < -tolerance))
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare two benchmark reports.")
+    parser.add_argument("baseline")
+    parser.add_argument("current")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="allowed relative change in the wrong direction (default 0.10)")
+    args = parser.parse_args(argv)
+
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)
+    with open(args.current, encoding="utf-8") as f:
+        current = json.load(f)
+
+    differing = sorted(
+        key for key in baseline.get("config", {}).keys() | current.get("config", {}).keys()
+        if key not in OUTPUT_OPTIONS and baseline["config"].get(key) != current["config"].get(key)
+    )
+    if differing:
+        print(f"⚠️ Reports were run with different settings ({', '.join(differing)}); changes may not be regressions")
+
+    rows = compare(baseline, current, args.tolerance)
+    regressions = [row for row in rows if row[4]]
+    for metric, old, new, change, regressed in rows:
+        marker = "⚠️ " if regressed else "   "
+        print(f"{marker}{metric:55} {old:>12} → {new:>12} ({change:+.1%})")
+    if regressions:
+        print(f"⚠️ {len(regressions)} metric(s) regressed by more than {args.tolerance:.0%}")
+        return 1
+    print("✅ No regressions")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,139 @@
+import io
+import os
+import random
+
+# Lines per generated page and characters per line (fits a Letter page in 10pt Helvetica)
+LINES_PER_PAGE = 40
+LINE_CHARS = 90
+SAMPLE_FILES = ("README.md", "LangExtractDocs.md", "TODO.md")
+
+_TOPICS = {
+    "hydraulics": "pump valve pressure flow seal piston cylinder reservoir hose fitting",
+    "electrical": "voltage current relay breaker circuit wiring fuse ground sensor terminal",
+    "maintenance": "inspection schedule lubrication torque wear replacement interval checklist log",
+    "safety": "hazard lockout guard helmet training incident evacuation warning permit",
+    "finance": "budget invoice payment quarter revenue cost forecast audit ledger margin",
+}
+_FILLER = "the a of and to in for with on is are was by this that each must should".split()
+
+
+class NamedBytesIO(io.BytesIO):
+    """In-memory file with a `name`, like a Streamlit UploadedFile."""
+
+    def __init__(self, data, name):
+        super().__init__(data)
+        self.name = name
+
+
+def _sentence(rng, topic, identifier):
+    words = _TOPICS[topic].split()
+    body = [rng.choice(words if rng.random() < 0.5 else _FILLER) for _ in range(rng.randint(8, 16))]
+    if rng.random() < 0.2:
+        body.insert(rng.randrange(len(body)), identifier)
+    return " ".join(body).capitalize() + "."
+
+
+def generate_pages(pages, seed=0):
+    """
+    Synthetic page texts: each page covers one topic, with part numbers like
+    PN-0042 sprinkled in so exact-lookup queries have something to find.
+    """
+    rng = random.Random(seed)
+    topics = sorted(_TOPICS)
+    texts = []
+    for page in range(pages):
+        topic = topics[(page // 3) % len(topics)]
+        identifier = f"PN-{page:04d}"
+        lines = []
+        line = ""
+        while len(lines) < LINES_PER_PAGE:
+            sentence = _sentence(rng, topic, identifier)
+            if len(line) + len(sentence) + 1 > LINE_CHARS:
+                lines.append(line)
+                line = sentence
+            else:
+                line = f"{line} {sentence}".strip()
+        texts.append("\n".join(lines))
+    return texts
+
+
+def _pdf_escape(text):
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def make_pdf(page_texts):
+    """Minimal text PDF (Helvetica, one text object per page) with a valid xref table."""
+    count = len(page_texts)
+    kids = " ".join(f"{4 + 2 * i} 0 R" for i in range(count))
+    objects = [
+        "<< /Type /Catalog /Pages 2 0 R >>",
+        f"<< /Type /Pages /Kids [{kids}] /Count {count} >>",
+        "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    for i, text in enumerate(page_texts):
+        lines = " T* ".join(f"({_pdf_escape(line)}) Tj" for line in text.split("\n"))
+        stream = f"BT /F1 10 Tf 12 TL 40 760 Td {lines} ET"
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {5 + 2 * i} 0 R >>"
+        )
+        objects.append(f"<< /Length {len(stream.encode('latin-1'))} >>\nstream\n{stream}\nendstream")
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, obj in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += f"{number} 0 obj\n{obj}\nendobj\n".encode("latin-1")
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode("latin-1")
+    out += "".join(f"{offset:010d} 00000 n \n" for offset in offsets).encode("latin-1")
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode("latin-1")
+    return bytes(out)
+
+
+def generated_corpus(pages, documents=1, file_format="pdf", seed=0):
+    """
+    `documents` generated files totalling about `pages` pages, as PDF or TXT.
+    Returns [(file, page count)].
+    """
+    files = []
+    per_document = max(1, pages // documents)
+    for d in range(documents):
+        texts = generate_pages(per_document, seed=seed + d)
+        if file_format == "pdf":
+            data = make_pdf(texts)
+        else:
+            data = "\n\n".join(texts).encode("utf-8")
+        files.append((NamedBytesIO(data, f"generated-{d + 1}.{file_format}"), per_document))
+    return files
+
+
+def sample_corpus(root=None):
+    """The repository's own Markdown files, as [(file, page count)]; text files count as one page."""
+    root = root or os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    files = []
+    for name in SAMPLE_FILES:
+        path = os.path.join(root, name)
+        if os.path.exists(path):
+            with open(path, "rb") as f:
+                files.append((NamedBytesIO(f.read(), name), 1))
+    return files
+
+
+def make_queries(chunks, count, seed=0):
+    """
+    Questions drawn from the corpus: a clause from a random chunk, with some
+    exact part-number lookups mixed in.
+    """
+    rng = random.Random(seed)
+    queries = []
+    for _ in range(count):
+        text = rng.choice(chunks).page_content
+        words = text.split()
+        identifiers = [w.strip(".,") for w in words if w.startswith("PN-")]
+        if identifiers and rng.random() < 0.25:
+            queries.append(rng.choice(identifiers))
+            continue
+        start = rng.randrange(max(1, len(words) - 8))
+        queries.append("What does the document say about " + " ".join(words[start:start + 8]).strip(".,") + "?")
+    return queries
@@ -0,0 +1,137 @@
+import os
+import time
+import zlib
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from core.lexical_index import TOKEN_PATTERN
+
+DEFAULT_DIM = 256
+
+
+class HashingEmbeddings(Embeddings):
+    """
+    Deterministic stand-in for Gemini and the local HuggingFace model.
+
+    Each token is hashed into one of `dim` signed buckets and the counts are
+    L2-normalized, so texts sharing words get similar vectors and retrieval,
+    chunking and recall behave like they would with a real model, offline and
+    reproducibly. `latency` seconds are slept per call to emulate an API round trip.
+    """
+
+    def __init__(self, dim=DEFAULT_DIM, latency=0.0):
+        self.dim = dim
+        self.latency = latency
+        self.calls = 0
+        self.texts = 0
+
+    def _vector(self, text):
+        vector = np.zeros(self.dim, dtype="float32")
+        for token in TOKEN_PATTERN.findall(text.lower()):
+            h = zlib.crc32(token.encode("utf-8"))
+            vector[h % self.dim] += 1.0 if h & 0x80000000 else -1.0
+        norm = np.linalg.norm(vector)
+        if norm == 0:
+            vector[0] = 1.0
+            return vector
+        return vector / norm
+
+    def embed_documents(self, texts):
+        self.calls += 1
+        self.texts += len(texts)
+        if self.latency:
+            time.sleep(self.latency)
+        return [self._vector(text).tolist() for text in texts]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+class FakeChunk:
+    """One streamed piece of a response, like google.generativeai's chunks."""
+
+    __slots__ = ("text",)
+
+    def __init__(self, text):
+        self.text = text
+
+
+class FakeLLM:
+    """
+    Stand-in for `generate_answer`: streams `tokens` words after `first_token_delay`
+    seconds, then one every `token_delay` seconds. Records prompt sizes so the
+    benchmark can report them.
+    """
+
+    def __init__(self, tokens=64, first_token_delay=0.0, token_delay=0.0):
+        self.tokens = tokens
+        self.first_token_delay = first_token_delay
+        self.token_delay = token_delay
+        self.prompt_chars = []
+
+    def __call__(self, prompt, temperature=0.3):
+        self.prompt_chars.append(len(prompt))
+        return self._stream(len(prompt))
+
+    def _stream(self, prompt_chars):
+        time.sleep(self.first_token_delay)
+        yield FakeChunk(f"Answer from a {prompt_chars}-character prompt.")
+        for i in range(self.tokens - 1):
+            if self.token_delay:
+                time.sleep(self.token_delay)
+            yield FakeChunk(f" word{i}")
+
+
+class FakeWebSearch:
+    """Stand-in for `search_web`: returns fixed results after `delay` seconds."""
+
+    def __init__(self, delay=0.0, results=3):
+        self.delay = delay
+        self.results = results
+        self.calls = 0
+
+    def __call__(self, query):
+        self.calls += 1
+        time.sleep(self.delay)
+        return "".join(
+            f"\nTitle: Result {i + 1} for {query}\nSnippet: Offline benchmark passage {i + 1} about {query}.\n"
+            f"URL: https://example.com/{i + 1}\n\n"
+            for i in range(self.results)
+        )
+
+
+# Caches would hide the work being measured; the rate limiter would throttle the fakes
+BENCHMARK_SETTINGS = {
+    "GOOGLE_API_KEY": "offline-benchmark",
+    "INDEX_CACHE_DISABLED": "1",
+    "EMBEDDING_CACHE_DISABLED": "1",
+    "ANSWER_CACHE_DISABLED": "1",
+    "EMBED_REQUESTS_PER_MINUTE": "1000000",
+}
+
+
+def install_fakes(embeddings=None, llm=None, web_search=None):
+    """
+    Points the pipeline at offline stand-ins: Gemini and local embeddings,
+    `generate_answer` and `search_web`. Settings in BENCHMARK_SETTINGS are applied
+    unless already set in the environment. Returns the (embeddings, llm, web_search) in use.
+    """
+    import core.embeddings
+    import core.memory
+    import core.rag_pipeline
+
+    for name, value in BENCHMARK_SETTINGS.items():
+        os.environ.setdefault(name, value)
+
+    embeddings = embeddings or HashingEmbeddings()
+    llm = llm or FakeLLM()
+    web_search = web_search or FakeWebSearch()
+
+    core.embeddings.get_embeddings_model = lambda api_key: embeddings
+    core.embeddings.get_local_embeddings = lambda: embeddings
+    core.rag_pipeline.get_local_embeddings = lambda: embeddings
+    core.rag_pipeline.generate_answer = llm
+    core.rag_pipeline.search_web = web_search
+    core.memory.generate_answer = llm
+    return embeddings, llm, web_search
@@ -0,0 +1,102 @@
+"""
+Measures cold import times of the app's entry points, each in a fresh interpreter.
+
+    python -m benchmarks.imports --repeat 5 --output imports.json
+    python -m benchmarks.compare baseline_imports.json imports.json
+
+"home_page" is everything app.py imports before a page is chosen, i.e. what the
+first page view waits for; the heavy pipeline modules should not be part of it.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Report name -> modules imported together
+IMPORT_TARGETS = {
+    "home_page": ("streamlit", "ui.sidebar", "ui.styles", "core.config", "core.service_client",
+                  "core.telemetry", "core.warmup"),
+    "rag_pipeline": ("core.rag_pipeline",),
+    "corpus": ("core.corpus",),
+    "server": ("server",),
+}
+DEFAULT_REPEAT = 3
+# Packages listed per target, by cumulative import time
+SLOWEST = 5
+
+_PROBE = """
+import sys, time
+started = time.perf_counter()
+for name in sys.argv[1:]:
+    __import__(name)
+print(time.perf_counter() - started)
+"""
+
+
+def _parse_importtime(stderr):
+    """[(module, depth, cumulative_us)] from `python -X importtime` output (depth 0: imported by the probe)."""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        _, cumulative_us, name = line[len("import time:"):].split("|")
+        # Nested imports are indented by two spaces per level
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        rows.append((name.strip(), depth, int(cumulative_us)))
+    return rows
+
+
+def measure(modules):
+    """Imports `modules` in a new interpreter; returns (wall seconds, importtime rows)."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", _PROBE, *modules],
+        cwd=REPO_ROOT, capture_output=True, text=True, check=True,
+    )
+    return float(result.stdout.strip().splitlines()[-1]), _parse_importtime(result.stderr)
+
+
+def import_report(targets=IMPORT_TARGETS, repeat=DEFAULT_REPEAT):
+    """{target: {"import_ms", "modules", "slowest": [...]}}, wall time is the median of `repeat` runs."""
+    report = {}
+    for target, modules in targets.items():
+        walls = []
+        rows = []
+        for _ in range(repeat):
+            wall, rows = measure(modules)
+            walls.append(wall)
+        report[target] = {
+            "import_ms": round(statistics.median(walls) * 1000, 1),
+            "modules": len(rows),
+            "slowest": [
+                {"module": name, "cumulative_ms": round(cumulative_us / 1000, 1)}
+                for name, _, cumulative_us in sorted(
+                    (row for row in rows if row[1] <= 1), key=lambda row: row[2], reverse=True
+                )[:SLOWEST]
+            ],
+        }
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Cold import times of the app's entry points (JSON report).")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT, help="fresh interpreters per target")
+    parser.add_argument("--output", help="write the JSON report here (default: stdout)")
+    args = parser.parse_args(argv)
+
+    report = {"config": vars(args), "imports": import_report(repeat=args.repeat)}
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+        print(f"✅ Import report written to {args.output}")
+    else:
+        print(text)
+    return report
+
+
+if __name__ == "__main__":
+    main()
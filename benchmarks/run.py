@@ -0,0 +1,279 @@
+"""
+Offline benchmark of ingestion, indexing, querying and cold imports.
+
+    python -m benchmarks.run --pages 200 --queries 100 --output bench.json
+    python -m benchmarks.compare baseline.json bench.json
+
+Gemini embeddings, the local model, `generate_answer` and `search_web` are
+replaced by deterministic stand-ins (see benchmarks/fakes.py), so runs need no
+API key or network and are comparable across commits.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+from benchmarks.corpora import generated_corpus, make_queries, sample_corpus
+from benchmarks.fakes import FakeLLM, FakeWebSearch, HashingEmbeddings, install_fakes
+from benchmarks.imports import import_report
+
+DEFAULT_PAGES = 50
+DEFAULT_QUERIES = 50
+DEFAULT_K = 10
+INDEX_KINDS = ("flat", "hnsw", "ivf")
+# Queries run before timing starts (thread pools, lazy imports)
+WARMUP_QUERIES = 2
+
+
+def peak_rss_mb():
+    """Peak resident memory of this process so far, in MB (ru_maxrss is KB on Linux, bytes on macOS)."""
+    scale = 1 if sys.platform == "darwin" else 1024
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale / 2 ** 20, 1)
+
+
+def latency_stats(seconds):
+    """p50/p95/p99/mean of a list of durations, in milliseconds."""
+    if not seconds:
+        return {}
+    ms = np.asarray(seconds) * 1000
+    return {
+        "p50_ms": round(float(np.percentile(ms, 50)), 3),
+        "p95_ms": round(float(np.percentile(ms, 95)), 3),
+        "p99_ms": round(float(np.percentile(ms, 99)), 3),
+        "mean_ms": round(float(ms.mean()), 3),
+    }
+
+
+def _rate(count, seconds):
+    return round(count / seconds, 2) if seconds > 0 else None
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except Exception:
+        return None
+
+
+def bench_ingestion(files):
+    """Loads every file with `load_document`; returns (documents, stats)."""
+    from ingestion.loader import load_document
+
+    documents = []
+    pages = 0
+    started = time.perf_counter()
+    for file, page_count in files:
+        documents.extend(load_document(file))
+        pages += page_count
+    seconds = time.perf_counter() - started
+    return documents, {
+        "files": len(files),
+        "pages": pages,
+        "documents": len(documents),
+        "seconds": round(seconds, 4),
+        "pages_per_s": _rate(pages, seconds),
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def bench_chunking(documents, embeddings):
+    """Runs both chunkers over the loaded documents; returns (chunks, stats)."""
+    from langchain_experimental.text_splitter import SemanticChunker
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+    from core.embeddings import encode_local
+    from core.rag_pipeline import CHUNK_OVERLAP, CHUNK_SIZE
+    from ingestion.chunker import PooledSemanticChunker
+    from ingestion.stream import split_stream
+
+    stats = {}
+    started = time.perf_counter()
+    chunks = list(split_stream(
+        iter(documents),
+        SemanticChunker(embeddings),
+        fallback_splitter=RecursiveCharacterTextSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP),
+    ))
+    seconds = time.perf_counter() - started
+    stats["semantic"] = {"chunks": len(chunks), "seconds": round(seconds, 4), "chunks_per_s": _rate(len(chunks), seconds)}
+
+    started = time.perf_counter()
+    pooled = list(PooledSemanticChunker(encode_local).stream(iter(documents)))
+    seconds = time.perf_counter() - started
+    stats["semantic_pooled"] = {"chunks": len(pooled), "seconds": round(seconds, 4), "chunks_per_s": _rate(len(pooled), seconds)}
+
+    stats["peak_rss_mb"] = peak_rss_mb()
+    return chunks, stats
+
+
+def bench_index(chunks, queries, embeddings, k=DEFAULT_K, kinds=INDEX_KINDS):
+    """
+    Builds the vector store with `create_vectorstore`, then one raw FAISS index per
+    kind over the same vectors, each measured for build time, memory and recall@k
+    against exact search. Returns (vectorstore, stats).
+    """
+    from core.embeddings import create_vectorstore
+    from ingestion.vector_store import (
+        build_faiss_index,
+        exact_neighbors,
+        index_kind,
+        index_memory_bytes,
+        index_vectors,
+        recall_at_k,
+    )
+
+    started = time.perf_counter()
+    vectorstore = create_vectorstore(iter(chunks))
+    seconds = time.perf_counter() - started
+    stats = {
+        "vectorstore": {
+            "vectors": vectorstore.index.ntotal,
+            "kind": index_kind(vectorstore.index),
+            "build_seconds": round(seconds, 4),
+            "chunks_per_s": _rate(vectorstore.index.ntotal, seconds),
+        },
+        "kinds": {},
+    }
+
+    vectors = index_vectors(vectorstore.index)
+    query_vectors = np.asarray(embeddings.embed_documents(queries), dtype="float32")
+    k = min(k, len(vectors))
+    truth = exact_neighbors(vectors, query_vectors, k)
+    for kind in kinds:
+        try:
+            started = time.perf_counter()
+            index = build_faiss_index(vectors, kind=kind)
+            build_seconds = time.perf_counter() - started
+            result = recall_at_k(index, None, query_vectors, truth=truth)
+            stats["kinds"][kind] = {
+                "build_seconds": round(build_seconds, 4),
+                "memory_bytes": index_memory_bytes(index),
+                f"recall_at_{k}": round(result["recall"], 4),
+                "search_latency_ms": round(result["latency_ms"], 4),
+            }
+        except Exception as e:
+            stats["kinds"][kind] = {"error": str(e)}
+    stats["peak_rss_mb"] = peak_rss_mb()
+    return vectorstore, stats
+
+
+def bench_queries(vectorstore, chunks, queries, enable_search=False):
+    """
+    Answers every query with `get_rag_response` (hybrid retrieval, context
+    packing, optional web search, fake generation) and times the full answer
+    and the first streamed token.
+    """
+    from core.lexical_index import LexicalIndex
+    from core.rag_pipeline import get_rag_response
+
+    started = time.perf_counter()
+    lexical_index = LexicalIndex(chunks)
+    lexical_seconds = time.perf_counter() - started
+
+    def answer(query):
+        started = time.perf_counter()
+        first = None
+        for _ in get_rag_response(query, vectorstore, chunks, enable_search=enable_search,
+                                  lexical_index=lexical_index):
+            if first is None:
+                first = time.perf_counter() - started
+        return first, time.perf_counter() - started
+
+    for query in queries[:WARMUP_QUERIES]:
+        answer(query)
+
+    ttft, total = [], []
+    for query in queries:
+        first, seconds = answer(query)
+        ttft.append(first if first is not None else seconds)
+        total.append(seconds)
+    return {
+        "queries": len(queries),
+        "lexical_index_seconds": round(lexical_seconds, 4),
+        "latency": latency_stats(total),
+        "time_to_first_token": latency_stats(ttft),
+        "queries_per_s": _rate(len(total), sum(total)),
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def run(args):
+    embeddings, llm, _ = install_fakes(
+        embeddings=HashingEmbeddings(dim=args.dim, latency=args.embed_latency),
+        llm=FakeLLM(tokens=args.answer_tokens, first_token_delay=args.first_token_delay),
+        web_search=FakeWebSearch(delay=args.search_delay),
+    )
+    if args.sample:
+        files = sample_corpus()
+    else:
+        files = generated_corpus(args.pages, documents=args.documents, file_format=args.format, seed=args.seed)
+
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+        },
+        "config": vars(args),
+    }
+
+    quiet = contextlib.redirect_stdout(io.StringIO()) if not args.verbose else contextlib.nullcontext()
+    with quiet:
+        documents, report["ingestion"] = bench_ingestion(files)
+        chunks, report["chunking"] = bench_chunking(documents, embeddings)
+        queries = make_queries(chunks, args.queries, seed=args.seed)
+        vectorstore, report["index"] = bench_index(chunks, queries, embeddings, k=args.k)
+        report["query"] = bench_queries(vectorstore, chunks, queries, enable_search=args.web_search)
+    report["query"]["mean_prompt_chars"] = round(float(np.mean(llm.prompt_chars)), 1) if llm.prompt_chars else 0
+    if args.import_repeat:
+        report["imports"] = import_report(repeat=args.import_repeat)
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline RAG pipeline benchmark (JSON report).")
+    parser.add_argument("--pages", type=int, default=DEFAULT_PAGES, help="pages of generated text")
+    parser.add_argument("--documents", type=int, default=1, help="files the pages are spread over")
+    parser.add_argument("--format", choices=("pdf", "txt"), default="pdf")
+    parser.add_argument("--sample", action="store_true", help="use the repository's Markdown files instead")
+    parser.add_argument("--queries", type=int, default=DEFAULT_QUERIES)
+    parser.add_argument("--k", type=int, default=DEFAULT_K, help="neighbors for recall@k")
+    parser.add_argument("--dim", type=int, default=256, help="fake embedding width")
+    parser.add_argument("--embed-latency", type=float, default=0.0, help="seconds per fake embedding call")
+    parser.add_argument("--first-token-delay", type=float, default=0.0, help="seconds before the fake LLM streams")
+    parser.add_argument("--answer-tokens", type=int, default=64)
+    parser.add_argument("--web-search", action="store_true", help="include the fake web search")
+    parser.add_argument("--search-delay", type=float, default=0.0, help="seconds per fake web search")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--import-repeat", type=int, default=1,
+                        help="fresh interpreters per cold import measurement (0 to skip)")
+    parser.add_argument("--output", help="write the JSON report here (default: stdout)")
+    parser.add_argument("--verbose", action="store_true", help="show pipeline log output")
+    args = parser.parse_args(argv)
+
+    report = run(args)
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+        print(f"✅ Benchmark report written to {args.output}")
+    else:
+        print(text)
+    return report
+
+
+if __name__ == "__main__":
+    main()
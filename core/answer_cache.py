@@ -0,0 +1,183 @@
+import hashlib
+import json
+import re
+import threading
+
+import numpy as np
+
+from core.config import get_setting
+from core.embeddings import encode_local
+from core.ttl_cache import TTLCache
+
+DEFAULT_MAX_ENTRIES = 512
+DEFAULT_TTL_SECONDS = 6 * 3600
+# Cosine similarity of query embeddings above which two questions count as the same
+DEFAULT_SIMILARITY = 0.95
+# Chat messages that shape an answer (the prompt includes the last 10)
+HISTORY_WINDOW = 10
+# Characters per chunk when replaying a cached answer as a stream
+REPLAY_CHUNK_CHARS = 80
+
+_WHITESPACE = re.compile(r"\s+")
+# Follow-up questions that lean on earlier turns ("what about it?") need matching history
+_CONTEXT_WORDS = re.compile(
+    r"\b(it|its|this|that|these|those|they|them|their|he|she|him|her|above|previous|earlier|same)\b"
+)
+
+
+def normalize_query(query):
+    """Lower-cases, collapses whitespace and drops trailing punctuation."""
+    return _WHITESPACE.sub(" ", query.lower()).strip().rstrip("?!. ")
+
+
+def is_context_dependent(query):
+    """True if the question refers back to the conversation, so it can't be answered standalone."""
+    return bool(_CONTEXT_WORDS.search(query.lower()))
+
+
+def history_key(chat_history):
+    """Hash of the chat messages the prompt would include; "" for no history."""
+    window = [
+        (msg["role"], normalize_query(msg["content"]))
+        for msg in (chat_history or [])[-HISTORY_WINDOW:]
+    ]
+    if not window:
+        return ""
+    return hashlib.sha256(json.dumps(window).encode("utf-8")).hexdigest()
+
+
+def scope_key(corpus_key, sources=None):
+    """Cache scope: the corpus fingerprint plus any restriction to some of its documents."""
+    if sources is None:
+        return corpus_key
+    return f"{corpus_key}:{hashlib.sha256(json.dumps(sorted(sources)).encode('utf-8')).hexdigest()}"
+
+
+def replay(answer, chunk_chars=REPLAY_CHUNK_CHARS):
+    """Yields a cached answer in pieces, like a live response stream."""
+    for start in range(0, len(answer), chunk_chars):
+        yield answer[start:start + chunk_chars]
+
+
+class AnswerCache:
+    """
+    Cache of generated answers, scoped to a corpus fingerprint.
+
+    A question hits when its normalized text matches a cached one, or when its
+    embedding's cosine similarity to a cached question reaches `similarity`.
+    Either way the chat history must be compatible: identical over the prompt's
+    history window, or empty for the cached answer and the new question does not
+    refer back to the conversation. Entries expire after `ttl` seconds and the
+    least recently used are evicted beyond `max_entries`.
+
+    `embed` maps a query string to a unit-length vector.
+    """
+
+    def __init__(self, embed, max_entries=DEFAULT_MAX_ENTRIES, ttl=DEFAULT_TTL_SECONDS,
+                 similarity=DEFAULT_SIMILARITY):
+        self.embed = embed
+        self.similarity = similarity
+        # (scope, history key, normalized query) -> {"answer", "vector"}
+        self._entries = TTLCache(max_entries, ttl)
+        self._lock = threading.Lock()
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+
+    def _history_keys(self, query, chat_history):
+        current = history_key(chat_history)
+        if current and not is_context_dependent(query):
+            return (current, "")
+        return (current,)
+
+    def _embed(self, query):
+        try:
+            return np.asarray(self.embed(query), dtype="float32")
+        except Exception as e:
+            print(f"⚠️ Answer cache could not embed the query: {e}")
+            return None
+
+    def lookup(self, scope, query, chat_history=None):
+        """Returns a cached answer for `query` in `scope`, or None."""
+        normalized = normalize_query(query)
+        histories = self._history_keys(query, chat_history)
+        for history in histories:
+            entry = self._entries.get((scope, history, normalized))
+            if entry is not None:
+                self._count("exact_hits")
+                print("✅ Answer cache hit (exact)")
+                return entry["answer"]
+
+        candidates = [
+            (key, entry) for key, entry in self._entries.items()
+            if key[0] == scope and key[1] in histories and entry["vector"] is not None
+        ]
+        vector = self._embed(query) if candidates else None
+        if vector is not None:
+            scores = np.stack([entry["vector"] for _, entry in candidates]) @ vector
+            best = int(np.argmax(scores))
+            if scores[best] >= self.similarity:
+                key, entry = candidates[best]
+                # Touch the entry so LRU eviction sees it as recently used
+                self._entries.get(key)
+                self._count("semantic_hits")
+                print(f"✅ Answer cache hit (similar question, {scores[best]:.2f})")
+                return entry["answer"]
+
+        self._count("misses")
+        return None
+
+    def store(self, scope, query, answer, chat_history=None):
+        """Caches a complete answer."""
+        if not answer.strip():
+            return
+        key = (scope, history_key(chat_history), normalize_query(query))
+        self._entries.put(key, {"answer": answer, "vector": self._embed(query)})
+
+    def invalidate(self, corpus_key):
+        """Drops every answer for a corpus, e.g. after its index changed."""
+        removed = self._entries.discard(lambda key: key[0].split(":")[0] == corpus_key)
+        if removed:
+            print(f"✅ Answer cache: dropped {removed} answers for a changed corpus")
+        return removed
+
+    def _count(self, counter):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def stats(self):
+        with self._lock:
+            hits = self.exact_hits + self.semantic_hits
+            total = hits + self.misses
+            return {
+                "exact_hits": self.exact_hits,
+                "semantic_hits": self.semantic_hits,
+                "misses": self.misses,
+                "hit_rate": hits / total if total else 0.0,
+                "entries": len(self._entries),
+            }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_answer_cache():
+    """
+    Returns the process-wide answer cache, configured by ANSWER_CACHE_MAX_ENTRIES,
+    ANSWER_CACHE_TTL (seconds) and ANSWER_CACHE_SIMILARITY. Returns None when
+    ANSWER_CACHE_DISABLED is set.
+    """
+    global _cache
+    if get_setting("ANSWER_CACHE_DISABLED", False, cast=bool):
+        return None
+    with _cache_lock:
+        if _cache is None:
+            # Questions are compared with the local model: no network call per query
+            _cache = AnswerCache(
+                embed=lambda query: encode_local([query])[0],
+                max_entries=get_setting("ANSWER_CACHE_MAX_ENTRIES", DEFAULT_MAX_ENTRIES, cast=int),
+                ttl=get_setting("ANSWER_CACHE_TTL", DEFAULT_TTL_SECONDS, cast=float),
+                similarity=get_setting("ANSWER_CACHE_SIMILARITY", DEFAULT_SIMILARITY, cast=float),
+            )
+        return _cache
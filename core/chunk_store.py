@@ -0,0 +1,263 @@
+import mmap
+import os
+import pickle
+import sys
+import threading
+from array import array
+from collections.abc import Sequence
+
+import numpy as np
+from langchain_community.docstore.base import AddableMixin, Docstore
+from langchain_core.documents import Document
+
+TEXT_FILE = "chunks.txt"
+META_FILE = "chunks.pkl"
+# Deleted text is reclaimed once it is this share of the buffer
+COMPACT_RATIO = 0.5
+NO_PAGE = -1
+
+
+class ChunkStore(Docstore, AddableMixin):
+    """
+    Compact FAISS docstore: every chunk's text lives in one contiguous UTF-8
+    buffer, addressed by offset/length arrays. Sources are interned (one integer
+    code per chunk) and pages kept in a numeric array; other metadata (e.g. the
+    row range of a table chunk) is stored only for the chunks that have it.
+    These columns take the place of per-chunk record objects: even with
+    `__slots__`, a record costs a Python object per chunk, an array entry does not.
+
+    `Document` objects are built on demand, when a search returns a chunk or a
+    `ChunkView` is read, so a loaded document costs about the size of its text.
+    A store loaded with `mmap_text` reads its text straight from the cache file and
+    copies it into memory only when chunks are added.
+    """
+
+    def __init__(self):
+        self._text = bytearray()
+        self._offsets = array("q")
+        self._lengths = array("q")
+        self._pages = array("q")
+        self._sources = array("i")
+        self._alive = bytearray()
+        self._ids = []
+        # docstore id -> row, for live chunks only
+        self._rows = {}
+        # row -> metadata other than source and page
+        self._extra = {}
+        self.source_names = []
+        self._source_codes = {}
+        self._dead_bytes = 0
+        self._live = {}
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._rows)
+
+    def __getstate__(self):
+        state = {name: value for name, value in self.__dict__.items() if name not in ("_lock", "_live")}
+        state["_text"] = bytes(self._text)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._text = bytearray(self._text)
+        self._live = {}
+        self._lock = threading.RLock()
+
+    def _intern(self, source):
+        code = self._source_codes.get(source)
+        if code is None:
+            code = self._source_codes[source] = len(self.source_names)
+            self.source_names.append(source)
+        return code
+
+    def _changed(self):
+        # Cached live rows are stale once chunks are added, deleted or renumbered
+        self._live = {}
+
+    def add(self, texts):
+        """Appends {docstore id: Document}; part of the LangChain docstore interface."""
+        with self._lock:
+            overlapping = set(texts).intersection(self._rows)
+            if overlapping:
+                raise ValueError(f"Tried to add ids that already exist: {overlapping}")
+            if not isinstance(self._text, bytearray):
+                # Copy-on-write: a memory-mapped buffer is read-only
+                self._text = bytearray(self._text)
+            for doc_id, doc in texts.items():
+                row = len(self._ids)
+                data = doc.page_content.encode("utf-8")
+                metadata = dict(doc.metadata)
+                page = metadata.pop("page", None)
+                if not isinstance(page, int) or isinstance(page, bool) or page < 0:
+                    if page is not None:
+                        metadata["page"] = page
+                    page = NO_PAGE
+                self._offsets.append(len(self._text))
+                self._lengths.append(len(data))
+                self._text.extend(data)
+                self._pages.append(page)
+                self._sources.append(self._intern(metadata.pop("source", None)))
+                self._alive.append(1)
+                self._ids.append(doc_id)
+                self._rows[doc_id] = row
+                if metadata:
+                    self._extra[row] = metadata
+            self._changed()
+
+    def delete(self, ids):
+        """Deletes chunks by docstore id; their text is reclaimed in batches."""
+        with self._lock:
+            missing = set(ids).difference(self._rows)
+            if missing:
+                raise ValueError(f"Tried to delete ids that does not exist: {missing}")
+            for doc_id in ids:
+                row = self._rows.pop(doc_id)
+                self._alive[row] = 0
+                self._dead_bytes += self._lengths[row]
+                self._extra.pop(row, None)
+            self._changed()
+            if self._dead_bytes > COMPACT_RATIO * len(self._text):
+                self.compact()
+
+    def compact(self):
+        """Drops deleted chunks from the buffer and arrays, renumbering rows."""
+        with self._lock:
+            live = self.live_rows()
+            text = bytearray()
+            offsets = array("q")
+            for row in live:
+                offsets.append(len(text))
+                text.extend(self._text[self._offsets[row]:self._offsets[row] + self._lengths[row]])
+            self._text = text
+            self._offsets = offsets
+            self._lengths = array("q", (self._lengths[row] for row in live))
+            self._pages = array("q", (self._pages[row] for row in live))
+            self._sources = array("i", (self._sources[row] for row in live))
+            self._alive = bytearray(b"\x01" * len(live))
+            self._ids = [self._ids[row] for row in live]
+            self._rows = {doc_id: row for row, doc_id in enumerate(self._ids)}
+            self._extra = {new: self._extra[old] for new, old in enumerate(live) if old in self._extra}
+            self._dead_bytes = 0
+            self._changed()
+
+    def set_source(self, name):
+        """Sets the source of every chunk (a store holding one document)."""
+        with self._lock:
+            self._sources = array("i", [self._intern(name)]) * len(self._sources)
+            self._changed()
+
+    def search(self, search):
+        """The chunk with docstore id `search` as a Document; part of the LangChain docstore interface."""
+        row = self._rows.get(search)
+        if row is None:
+            return f"ID {search} not found."
+        return self.document(row)
+
+    def row(self, doc_id):
+        """Row of a live chunk, or None."""
+        return self._rows.get(doc_id)
+
+    def text(self, row):
+        offset = self._offsets[row]
+        return bytes(self._text[offset:offset + self._lengths[row]]).decode("utf-8")
+
+    def source(self, row):
+        return self.source_names[self._sources[row]]
+
+    def document(self, row):
+        """Builds a Document view of one chunk."""
+        metadata = {"source": self.source(row)}
+        if self._pages[row] != NO_PAGE:
+            metadata["page"] = self._pages[row]
+        metadata.update(self._extra.get(row, ()))
+        return Document(id=self._ids[row], page_content=self.text(row), metadata=metadata)
+
+    def live_rows(self, sources=None):
+        """Rows of the live chunks in insertion order, optionally only those from `sources`."""
+        key = None if sources is None else frozenset(sources)
+        with self._lock:
+            rows = self._live.get(key)
+            if rows is None:
+                alive = np.frombuffer(bytes(self._alive), dtype="uint8").astype(bool)
+                if key is not None:
+                    codes = [self._source_codes[s] for s in key if s in self._source_codes]
+                    alive &= np.isin(np.array(self._sources, dtype="int32"), codes)
+                rows = self._live[key] = np.flatnonzero(alive)
+            return rows
+
+    def view(self, sources=None):
+        """The live chunks (optionally only from `sources`) as a sequence of Documents."""
+        return ChunkView(self, None if sources is None else frozenset(sources))
+
+    def memory_bytes(self):
+        """Approximate bytes held for text, arrays and ids (excluding a memory-mapped buffer)."""
+        text = len(self._text) if isinstance(self._text, bytearray) else 0
+        arrays = sum(a.itemsize * len(a) for a in (self._offsets, self._lengths, self._pages, self._sources))
+        return text + arrays + len(self._alive) + sum(sys.getsizeof(doc_id) for doc_id in self._ids)
+
+    def save(self, path):
+        """Writes the store to `path` as a text buffer and a small metadata file."""
+        with self._lock:
+            if len(self._rows) < len(self._ids):
+                self.compact()
+            os.makedirs(path, exist_ok=True)
+            with open(os.path.join(path, TEXT_FILE), "wb") as f:
+                f.write(self._text)
+            state = self.__getstate__()
+            del state["_text"]
+            with open(os.path.join(path, META_FILE), "wb") as f:
+                pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @classmethod
+    def exists(cls, path):
+        return os.path.exists(os.path.join(path, META_FILE))
+
+    @classmethod
+    def load(cls, path, mmap_text=True):
+        """Reads a saved store; with `mmap_text` the text buffer is memory-mapped read-only."""
+        store = cls.__new__(cls)
+        with open(os.path.join(path, META_FILE), "rb") as f:
+            # Written only by this process family, like the FAISS docstore pickle
+            state = pickle.load(f)
+        text_path = os.path.join(path, TEXT_FILE)
+        if mmap_text and os.path.getsize(text_path):
+            with open(text_path, "rb") as f:
+                state["_text"] = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            with open(text_path, "rb") as f:
+                state["_text"] = bytearray(f.read())
+        store.__dict__.update(state)
+        store._live = {}
+        store._lock = threading.RLock()
+        return store
+
+
+class ChunkView(Sequence):
+    """
+    Read-only sequence of a ChunkStore's live chunks (optionally only some
+    sources), in index order. Items are Documents built when accessed; the
+    view follows the store as chunks are added or deleted.
+    """
+
+    __slots__ = ("store", "sources")
+
+    def __init__(self, store, sources=None):
+        self.store = store
+        self.sources = sources
+
+    def __len__(self):
+        return len(self.store.live_rows(self.sources))
+
+    def __getitem__(self, i):
+        rows = self.store.live_rows(self.sources)
+        if isinstance(i, slice):
+            return [self.store.document(int(row)) for row in rows[i]]
+        return self.store.document(int(rows[i]))
+
+    def __iter__(self):
+        for row in self.store.live_rows(self.sources):
+            yield self.store.document(int(row))
+
+    def __repr__(self):
+        return f"ChunkView({len(self)} chunks)"
@@ -0,0 +1,90 @@
+import asyncio
+import contextvars
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+# Threads for blocking query stages (embedding calls, FAISS, web search).
+# A private pool, unlike asyncio's default executor, is not joined when an
+# event loop closes, so a stage abandoned after its timeout never blocks the caller.
+MAX_THREADS = 32
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=MAX_THREADS, thread_name_prefix="rag-query")
+        return _executor
+
+
+async def run_in_thread(fn, *args, timeout=None):
+    """
+    Awaits `fn(*args)` run on a worker thread. Raises asyncio.TimeoutError after
+    `timeout` seconds; the thread then finishes in the background.
+    Context variables (e.g. the current telemetry trace) carry over to the thread.
+    """
+    context = contextvars.copy_context()
+    future = asyncio.get_running_loop().run_in_executor(_get_executor(), context.run, fn, *args)
+    if timeout is None:
+        return await future
+    return await asyncio.wait_for(future, timeout)
+
+
+def run_sync(coro):
+    """
+    Runs a coroutine to completion from synchronous code, even if an event loop is
+    already running. The nested loop gets a thread of its own: on the shared pool it
+    would wait on the very workers its `run_in_thread` stages need.
+    """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coro)
+    with ThreadPoolExecutor(max_workers=1, thread_name_prefix="rag-run-sync") as loop_thread:
+        return loop_thread.submit(contextvars.copy_context().run, asyncio.run, coro).result()
+
+
+class ReadWriteLock:
+    """
+    Many readers or one writer. A waiting writer blocks new readers, so updates
+    are not starved by a steady stream of queries. Not reentrant.
+    """
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._readers = 0
+        self._writer = False
+        self._waiting_writers = 0
+
+    @contextmanager
+    def reading(self):
+        with self._condition:
+            while self._writer or self._waiting_writers:
+                self._condition.wait()
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._readers -= 1
+                if not self._readers:
+                    self._condition.notify_all()
+
+    @contextmanager
+    def writing(self):
+        with self._condition:
+            self._waiting_writers += 1
+            while self._writer or self._readers:
+                self._condition.wait()
+            self._waiting_writers -= 1
+            self._writer = True
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._writer = False
+                self._condition.notify_all()
@@ -1,21 +1,48 @@
 import streamlit as st
 import os
 
+
+def _get_secret(name):
+    """
+    Reads a value from Streamlit secrets, falling back to environment variables.
+    Works outside a Streamlit run where no secrets.toml exists.
+    """
+    try:
+        if name in st.secrets:
+            return st.secrets[name]
+    except Exception:
+        pass
+    return os.getenv(name)
+
+
+def get_setting(name, default=None, cast=None):
+    """
+    Retrieves a tunable setting from Streamlit secrets or environment variables.
+    Returns `default` when the setting is missing or cannot be cast.
+    """
+    value = _get_secret(name)
+    if value is None or value == "":
+        return default
+    if cast is None:
+        return value
+    try:
+        if cast is bool and isinstance(value, str):
+            return value.strip().lower() in ("1", "true", "yes", "on")
+        return cast(value)
+    except (TypeError, ValueError):
+        print(f"⚠️ Invalid value for {name}: {value!r}. Using default {default!r}.")
+        return default
+
+
 def get_google_api_keys():
     """
     Retrieves a list of Google API keys from Streamlit secrets or environment variables.
     Supports GOOGLE_API_KEY and GOOGLE_API_KEY_1, GOOGLE_API_KEY_2, etc.
     """
     keys = []
-    
-    # Helper to safely get from secrets or env
-    def get_key(name):
-        if name in st.secrets:
-            return st.secrets[name]
-        return os.getenv(name)
 
     # 1. Check for standard key
-    key = get_key("GOOGLE_API_KEY")
+    key = _get_secret("GOOGLE_API_KEY")
     if key:
         keys.append(key)
 
@@ -23,11 +50,11 @@ def get_google_api_keys():
     i = 1
     while True:
         key_name = f"GOOGLE_API_KEY_{i}"
-        key = get_key(key_name)
+        key = _get_secret(key_name)
         if key:
             keys.append(key)
             i += 1
         else:
             break
-            
+
     return keys
@@ -0,0 +1,182 @@
+import importlib.util
+import threading
+import zlib
+
+import numpy as np
+
+from core.config import get_setting
+from core.embedding_cache import text_hash
+from core.lexical_index import tokenize
+
+# Checked without importing: sentence-transformers pulls in torch, which is slow to load
+CROSS_ENCODER_AVAILABLE = importlib.util.find_spec("sentence_transformers") is not None
+
+# Defaults, overridable with CONTEXT_* settings
+DEFAULT_TOKEN_BUDGET = 6000
+DEFAULT_FETCH_K = 40
+DEFAULT_MMR_LAMBDA = 0.7
+RERANK_MODEL = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+
+# Chunks whose bag-of-words cosine similarity reaches this are near duplicates
+NEAR_DUPLICATE_THRESHOLD = 0.9
+# Width of the hashed bag-of-words vectors used for similarity
+HASH_DIMS = 2048
+
+
+def estimate_tokens(text):
+    """Rough Gemini token count (about four characters per token)."""
+    return len(text) // 4 + 1
+
+
+def get_context_params():
+    """Context packing settings: token budget, candidates fetched, MMR lambda and reranking."""
+    return {
+        "token_budget": get_setting("CONTEXT_TOKEN_BUDGET", DEFAULT_TOKEN_BUDGET, cast=int),
+        "fetch_k": get_setting("CONTEXT_FETCH_K", DEFAULT_FETCH_K, cast=int),
+        "mmr_lambda": get_setting("CONTEXT_MMR_LAMBDA", DEFAULT_MMR_LAMBDA, cast=float),
+        "rerank": get_setting("CONTEXT_RERANK", False, cast=bool),
+    }
+
+
+def _bow_vectors(texts):
+    """Unit-length hashed bag-of-words vectors, cheap enough to compute per query."""
+    vectors = np.zeros((len(texts), HASH_DIMS), dtype="float32")
+    for row, text in enumerate(texts):
+        for token in tokenize(text):
+            vectors[row, zlib.crc32(token.encode("utf-8")) % HASH_DIMS] += 1
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def deduplicate(docs, vectors):
+    """
+    Drops exact duplicates (same whitespace-normalized text) and near duplicates
+    (bag-of-words cosine >= NEAR_DUPLICATE_THRESHOLD), keeping the first, i.e.
+    best-ranked, copy. Returns the kept positions.
+    """
+    seen = set()
+    kept = []
+    for i, doc in enumerate(docs):
+        digest = text_hash(doc.page_content)
+        if digest in seen:
+            continue
+        if kept and float(np.max(vectors[kept] @ vectors[i])) >= NEAR_DUPLICATE_THRESHOLD:
+            continue
+        seen.add(digest)
+        kept.append(i)
+    return kept
+
+
+def mmr_order(relevance, vectors, mmr_lambda=DEFAULT_MMR_LAMBDA):
+    """
+    Orders candidates by maximal marginal relevance: each pick maximizes
+    lambda * relevance - (1 - lambda) * (max similarity to the chunks already picked).
+    """
+    n = len(relevance)
+    if n == 0:
+        return []
+    similarity = vectors @ vectors.T
+    redundancy = np.zeros(n, dtype="float32")
+    remaining = np.ones(n, dtype=bool)
+    order = []
+    for _ in range(n):
+        scores = mmr_lambda * relevance - (1 - mmr_lambda) * redundancy
+        scores[~remaining] = -np.inf
+        pick = int(np.argmax(scores))
+        order.append(pick)
+        remaining[pick] = False
+        redundancy = np.maximum(redundancy, similarity[pick])
+    return order
+
+
+_reranker = None
+_reranker_lock = threading.Lock()
+
+
+def get_reranker():
+    """Returns the shared local cross-encoder, or None if sentence-transformers is missing."""
+    global _reranker
+    if not CROSS_ENCODER_AVAILABLE:
+        return None
+    with _reranker_lock:
+        if _reranker is None:
+            from sentence_transformers import CrossEncoder
+            _reranker = CrossEncoder(RERANK_MODEL)
+        return _reranker
+
+
+def rerank(query, docs):
+    """Re-orders `docs` by cross-encoder relevance to `query`; unchanged if no reranker."""
+    reranker = get_reranker()
+    if reranker is None:
+        print("⚠️ CONTEXT_RERANK is set but sentence-transformers is not installed. Skipping rerank.")
+        return docs
+    if not docs:
+        return docs
+    scores = reranker.predict([(query, doc.page_content) for doc in docs])
+    order = np.argsort(-np.asarray(scores), kind="stable")
+    return [docs[i] for i in order]
+
+
+def format_chunk(doc):
+    """Prefixes a chunk with its source and page so answers can cite them."""
+    source = doc.metadata.get("source", "unknown")
+    page = doc.metadata.get("page")
+    label = f"[Source: {source}, page {page}]" if page is not None else f"[Source: {source}]"
+    return f"{label}\n{doc.page_content}"
+
+
+def pack_context(docs, token_budget):
+    """
+    Greedily packs formatted chunks, in order, into `token_budget` tokens.
+    A chunk that does not fit is skipped so smaller later ones can still use the room.
+    Returns (packed docs, context text, tokens used).
+    """
+    packed = []
+    parts = []
+    used = 0
+    for doc in docs:
+        text = format_chunk(doc)
+        tokens = estimate_tokens(text)
+        if used + tokens > token_budget:
+            continue
+        packed.append(doc)
+        parts.append(text)
+        used += tokens
+    return packed, "\n\n".join(parts), used
+
+
+def build_context(query, candidates, token_budget=None, mmr_lambda=None, rerank_results=None):
+    """
+    Turns over-fetched retrieval `candidates` (best first) into a prompt context:
+    deduplicate, diversify with MMR, optionally rerank with a local cross-encoder,
+    then pack into the token budget with source/page labels.
+    Returns (context text, packed docs).
+    """
+    params = get_context_params()
+    token_budget = token_budget or params["token_budget"]
+    mmr_lambda = params["mmr_lambda"] if mmr_lambda is None else mmr_lambda
+    rerank_results = params["rerank"] if rerank_results is None else rerank_results
+
+    if not candidates:
+        return "", []
+    candidate_tokens = sum(estimate_tokens(doc.page_content) for doc in candidates)
+
+    vectors = _bow_vectors([doc.page_content for doc in candidates])
+    kept = deduplicate(candidates, vectors)
+    docs = [candidates[i] for i in kept]
+    vectors = vectors[kept]
+
+    # Retrieval order is the relevance signal; MMR trades it against redundancy
+    relevance = 1.0 - np.arange(len(docs), dtype="float32") / len(docs)
+    docs = [docs[i] for i in mmr_order(relevance, vectors, mmr_lambda)]
+    if rerank_results:
+        docs = rerank(query, docs)
+
+    packed, context_text, used = pack_context(docs, token_budget)
+    saved = candidate_tokens - used
+    print(
+        f"✅ Context: {len(packed)}/{len(candidates)} chunks, ~{used} tokens "
+        f"(saved ~{saved} of {candidate_tokens}, {len(candidates) - len(docs)} duplicates)"
+    )
+    return context_text, packed
@@ -0,0 +1,229 @@
+import hashlib
+import json
+import threading
+
+from core.answer_cache import get_answer_cache
+from core.concurrency import ReadWriteLock
+from core.embeddings import optimize_vectorstore, source_vectors
+from core.index_cache import file_fingerprint
+from core.lexical_index import LexicalIndex
+from core.rag_pipeline import get_index_settings, index_document
+from core.table_query import TableStore
+from core.telemetry import span
+from ingestion.vector_store import (
+    build_faiss_index,
+    owned_copy,
+    supports_compacting_remove,
+)
+from ingestion.loader import DocumentLoadError
+from ingestion.tabular import is_tabular, load_tables
+
+
+class Corpus:
+    """
+    A set of documents sharing one FAISS index.
+
+    Adding a document indexes (or loads from the index cache) only that document
+    and appends its vectors to the shared index; removing one deletes its vector
+    IDs in place. Every chunk carries its document's unique name in
+    metadata["source"], which queries can filter on. Chunk text is held once,
+    in the index's ChunkStore docstore; `get_chunks` returns lazy views of it.
+
+    A BM25 `lexical_index` over the same chunks is kept alongside: each document's
+    postings are built once when it is added, and the corpus index is re-merged
+    from them on every change. Spreadsheets are also loaded into `tables`, a
+    columnar TableStore that answers filter and aggregate questions directly.
+
+    When other threads may add or remove documents while a query runs (e.g. in
+    the HTTP service), queries hold `reading()` while they search; index changes
+    wait for them.
+    """
+
+    def __init__(self):
+        self.vectorstore = None
+        self.lexical_index = None
+        self.tables = TableStore()
+        # fingerprint -> {"name": str, "ids": [docstore ids], "lexical": LexicalIndex}
+        self.documents = {}
+        # Fingerprints of files that produced no text, so they are not retried
+        self._empty = set()
+        # fingerprint -> error message, for files whose text extraction failed
+        self.failures = {}
+        # True while self.vectorstore.index is a cached index that must not be modified
+        self._shared_index = False
+        self._lock = threading.RLock()
+        # Writers (index changes) take this before self._lock; searches only read it
+        self._searches = ReadWriteLock()
+
+    def __len__(self):
+        return len(self.documents)
+
+    def __contains__(self, fingerprint):
+        return fingerprint in self.documents
+
+    def reading(self):
+        """Context manager held while searching; the index is not modified meanwhile."""
+        return self._searches.reading()
+
+    @property
+    def fingerprint(self):
+        """
+        Identifies the corpus contents (documents, their names and the index
+        settings); changes whenever a document is added or removed.
+        """
+        with self._lock:
+            documents = sorted((fp, doc["name"]) for fp, doc in self.documents.items())
+        payload = json.dumps({"documents": documents, "settings": get_index_settings()}, sort_keys=True)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    @property
+    def sources(self):
+        """Names of the documents in the corpus, in the order they were added."""
+        return [doc["name"] for doc in self.documents.values()]
+
+    def _unique_name(self, name):
+        taken = set(self.sources)
+        if name not in taken:
+            return name
+        i = 2
+        while f"{name} ({i})" in taken:
+            i += 1
+        return f"{name} ({i})"
+
+    def add_document(self, file):
+        """
+        Indexes `file` into the corpus. Returns its fingerprint, or None if the
+        file produced no text. Adding the same content twice is a no-op.
+        Raises DocumentLoadError if the file could not be read to the end.
+        """
+        fingerprint = file_fingerprint(file)
+        with self._lock:
+            if fingerprint in self.documents:
+                return fingerprint
+
+        vectorstore, chunks = index_document(file)
+        if vectorstore is None:
+            self._empty.add(fingerprint)
+            return None
+        tables = self._load_tables(file)
+
+        with self._searches.writing(), self._lock:
+            if fingerprint in self.documents:
+                return fingerprint
+
+            name = self._unique_name(file.name)
+            ids = [vectorstore.index_to_docstore_id[i] for i in range(len(chunks))]
+            vectorstore.docstore.set_source(name)
+
+            if self.vectorstore is None:
+                # Adopt the document's store as-is; it may be memory-mapped from
+                # the index cache and shared with other processes
+                self.vectorstore = vectorstore
+                self._shared_index = True
+            else:
+                # Only this document's vectors are added; nothing is re-embedded
+                self._own_index()
+                vectors = source_vectors(vectorstore)
+                docs = list(chunks)
+                self.vectorstore.add_embeddings(
+                    [(doc.page_content, vector) for doc, vector in zip(docs, vectors)],
+                    metadatas=[doc.metadata for doc in docs],
+                    ids=ids,
+                )
+                optimize_vectorstore(self.vectorstore)
+
+            previous = self.fingerprint
+            self.documents[fingerprint] = {"name": name, "ids": ids, "lexical": LexicalIndex(chunks, keep_chunks=False)}
+            self._merge_lexical()
+            if tables:
+                # Tables are named after the file; use its unique name in the corpus
+                self.tables.add(name, {name + table[len(file.name):]: frame for table, frame in tables.items()})
+        self._invalidate_answers(previous)
+        return fingerprint
+
+    def remove_document(self, fingerprint):
+        """Deletes a document's vectors and chunks from the shared index."""
+        with self._searches.writing(), self._lock:
+            previous = self.fingerprint
+            doc = self.documents.pop(fingerprint, None)
+            if doc is None:
+                return False
+            self._invalidate_answers(previous)
+            self.tables.remove(doc["name"])
+            if not self.documents:
+                self.vectorstore = None
+                self.lexical_index = None
+                self._shared_index = False
+                return True
+            self._merge_lexical()
+
+            index = self.vectorstore.index
+            if self._shared_index or not supports_compacting_remove(index):
+                # Deleting renumbers vector positions, which only flat indexes
+                # do; ANN indexes are rebuilt flat, then re-optimized below
+                self.vectorstore.index = build_faiss_index(source_vectors(self.vectorstore), kind="flat")
+                self._shared_index = False
+            self.vectorstore.delete(doc["ids"])
+            optimize_vectorstore(self.vectorstore)
+            return True
+
+    @staticmethod
+    def _load_tables(file):
+        """{table name: DataFrame} for a CSV/Excel file, {} for other files."""
+        if not is_tabular(file.name):
+            return {}
+        try:
+            with span("tables"):
+                return load_tables(file)
+        except Exception as e:
+            print(f"⚠️ Could not load {file.name} as a table: {e}")
+            return {}
+
+    def _invalidate_answers(self, fingerprint):
+        """Drops cached answers for the corpus as it was before a change."""
+        cache = get_answer_cache()
+        if cache is not None:
+            cache.invalidate(fingerprint)
+
+    def _merge_lexical(self):
+        # The merged index reads chunks from the shared docstore, in the same order
+        self.lexical_index = LexicalIndex.merge(
+            (doc["lexical"] for doc in self.documents.values()), chunks=self.vectorstore.docstore.view()
+        )
+
+    def _own_index(self):
+        """Copy-on-write: replaces a shared (memory-mapped) index with a private copy."""
+        if self._shared_index:
+            self.vectorstore.index = owned_copy(self.vectorstore.index)
+            self._shared_index = False
+
+    def get_chunks(self, sources=None):
+        """Returns a lazy view of the chunks in corpus order, optionally only those from `sources`."""
+        with self._lock:
+            if self.vectorstore is None:
+                return []
+            return self.vectorstore.docstore.view(sources)
+
+    def sync(self, files):
+        """
+        Makes the corpus match `files` (e.g. the uploader's current list):
+        new files are added, files no longer present are removed.
+        Files that fail to load are listed in `failures` and not retried.
+        Returns (added, removed) counts.
+        """
+        wanted = {file_fingerprint(file): file for file in files}
+        self.failures = {fp: error for fp, error in self.failures.items() if fp in wanted}
+        removed = 0
+        for fingerprint in list(self.documents):
+            if fingerprint not in wanted:
+                removed += self.remove_document(fingerprint)
+        added = 0
+        for fingerprint, file in wanted.items():
+            if fingerprint in self.documents or fingerprint in self._empty or fingerprint in self.failures:
+                continue
+            try:
+                if self.add_document(file):
+                    added += 1
+            except DocumentLoadError as e:
+                self.failures[fingerprint] = str(e)
+        return added, removed
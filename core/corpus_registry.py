@@ -0,0 +1,117 @@
+import io
+import threading
+import time
+import uuid
+
+from core.config import get_setting
+from core.corpus import Corpus
+from core.memory import ConversationMemory
+from core.ttl_cache import TTLCache
+
+DEFAULT_MAX_SESSIONS = 1000
+DEFAULT_SESSION_TTL = 6 * 3600
+
+
+class UploadedBytes(io.BytesIO):
+    """File bytes received over HTTP, shaped like a Streamlit UploadedFile (has `name`)."""
+
+    def __init__(self, data, name):
+        super().__init__(data)
+        self.name = name
+
+
+class CorpusRegistry:
+    """
+    Process-wide set of corpora, keyed by ID, for the HTTP service.
+
+    Every client querying a corpus shares its one in-memory index. Conversation
+    memories are kept per client session ID and expire after `session_ttl`
+    seconds of inactivity.
+    """
+
+    def __init__(self, max_sessions=DEFAULT_MAX_SESSIONS, session_ttl=DEFAULT_SESSION_TTL):
+        # id -> {"name", "created", "corpus"}
+        self._corpora = {}
+        self._memories = TTLCache(max_sessions, session_ttl)
+        self._lock = threading.Lock()
+
+    def create(self, name=None):
+        """Creates an empty corpus and returns its ID."""
+        corpus_id = uuid.uuid4().hex
+        with self._lock:
+            self._corpora[corpus_id] = {"name": name or corpus_id[:8], "created": time.time(), "corpus": Corpus()}
+        return corpus_id
+
+    def get(self, corpus_id):
+        """The Corpus with this ID, or None."""
+        with self._lock:
+            entry = self._corpora.get(corpus_id)
+        return entry["corpus"] if entry else None
+
+    def delete(self, corpus_id):
+        with self._lock:
+            return self._corpora.pop(corpus_id, None) is not None
+
+    def describe(self, corpus_id):
+        """JSON-serializable summary of a corpus, or None if there is no such corpus."""
+        with self._lock:
+            entry = self._corpora.get(corpus_id)
+        if entry is None:
+            return None
+        corpus = entry["corpus"]
+        with corpus._lock:
+            documents = [
+                {"fingerprint": fingerprint, "name": doc["name"], "chunks": len(doc["ids"])}
+                for fingerprint, doc in corpus.documents.items()
+            ]
+        return {
+            "id": corpus_id,
+            "name": entry["name"],
+            "created": entry["created"],
+            "fingerprint": corpus.fingerprint,
+            "documents": documents,
+            "chunks": sum(doc["chunks"] for doc in documents),
+        }
+
+    def list(self):
+        with self._lock:
+            ids = list(self._corpora)
+        return [d for d in (self.describe(corpus_id) for corpus_id in ids) if d is not None]
+
+    def add_document(self, corpus_id, name, data):
+        """
+        Indexes file bytes into a corpus. Returns the document's fingerprint, or
+        None if it produced no text. Raises KeyError for an unknown corpus.
+        """
+        corpus = self.get(corpus_id)
+        if corpus is None:
+            raise KeyError(corpus_id)
+        return corpus.add_document(UploadedBytes(data, name))
+
+    def memory(self, session_id):
+        """The ConversationMemory of a client session, created on first use."""
+        with self._lock:
+            memory = self._memories.get(session_id)
+            if memory is None:
+                memory = ConversationMemory()
+                self._memories.put(session_id, memory)
+            return memory
+
+    def drop_memory(self, session_id):
+        return self._memories.pop(session_id) is not None
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_corpus_registry():
+    """Returns the process-wide registry (SERVICE_MAX_SESSIONS, SERVICE_SESSION_TTL seconds)."""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = CorpusRegistry(
+                max_sessions=get_setting("SERVICE_MAX_SESSIONS", DEFAULT_MAX_SESSIONS, cast=int),
+                session_ttl=get_setting("SERVICE_SESSION_TTL", DEFAULT_SESSION_TTL, cast=float),
+            )
+        return _registry
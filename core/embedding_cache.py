@@ -0,0 +1,76 @@
+import hashlib
+import os
+import re
+import threading
+
+import numpy as np
+
+from core.config import get_setting
+from core.sqlite_cache import SQLiteCache
+
+DEFAULT_CACHE_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".rag_cache", "embeddings.sqlite3"
+)
+DEFAULT_MAX_MB = 512
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def text_hash(text):
+    """Hash of whitespace-normalized text, so formatting-only differences still hit."""
+    normalized = _WHITESPACE.sub(" ", text).strip()
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache(SQLiteCache):
+    """
+    Persistent embedding store keyed by (model name, normalized text hash).
+
+    Vectors are stored as float32 blobs in SQLite and shared across documents and
+    re-indexes, so repeated chunks (footers, headers, unchanged sections) are
+    embedded once. Least-recently-used rows are evicted once the stored vectors
+    exceed `max_bytes`.
+    """
+
+    table = "embeddings"
+    key_column = "model"
+    value_column = "vector"
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_bytes=DEFAULT_MAX_MB * 1024 * 1024):
+        super().__init__(path, max_bytes)
+
+    def get_many(self, model, texts):
+        """Returns a list aligned with `texts`: a vector for each hit, None for each miss."""
+        hashes = [text_hash(text) for text in texts]
+        found = self._get_many(model, hashes)
+        return [
+            np.frombuffer(found[h], dtype=np.float32).tolist() if h in found else None
+            for h in hashes
+        ]
+
+    def put_many(self, model, texts, vectors):
+        """Stores vectors for `texts`, then evicts old rows if over the size cap."""
+        self._put_many(model, [
+            (text_hash(text), np.asarray(vector, dtype=np.float32).tobytes())
+            for text, vector in zip(texts, vectors)
+        ])
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_embedding_cache():
+    """
+    Returns the process-wide embedding cache, configured by EMBEDDING_CACHE_PATH
+    and EMBEDDING_CACHE_MAX_MB. Returns None when EMBEDDING_CACHE_DISABLED is set.
+    """
+    global _cache
+    if get_setting("EMBEDDING_CACHE_DISABLED", False, cast=bool):
+        return None
+    with _cache_lock:
+        if _cache is None:
+            path = get_setting("EMBEDDING_CACHE_PATH", DEFAULT_CACHE_PATH)
+            max_mb = get_setting("EMBEDDING_CACHE_MAX_MB", DEFAULT_MAX_MB, cast=int)
+            _cache = EmbeddingCache(path, max_mb * 1024 * 1024)
+        return _cache
@@ -0,0 +1,152 @@
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from core.config import get_setting
+from core.telemetry import increment
+from core.throttle import RateLimiter, is_quota_error
+
+DEFAULT_BATCH_SIZE = 100          # Gemini batch embedding limit
+DEFAULT_WORKERS_PER_KEY = 2
+DEFAULT_MAX_WORKERS = 16
+DEFAULT_REQUESTS_PER_MINUTE = 100  # per key
+MAX_CONSECUTIVE_FAILURES = 3       # retire a key's worker after this many failures in a row
+QUOTA_BACKOFF_SECONDS = 10.0
+# Seconds an idle worker waits before checking the queue again
+IDLE_POLL_SECONDS = 0.05
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def get_key_limiter(api_key, requests_per_minute):
+    """
+    Returns the process-wide rate limiter of an API key, shared by every
+    embedding job, so the per-key limit holds across windows and uploads.
+    """
+    with _limiters_lock:
+        limiter = _limiters.get((api_key, requests_per_minute))
+        if limiter is None:
+            limiter = _limiters[(api_key, requests_per_minute)] = RateLimiter(requests_per_minute)
+        return limiter
+
+
+class EmbeddingEngine:
+    """
+    Embeds texts in fixed-size batches across every configured API key at once.
+
+    Each key gets its own workers and a process-wide rate limiter (see
+    `get_key_limiter`); all workers pull batches from
+    one shared queue, so faster keys take more work. A failed batch goes back on
+    the queue for any other key to retry, and results are reassembled in input
+    order.
+    """
+
+    def __init__(self, api_keys, model_factory, batch_size=None, workers_per_key=None,
+                 max_workers=None, requests_per_minute=None, max_attempts=None):
+        if not api_keys:
+            raise ValueError("No Google API keys found. Please check secrets.toml.")
+        self.api_keys = list(api_keys)
+        self.model_factory = model_factory
+        self.batch_size = batch_size or get_setting("EMBED_BATCH_SIZE", DEFAULT_BATCH_SIZE, cast=int)
+        self.workers_per_key = workers_per_key or get_setting(
+            "EMBED_WORKERS_PER_KEY", DEFAULT_WORKERS_PER_KEY, cast=int
+        )
+        self.max_workers = max_workers or get_setting("EMBED_MAX_WORKERS", DEFAULT_MAX_WORKERS, cast=int)
+        rpm = requests_per_minute or get_setting(
+            "EMBED_REQUESTS_PER_MINUTE", DEFAULT_REQUESTS_PER_MINUTE, cast=int
+        )
+        self.max_attempts = max_attempts or max(3, 2 * len(self.api_keys))
+        self._limiters = [get_key_limiter(key, rpm) for key in self.api_keys]
+        self._models = [None] * len(self.api_keys)
+
+    def _model(self, key_index):
+        if self._models[key_index] is None:
+            self._models[key_index] = self.model_factory(self.api_keys[key_index])
+        return self._models[key_index]
+
+    def embed_documents(self, texts):
+        """Returns one vector per text, in the same order as `texts`."""
+        texts = list(texts)
+        if not texts:
+            return []
+
+        batches = [
+            texts[start:start + self.batch_size]
+            for start in range(0, len(texts), self.batch_size)
+        ]
+        results = [None] * len(batches)
+        pending = queue.Queue()
+        for batch_index in range(len(batches)):
+            pending.put((batch_index, 1))
+
+        state = {"remaining": len(batches), "error": None}
+        lock = threading.Lock()
+        done = threading.Event()
+
+        def worker(key_index):
+            failures = 0
+            limiter = self._limiters[key_index]
+            while True:
+                # Idle workers book no slots: the limiter is shared with other jobs
+                if pending.empty():
+                    if done.wait(IDLE_POLL_SECONDS):
+                        return
+                    continue
+                # Wait for this key's next slot before taking a batch, so a
+                # throttled key never holds work that another key could do
+                if done.wait(limiter.reserve()):
+                    return
+                try:
+                    batch_index, attempt = pending.get_nowait()
+                except queue.Empty:
+                    continue
+
+                try:
+                    vectors = self._model(key_index).embed_documents(batches[batch_index])
+                except Exception as e:
+                    print(f"⚠️ Key #{key_index+1} failed for embedding batch {batch_index}: {e}")
+                    increment("embedding_failovers", key=key_index + 1,
+                              reason="quota" if is_quota_error(e) else "error")
+                    failures += 1
+                    with lock:
+                        if attempt >= self.max_attempts:
+                            state["error"] = e
+                            done.set()
+                            return
+                        state["error"] = e
+                    # Only the failed batch is retried, by whichever key is free next
+                    pending.put((batch_index, attempt + 1))
+                    if is_quota_error(e):
+                        limiter.penalize(QUOTA_BACKOFF_SECONDS * failures)
+                    if failures >= MAX_CONSECUTIVE_FAILURES:
+                        print(f"⚠️ Key #{key_index+1} retired from this embedding job.")
+                        increment("embedding_keys_retired", key=key_index + 1)
+                        return
+                    continue
+
+                failures = 0
+                results[batch_index] = vectors
+                with lock:
+                    state["remaining"] -= 1
+                    if state["remaining"] == 0:
+                        done.set()
+
+        # Round-robin over keys, so a low max_workers still uses every key
+        slots = [
+            key_index
+            for _ in range(self.workers_per_key)
+            for key_index in range(len(self.api_keys))
+        ][:self.max_workers]
+
+        with ThreadPoolExecutor(max_workers=len(slots)) as executor:
+            futures = [executor.submit(worker, key_index) for key_index in slots]
+            for future in futures:
+                future.result()
+            # Every worker retired before the job finished
+            done.set()
+
+        if state["remaining"]:
+            raise state["error"] or RuntimeError("Embedding job did not complete.")
+
+        return [vector for batch in results for vector in batch]
@@ -1,42 +1,350 @@
+import atexit
+import threading
+
+import faiss
+import numpy as np
 from langchain_core.documents import Document
-from langchain_community.vectorstores import FAISS
-from langchain_google_genai import GoogleGenerativeAIEmbeddings
-from langchain_huggingface import HuggingFaceEmbeddings
-from core.config import get_google_api_keys
+from langchain_core.embeddings import Embeddings
+from core.config import get_google_api_keys, get_setting
+from core.embedding_cache import get_embedding_cache
+from core.embedding_engine import EmbeddingEngine
+from core.telemetry import increment, span
+from core.throttle import is_quota_error
+from ingestion.stream import batched
+from ingestion.vector_store import (
+    DEFAULT_EF_SEARCH,
+    DEFAULT_NPROBE,
+    FLAT_MAX_VECTORS,
+    HNSW_MAX_VECTORS,
+    build_faiss_index,
+    choose_index_kind,
+    configure_search,
+    effective_quantization,
+    has_exact_vectors,
+    index_kind,
+    index_quantization,
+    index_vectors,
+    truncate_vectors,
+)
+
+EMBEDDING_MODEL = "models/gemini-embedding-001"
+LOCAL_EMBEDDING_MODEL = "all-MiniLM-L6-v2"
+# Chunks embedded and added to the index per step when building incrementally
+DEFAULT_EMBED_WINDOW = 1000
+# Sentences per forward pass of the local model
+DEFAULT_LOCAL_BATCH_SIZE = 64
+# Below this many texts per process, a multi-process pool costs more than it saves
+MIN_TEXTS_PER_PROCESS = 256
+INDEXING_MODES = ("gemini", "local")
+
+
+def get_indexing_mode():
+    """
+    INDEXING_MODE: "gemini" (chunks embedded by the Gemini API) or "local"
+    (chunk vectors pooled from the local chunker's sentence embeddings; no network calls).
+    """
+    mode = get_setting("INDEXING_MODE", "gemini")
+    if mode not in INDEXING_MODES:
+        print(f"⚠️ Unknown INDEXING_MODE {mode!r}. Using 'gemini'.")
+        return "gemini"
+    return mode
+
+
+def get_embedding_dim():
+    """
+    Output dimensionality requested from the embedding model (EMBEDDING_DIM),
+    or None for the model's full width.
+    """
+    return get_setting("EMBEDDING_DIM", None, cast=int)
+
+
+def get_embedding_cache_model():
+    """Model name used to key the embedding cache; includes any reduced dimensionality."""
+    dim = get_embedding_dim()
+    return f"{EMBEDDING_MODEL}@{dim}" if dim else EMBEDDING_MODEL
 
 
 def get_embeddings_model(api_key):
     """Get the Google Generative AI embeddings model."""
+    from langchain_google_genai import GoogleGenerativeAIEmbeddings
+
+    dim = get_embedding_dim()
+    if dim:
+        return GoogleGenerativeAIEmbeddings(
+            model=EMBEDDING_MODEL,
+            google_api_key=api_key,
+            output_dimensionality=dim
+        )
     return GoogleGenerativeAIEmbeddings(
-        model="models/gemini-embedding-001",
+        model=EMBEDDING_MODEL,
         google_api_key=api_key
     )
 
 
+class TruncatedEmbeddings(Embeddings):
+    """Wraps an embeddings model so every vector is cut to `dim` components and re-normalized."""
+
+    def __init__(self, base, dim):
+        self.base = base
+        self.dim = dim
+
+    def embed_documents(self, texts):
+        return truncate_vectors(self.base.embed_documents(texts), self.dim).tolist()
+
+    def embed_query(self, text):
+        return truncate_vectors([self.base.embed_query(text)], self.dim)[0].tolist()
+
+
+class FailoverEmbeddings(Embeddings):
+    """
+    Gemini embeddings across all configured keys: queries go through `embed_text`
+    (query cache, failover to the next key counted as "embedding_failovers"),
+    documents through `embed_documents`.
+    """
+
+    def embed_documents(self, texts):
+        return embed_documents(texts)
+
+    def embed_query(self, text):
+        return embed_text(text)
+
+
+def get_default_embeddings():
+    """Get the embeddings model used for queries against indexes built in the current mode."""
+    if get_indexing_mode() == "local":
+        return get_local_embeddings()
+    if not get_google_api_keys():
+        raise ValueError("No Google API keys found. Please check secrets.toml.")
+    embeddings = FailoverEmbeddings()
+    dim = get_embedding_dim()
+    # Query vectors must match the (possibly truncated) width of the index
+    return TruncatedEmbeddings(embeddings, dim) if dim else embeddings
+
+
+_local_model = None
+_local_pool = None
+_local_lock = threading.Lock()
+
+
 def get_local_embeddings():
-    """Get local HuggingFace embeddings for efficient semantic chunking."""
-    return HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2")
+    """
+    Get the process-wide local HuggingFace model (semantic chunking, local indexing).
+    It is loaded on first use and shared by all threads afterwards.
+    LOCAL_EMBED_BATCH_SIZE sets the sentences per forward pass.
+    """
+    global _local_model
+    with _local_lock:
+        if _local_model is None:
+            from langchain_huggingface import HuggingFaceEmbeddings
+
+            batch_size = get_setting("LOCAL_EMBED_BATCH_SIZE", DEFAULT_LOCAL_BATCH_SIZE, cast=int)
+            _local_model = HuggingFaceEmbeddings(
+                model_name=LOCAL_EMBEDDING_MODEL,
+                encode_kwargs={"batch_size": batch_size, "normalize_embeddings": True},
+            )
+        return _local_model
+
+
+def _get_local_pool(model, processes):
+    """Starts (once) a sentence-transformers worker pool, stopped at interpreter exit."""
+    global _local_pool
+    with _local_lock:
+        if _local_pool is None:
+            client = model._client
+            _local_pool = client.start_multi_process_pool(target_devices=["cpu"] * processes)
+            atexit.register(client.stop_multi_process_pool, _local_pool)
+        return _local_pool
+
+
+def encode_local(texts):
+    """
+    Encodes texts with the local model into unit-length float32 vectors.
+    With LOCAL_EMBED_PROCESSES > 1, large batches are spread over a pool of
+    worker processes, one model copy per core.
+    """
+    model = get_local_embeddings()
+    processes = get_setting("LOCAL_EMBED_PROCESSES", 1, cast=int)
+    if processes > 1 and len(texts) >= MIN_TEXTS_PER_PROCESS * processes:
+        vectors = model._client.encode_multi_process(
+            [text.replace("\n", " ") for text in texts],
+            _get_local_pool(model, processes),
+            batch_size=model.encode_kwargs["batch_size"],
+        )
+    else:
+        vectors = model.embed_documents(texts)
+    return truncate_vectors(vectors)
+
+
+def embed_documents(texts, api_keys=None):
+    """
+    Embed chunk texts, reusing vectors from the persistent embedding cache.
+    Only cache misses (deduplicated) are sent to the Gemini embedding endpoint.
+    """
+    api_keys = api_keys or get_google_api_keys()
+    cache = get_embedding_cache()
+    if cache is None:
+        return EmbeddingEngine(api_keys, get_embeddings_model).embed_documents(texts)
 
+    cache_model = get_embedding_cache_model()
+    vectors = cache.get_many(cache_model, texts)
+    hits = sum(1 for v in vectors if v is not None)
+    print(f"✅ Embedding cache: {hits}/{len(texts)} chunks reused "
+          f"({cache.stats()['hit_rate']:.0%} hit rate this session)")
 
-def create_vectorstore(docs):
-    """Create a FAISS vector store from documents."""
+    missing = list(dict.fromkeys(t for t, v in zip(texts, vectors) if v is None))
+    if missing:
+        fresh = EmbeddingEngine(api_keys, get_embeddings_model).embed_documents(missing)
+        cache.put_many(cache_model, missing, fresh)
+        fresh_by_text = dict(zip(missing, fresh))
+        vectors = [v if v is not None else fresh_by_text[t] for t, v in zip(texts, vectors)]
+    return vectors
+
+
+def source_vectors(vectorstore):
+    """
+    The store's vectors at full precision, in index order, for rebuilding its index.
+    A float or re-scoring index holds them; a quantized one only approximates them,
+    so they are embedded again from the chunk text (embedding cache hits in Gemini mode).
+    """
+    index = vectorstore.index
+    if has_exact_vectors(index):
+        return index_vectors(index)
+    print(f"✅ Re-embedding {index.ntotal} chunks to rebuild a quantized index")
+    texts = [doc.page_content for doc in get_docstore_chunks(vectorstore)]
+    vectors = np.ascontiguousarray(vectorstore.embedding_function.embed_documents(texts), dtype="float32")
+    if vectorstore._normalize_L2:
+        faiss.normalize_L2(vectors)
+    return vectors
+
+
+def get_docstore_chunks(vectorstore):
+    """
+    Returns the store's chunks in index order without copying them: a lazy
+    ChunkView for a ChunkStore docstore, otherwise the docstore's own Documents.
+    """
+    from core.chunk_store import ChunkStore
+
+    if isinstance(vectorstore.docstore, ChunkStore):
+        return vectorstore.docstore.view()
+    return [
+        vectorstore.docstore.search(vectorstore.index_to_docstore_id[i])
+        for i in range(len(vectorstore.index_to_docstore_id))
+    ]
+
+
+def build_vectorstore(embedded, embeddings, window=None, normalize_L2=False):
+    """
+    Builds a FAISS vector store from an iterable of (Document, vector) pairs,
+    adding `window` pairs at a time. `embeddings` embeds queries at search time.
+    Chunks are kept in a compact ChunkStore docstore.
+    Returns None if `embedded` is empty.
+    """
+    from langchain_community.vectorstores import FAISS
+
+    from core.chunk_store import ChunkStore
+
+    window = window or get_setting("EMBED_WINDOW", DEFAULT_EMBED_WINDOW, cast=int)
+    vectorstore = None
+    index_span = span("index")
+    for batch in batched(embedded, window):
+        text_vectors = [(doc.page_content, vector) for doc, vector in batch]
+        metadatas = [doc.metadata for doc, _ in batch]
+        with index_span.time():
+            if vectorstore is None:
+                vectorstore = FAISS.from_embeddings(
+                    text_vectors, embeddings, metadatas=metadatas, normalize_L2=normalize_L2,
+                    docstore=ChunkStore(),
+                )
+            else:
+                vectorstore.add_embeddings(text_vectors, metadatas=metadatas)
+        index_span.add(chunks=len(batch))
+
+    if vectorstore is not None:
+        with index_span.time():
+            optimize_vectorstore(vectorstore)
+    index_span.end()
+    return vectorstore
+
+
+def create_vectorstore(docs, window=None):
+    """
+    Create a FAISS vector store from documents.
+    Chunks are embedded in parallel batches across all configured API keys;
+    a failed batch is retried on another key instead of restarting the job.
+    Vectors already in the embedding cache are reused.
+
+    `docs` may be any iterable (e.g. a generator from the streaming loader): it is
+    consumed `window` chunks at a time and added to the index incrementally, so
+    only one window of texts and vectors is pending at once.
+    Returns None if `docs` is empty.
+    """
     api_keys = get_google_api_keys()
     if not api_keys:
         raise ValueError("No Google API keys found. Please check secrets.toml.")
 
-    last_error = None
-    for i, key in enumerate(api_keys):
+    window = window or get_setting("EMBED_WINDOW", DEFAULT_EMBED_WINDOW, cast=int)
+    dim = get_embedding_dim()
+    embed_span = span("embed")
+
+    def embedded():
         try:
-            embeddings = get_embeddings_model(key)
-            vectorstore = FAISS.from_documents(docs, embeddings)
-            return vectorstore
-        except Exception as e:
-            print(f"⚠️ Key #{i+1} failed for embeddings: {e}")
-            last_error = e
-            continue
-    
-    if last_error:
-        raise last_error
+            for batch in batched(docs, window):
+                texts = [doc.page_content for doc in batch]
+                with embed_span.time():
+                    vectors = embed_documents(texts, api_keys)
+                    if dim:
+                        # Reduced-width Gemini vectors are not unit length; truncating also
+                        # covers cached or API results wider than requested
+                        vectors = truncate_vectors(vectors, dim)
+                embed_span.add(chunks=len(texts), bytes=sum(len(t.encode("utf-8")) for t in texts))
+                yield from zip(batch, vectors)
+        finally:
+            embed_span.end()
+
+    return build_vectorstore(embedded(), get_default_embeddings(), window, normalize_L2=bool(dim))
+
+
+def get_index_params():
+    """
+    ANN index settings: INDEX_KIND (auto/flat/hnsw/ivf), size thresholds, vector
+    compression (INDEX_QUANTIZATION none/sq8/pq, INDEX_RESCORE) and search knobs.
+    """
+    return {
+        "kind": get_setting("INDEX_KIND", "auto"),
+        "flat_max": get_setting("INDEX_FLAT_MAX_VECTORS", FLAT_MAX_VECTORS, cast=int),
+        "hnsw_max": get_setting("INDEX_HNSW_MAX_VECTORS", HNSW_MAX_VECTORS, cast=int),
+        "quantization": get_setting("INDEX_QUANTIZATION", "none"),
+        "rescore": get_setting("INDEX_RESCORE", False, cast=bool),
+        "nprobe": get_setting("INDEX_NPROBE", DEFAULT_NPROBE, cast=int),
+        "ef_search": get_setting("INDEX_EF_SEARCH", DEFAULT_EF_SEARCH, cast=int),
+    }
+
+
+def optimize_vectorstore(vectorstore):
+    """
+    Swaps the store's index for the configured type (flat for small corpora,
+    HNSW or IVF above the size thresholds, optionally quantized) and applies the
+    search settings. Vectors, docstore and ID mapping are unchanged.
+    An index that already has the configured type is left as it is; rebuilds
+    start from `source_vectors`, never from quantized codes.
+    """
+    params = get_index_params()
+    index = vectorstore.index
+    kind = params["kind"]
+    if kind == "auto":
+        kind = choose_index_kind(index.ntotal, params["flat_max"], params["hnsw_max"])
+    # Compare with what would actually be built (PQ falls back to sq8 on small corpora)
+    quantization = effective_quantization(index.ntotal, params["quantization"])
+    rescore = params["rescore"] and quantization != "none"
+
+    current = (index_kind(index), index_quantization(index), isinstance(index, faiss.IndexRefine))
+    if index.ntotal and current != (kind, quantization, rescore):
+        print(f"✅ Rebuilding index of {index.ntotal} vectors as {kind} ({quantization})")
+        vectorstore.index = build_faiss_index(
+            source_vectors(vectorstore), kind=kind, quantization=quantization, rescore=rescore
+        )
+    configure_search(vectorstore.index, nprobe=params["nprobe"], ef_search=params["ef_search"])
+    return vectorstore
 
 
 def embed_text(text):
@@ -45,14 +353,25 @@ def embed_text(text):
     if not api_keys:
         raise ValueError("No Google API keys found. Please check secrets.toml.")
 
+    # Queries use a different task type than documents, so they are cached apart
+    cache = get_embedding_cache()
+    query_model = f"{get_embedding_cache_model()}:query"
+    if cache is not None:
+        cached = cache.get_many(query_model, [text])[0]
+        if cached is not None:
+            return cached
+
     last_error = None
     for i, key in enumerate(api_keys):
         try:
             embeddings = get_embeddings_model(key)
             embedding = embeddings.embed_query(text)
+            if cache is not None:
+                cache.put_many(query_model, [text], [embedding])
             return embedding
         except Exception as e:
             print(f"⚠️ Key #{i+1} failed for embeddings: {e}")
+            increment("embedding_failovers", key=i + 1, reason="quota" if is_quota_error(e) else "error")
             last_error = e
             continue
             
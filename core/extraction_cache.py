@@ -0,0 +1,92 @@
+import dataclasses
+import enum
+import hashlib
+import json
+import os
+import threading
+
+from core.config import get_setting
+from core.sqlite_cache import SQLiteCache
+
+DEFAULT_CACHE_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".rag_cache", "extractions.sqlite3"
+)
+DEFAULT_MAX_MB = 256
+
+
+def _plain(value):
+    """
+    JSON-friendly form of prompt examples (langextract's ExampleData are dataclasses).
+    Other objects raise TypeError: their str() may hold a memory address, which
+    would give every run a new task key.
+    """
+    if dataclasses.is_dataclass(value) and not isinstance(value, type):
+        return dataclasses.asdict(value)
+    if isinstance(value, enum.Enum):
+        return value.value
+    raise TypeError(f"Cannot build an extraction cache key from a {type(value).__name__}")
+
+
+def text_hash(text):
+    """Hash of the exact text: cached results hold character offsets into it."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def task_key(prompt_description, examples, model_id):
+    """
+    Identifies an extraction task: the prompt, its examples and the model.
+    Raises TypeError if the examples hold objects with no stable JSON form.
+    """
+    payload = json.dumps(
+        {"prompt": prompt_description, "examples": list(examples or []), "model": model_id},
+        default=_plain, sort_keys=True,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ExtractionCache(SQLiteCache):
+    """
+    Persistent structured-extraction results keyed by (task key, chunk text hash),
+    so re-running a task over the same chunks makes no model calls. Unlike the
+    embedding cache, the text is not whitespace-normalized: the "start"/"end"
+    offsets of a cached result are only valid for the exact text they came from.
+    Results are stored as JSON in SQLite; least-recently-used rows are evicted
+    once they exceed `max_bytes`.
+    """
+
+    table = "extractions"
+    key_column = "task"
+    value_column = "result"
+    value_type = "TEXT"
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_bytes=DEFAULT_MAX_MB * 1024 * 1024):
+        super().__init__(path, max_bytes)
+
+    def get(self, task, text):
+        """The cached result (a list of extraction dicts) for `text`, or None."""
+        h = text_hash(text)
+        row = self._get_many(task, [h]).get(h)
+        return None if row is None else json.loads(row)
+
+    def put(self, task, text, result):
+        self._put_many(task, [(text_hash(text), json.dumps(result))])
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_extraction_cache():
+    """
+    Returns the process-wide extraction cache, configured by EXTRACTION_CACHE_PATH
+    and EXTRACTION_CACHE_MAX_MB. Returns None when EXTRACTION_CACHE_DISABLED is set.
+    """
+    global _cache
+    if get_setting("EXTRACTION_CACHE_DISABLED", False, cast=bool):
+        return None
+    with _cache_lock:
+        if _cache is None:
+            path = get_setting("EXTRACTION_CACHE_PATH", DEFAULT_CACHE_PATH)
+            max_mb = get_setting("EXTRACTION_CACHE_MAX_MB", DEFAULT_MAX_MB, cast=int)
+            _cache = ExtractionCache(path, max_mb * 1024 * 1024)
+        return _cache
@@ -0,0 +1,194 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+
+from core.config import get_setting
+from core.embeddings import get_docstore_chunks, get_embedding_dim, get_index_params
+from ingestion.vector_store import configure_search, mmap_flags
+
+# Bump when the on-disk layout or the indexing pipeline changes in a way
+# that makes previously cached indexes invalid.
+CACHE_VERSION = 3
+
+DEFAULT_CACHE_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".rag_cache", "index"
+)
+DEFAULT_MAX_MB = 2048
+
+META_FILE = "meta.json"
+
+
+def file_fingerprint(file):
+    """Returns a SHA-256 hex digest of an uploaded file's bytes."""
+    return hashlib.sha256(file.getvalue()).hexdigest()
+
+
+def compute_cache_key(fingerprint, settings):
+    """
+    Builds a cache key from a file fingerprint and the indexing settings
+    (chunker, embedding model, ...), so changing either produces a new entry.
+    """
+    payload = json.dumps(
+        {"version": CACHE_VERSION, "file": fingerprint, "settings": settings},
+        sort_keys=True,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _dir_size(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+class IndexCache:
+    """
+    Content-addressed, on-disk cache of FAISS vector stores.
+
+    Each entry is a `FAISS.save_local` directory plus the ChunkStore text, from
+    which the split chunks are read back. Least-recently-used entries are evicted
+    once the total size exceeds `max_bytes`. With `mmap`, entries are opened
+    memory-mapped and read-only, so processes share them in the page cache.
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_MB * 1024 * 1024, mmap=True):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.mmap = mmap
+        self._lock = threading.Lock()
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def _entry_path(self, key):
+        return os.path.join(self.cache_dir, key)
+
+    def get(self, key, embeddings):
+        """
+        Loads a cached entry.
+        Returns (vectorstore, chunks) or None on a miss or a corrupt entry.
+        """
+        path = self._entry_path(key)
+        meta_path = os.path.join(path, META_FILE)
+        if not os.path.exists(meta_path):
+            return None
+
+        from langchain_community.vectorstores import FAISS
+
+        from core.chunk_store import ChunkStore
+
+        try:
+            # Entries are only ever written by this process family, so the
+            # pickled docstore is trusted.
+            vectorstore = FAISS.load_local(
+                path,
+                embeddings,
+                allow_dangerous_deserialization=True,
+                io_flags=mmap_flags() if self.mmap else 0,
+                normalize_L2=bool(get_embedding_dim()),
+            )
+            if ChunkStore.exists(path):
+                vectorstore.docstore = ChunkStore.load(path, mmap_text=self.mmap)
+        except Exception as e:
+            print(f"⚠️ Dropping unreadable index cache entry {key[:12]}: {e}")
+            shutil.rmtree(path, ignore_errors=True)
+            return None
+
+        # Touch the entry so LRU eviction sees it as recently used
+        now = time.time()
+        try:
+            os.utime(meta_path, (now, now))
+        except OSError:
+            pass
+
+        params = get_index_params()
+        configure_search(vectorstore.index, nprobe=params["nprobe"], ef_search=params["ef_search"])
+        return vectorstore, get_docstore_chunks(vectorstore)
+
+    def put(self, key, vectorstore, metadata=None):
+        """Stores a vector store under `key`, then enforces the size cap."""
+        from core.chunk_store import ChunkStore
+
+        path = self._entry_path(key)
+        if os.path.exists(os.path.join(path, META_FILE)):
+            return
+
+        # Write into a temp dir and rename, so readers never see partial entries
+        tmp_path = os.path.join(self.cache_dir, f".tmp-{uuid.uuid4().hex}")
+        docstore = vectorstore.docstore
+        try:
+            if isinstance(docstore, ChunkStore):
+                # Chunk text goes to its own file so it can be memory-mapped;
+                # the pickled docstore is left empty
+                docstore.save(tmp_path)
+                vectorstore.docstore = ChunkStore()
+            vectorstore.save_local(tmp_path)
+            meta = dict(metadata or {})
+            meta["created"] = time.time()
+            meta["chunks"] = len(vectorstore.index_to_docstore_id)
+            with open(os.path.join(tmp_path, META_FILE), "w", encoding="utf-8") as f:
+                json.dump(meta, f)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            # Another worker may have stored the same key concurrently
+            if not os.path.exists(os.path.join(path, META_FILE)):
+                print(f"⚠️ Could not write index cache entry {key[:12]}: {e}")
+        finally:
+            vectorstore.docstore = docstore
+            shutil.rmtree(tmp_path, ignore_errors=True)
+
+        self.evict()
+
+    def evict(self):
+        """Removes least-recently-used entries until the cache fits in `max_bytes`."""
+        with self._lock:
+            entries = []
+            total = 0
+            for name in os.listdir(self.cache_dir):
+                path = os.path.join(self.cache_dir, name)
+                meta_path = os.path.join(path, META_FILE)
+                if name.startswith(".") or not os.path.exists(meta_path):
+                    continue
+                size = _dir_size(path)
+                total += size
+                entries.append((os.path.getmtime(meta_path), size, path))
+
+            entries.sort()
+            while total > self.max_bytes and entries:
+                _, size, path = entries.pop(0)
+                shutil.rmtree(path, ignore_errors=True)
+                total -= size
+
+    def clear(self):
+        """Deletes every cached entry."""
+        with self._lock:
+            shutil.rmtree(self.cache_dir, ignore_errors=True)
+            os.makedirs(self.cache_dir, exist_ok=True)
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_index_cache():
+    """
+    Returns the process-wide index cache, configured by INDEX_CACHE_DIR,
+    INDEX_CACHE_MAX_MB and INDEX_MMAP. Returns None when INDEX_CACHE_DISABLED is set.
+    """
+    global _cache
+    if get_setting("INDEX_CACHE_DISABLED", False, cast=bool):
+        return None
+    with _cache_lock:
+        if _cache is None:
+            cache_dir = get_setting("INDEX_CACHE_DIR", DEFAULT_CACHE_DIR)
+            max_mb = get_setting("INDEX_CACHE_MAX_MB", DEFAULT_MAX_MB, cast=int)
+            mmap = get_setting("INDEX_MMAP", True, cast=bool)
+            _cache = IndexCache(cache_dir, max_mb * 1024 * 1024, mmap=mmap)
+        return _cache
@@ -0,0 +1,192 @@
+import re
+from collections import Counter, defaultdict
+from collections.abc import Sequence
+
+import numpy as np
+
+# BM25 parameters (Robertson/Sparck Jones defaults)
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Identifiers like "ISO-9001", "4.2.1" or "PN_7731/B" stay one token;
+# their alphanumeric parts are indexed too, so "9001" also matches.
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:[._\-/:][a-z0-9]+)*")
+PART_PATTERN = re.compile(r"[a-z0-9]+")
+QUOTED_PATTERN = re.compile(r"\"[^\"]+\"|'[^']+'")
+# Queries with at most this many tokens can take the lexical fast path
+MAX_LOOKUP_TOKENS = 4
+
+
+def tokenize(text):
+    """Lower-cased word and identifier tokens, plus the parts of compound identifiers."""
+    tokens = TOKEN_PATTERN.findall(text.lower())
+    compounds = [token for token in tokens if not token.isalnum()]
+    if compounds:
+        tokens += PART_PATTERN.findall(" ".join(compounds))
+    return tokens
+
+
+def _is_identifier(token):
+    """True for tokens that mix digits with letters or punctuation, e.g. part numbers."""
+    return any(c.isdigit() for c in token) and (
+        any(c.isalpha() for c in token) or not token.isdigit()
+    )
+
+
+def is_exact_lookup(query):
+    """
+    True for queries that look like exact lookups (a quoted phrase, or a short
+    query naming an identifier, part number or clause reference), which lexical
+    search answers better than embeddings.
+    """
+    if QUOTED_PATTERN.search(query):
+        return True
+    tokens = TOKEN_PATTERN.findall(query.lower())
+    return 0 < len(tokens) <= MAX_LOOKUP_TOKENS and any(_is_identifier(t) for t in tokens)
+
+
+class LexicalIndex:
+    """
+    In-memory BM25 inverted index over a sequence of chunks.
+
+    Each term maps to a compact pair of numpy arrays: the positions of the chunks
+    containing it (int32) and its frequency in each (uint16). Scoring a query
+    touches only the postings of its terms. Chunk sources are stored as integer
+    codes so queries can be restricted to some documents without scanning chunks.
+
+    `chunks` may be any sequence, e.g. a lazy ChunkView; with `keep_chunks=False`
+    only the postings are kept (an index that is merged, not searched).
+    """
+
+    def __init__(self, chunks=(), keep_chunks=True):
+        if not isinstance(chunks, Sequence):
+            chunks = list(chunks)
+        self._norm = None
+        self.source_names = []
+        source_codes = {}
+        codes = []
+        lengths = []
+        # Flat (term id, chunk position, frequency) triples, grouped by term below
+        vocabulary = {}
+        term_ids = []
+        positions = []
+        freqs = []
+        for position, chunk in enumerate(chunks):
+            source = chunk.metadata.get("source")
+            if source not in source_codes:
+                source_codes[source] = len(self.source_names)
+                self.source_names.append(source)
+            codes.append(source_codes[source])
+
+            counts = Counter(tokenize(chunk.page_content))
+            lengths.append(sum(counts.values()))
+            term_ids.extend(vocabulary.setdefault(term, len(vocabulary)) for term in counts)
+            positions.extend([position] * len(counts))
+            freqs.extend(counts.values())
+
+        term_ids = np.array(term_ids, dtype="int32")
+        order = np.argsort(term_ids, kind="stable")
+        positions = np.array(positions, dtype="int32")[order]
+        freqs = np.minimum(np.array(freqs, dtype="int64")[order], 65535).astype("uint16")
+        bounds = np.searchsorted(term_ids[order], np.arange(len(vocabulary) + 1))
+        self.postings = {
+            term: (positions[bounds[i]:bounds[i + 1]], freqs[bounds[i]:bounds[i + 1]])
+            for term, i in vocabulary.items()
+        }
+        self.doc_lengths = np.array(lengths, dtype="int32")
+        self.source_codes = np.array(codes, dtype="int32")
+        self.chunks = chunks if keep_chunks else None
+
+    def __len__(self):
+        return len(self.doc_lengths)
+
+    @classmethod
+    def merge(cls, indexes, chunks=None):
+        """
+        Concatenates several indexes (e.g. one per document) into one, by offsetting
+        their postings arrays; no text is re-tokenized. The merged index searches
+        `chunks` if given (the concatenated chunks, in the same order), otherwise
+        the indexes' own chunks joined into a list.
+        """
+        merged = cls()
+        own_chunks = []
+        postings = defaultdict(lambda: ([], []))
+        lengths = []
+        codes = []
+        source_codes = {}
+        offset = 0
+        for index in indexes:
+            if chunks is None:
+                own_chunks.extend(index.chunks)
+            for term, (positions, freqs) in index.postings.items():
+                postings[term][0].append(positions + offset)
+                postings[term][1].append(freqs)
+            lengths.append(index.doc_lengths)
+            remap = []
+            for source in index.source_names:
+                if source not in source_codes:
+                    source_codes[source] = len(merged.source_names)
+                    merged.source_names.append(source)
+                remap.append(source_codes[source])
+            codes.append(np.array(remap, dtype="int32")[index.source_codes])
+            offset += len(index)
+
+        merged.postings = {
+            term: (np.concatenate(positions), np.concatenate(freqs))
+            for term, (positions, freqs) in postings.items()
+        }
+        if lengths:
+            merged.doc_lengths = np.concatenate(lengths)
+            merged.source_codes = np.concatenate(codes)
+        merged.chunks = own_chunks if chunks is None else chunks
+        return merged
+
+    def search(self, query, k=15, sources=None):
+        """
+        Returns up to `k` (chunk, score) pairs ranked by BM25, best first.
+        If `sources` is given, only chunks whose metadata["source"] is in it match.
+        """
+        n = len(self)
+        terms = [term for term in set(tokenize(query)) if term in self.postings]
+        if not n or not terms:
+            return []
+
+        if self._norm is None:
+            # BM25 length normalization per chunk, fixed once the index is built
+            avg_length = max(float(self.doc_lengths.mean()), 1.0)
+            self._norm = (BM25_K1 * (1 - BM25_B + BM25_B * self.doc_lengths / avg_length)).astype("float32")
+        norm = self._norm
+        scores = np.zeros(n, dtype="float32")
+        for term in terms:
+            positions, freqs = self.postings[term]
+            idf = np.log(1 + (n - len(positions) + 0.5) / (len(positions) + 0.5))
+            tf = freqs.astype("float32")
+            # Positions are unique within a posting list, so plain fancy-index add is safe
+            scores[positions] += idf * tf * (BM25_K1 + 1) / (tf + norm[positions])
+
+        if sources is not None:
+            sources = set(sources)
+            allowed = [i for i, name in enumerate(self.source_names) if name in sources]
+            scores[~np.isin(self.source_codes, allowed)] = 0
+
+        matched = np.flatnonzero(scores)
+        if len(matched) > k:
+            matched = matched[np.argpartition(-scores[matched], k - 1)[:k]]
+        matched = matched[np.argsort(-scores[matched], kind="stable")]
+        return [(self.chunks[i], float(scores[i])) for i in matched]
+
+
+def reciprocal_rank_fusion(rankings, k=60, key=lambda doc: doc.id or doc.page_content):
+    """
+    Merges ranked lists of documents by reciprocal rank fusion: each document
+    scores sum(1 / (k + rank)) over the lists it appears in. Returns documents
+    best first, each once.
+    """
+    scores = {}
+    docs = {}
+    for ranking in rankings:
+        for rank, doc in enumerate(ranking, start=1):
+            doc_key = key(doc)
+            scores[doc_key] = scores.get(doc_key, 0.0) + 1.0 / (k + rank)
+            docs.setdefault(doc_key, doc)
+    return [docs[doc_key] for doc_key in sorted(scores, key=scores.get, reverse=True)]
@@ -1,57 +1,181 @@
-import google.generativeai as genai
+import threading
+import time
+
 from core.config import get_google_api_keys
+from core.telemetry import increment
+from core.throttle import is_quota_error
 
-# Initial config with first key if available
-api_keys = get_google_api_keys()
-if api_keys:
-    genai.configure(api_key=api_keys[0])
+# Models to try, in order of preference (Fallback mechanism)
+MODELS = (
+    "gemini-2.5-flash-lite",
+    "gemini-2.5-flash",
+    "gemini-3-flash",
+)
 
-def generate_answer(prompt, temperature=0.3):
-    # List of models to try in order (Fallback mechanism)
-    models_to_try = [
-        "gemini-2.5-flash-lite",
-        "gemini-2.5-flash",
-        "gemini-3-flash",
-    ]
-
-    # Refresh keys to ensure we have the latest list
-    current_api_keys = get_google_api_keys()
-    if not current_api_keys:
+# Cooldowns double with each consecutive failure, up to MAX_COOLDOWN seconds
+QUOTA_COOLDOWN = 30.0
+ERROR_COOLDOWN = 5.0
+MAX_COOLDOWN = 600.0
+# Weight of the newest sample in each route's moving-average latency
+LATENCY_SMOOTHING = 0.3
+
+
+class RouteHealth:
+    """Health of one (API key, model) pair."""
+
+    __slots__ = ("failures", "cooldown_until", "latency")
+
+    def __init__(self):
+        self.failures = 0
+        self.cooldown_until = 0.0
+        # Moving average of seconds to the first streamed chunk; None until measured
+        self.latency = None
+
+
+def _default_client(api_key):
+    # Imported on first use: the Gemini SDK takes about a second to import
+    import google.ai.generativelanguage as glm
+    return glm.GenerativeServiceClient(client_options={"api_key": api_key})
+
+
+class ModelRouter:
+    """
+    Routes generation requests across API keys and models.
+
+    Each (key, model) pair keeps its own health: a failure puts it in cooldown
+    (exponential, longer for 429/RESOURCE_EXHAUSTED), so later requests skip it
+    instead of paying a failed round trip. Healthy pairs are tried fastest first
+    by measured time to first token, then in model preference order.
+
+    Every key gets its own cached client, so no process-global `genai.configure`
+    is needed and concurrent sessions never race on it.
+    """
+
+    def __init__(self, api_keys, models=MODELS, client_factory=None, clock=time.monotonic):
+        self.api_keys = list(api_keys)
+        self.models = list(models)
+        self._client_factory = client_factory or _default_client
+        self._clock = clock
+        self._clients = {}
+        self._model_cache = {}
+        self._health = {
+            (k, m): RouteHealth() for k in range(len(self.api_keys)) for m in range(len(self.models))
+        }
+        self._lock = threading.Lock()
+
+    def _get_model(self, key_index, model_index):
+        """Cached GenerativeModel bound to one key's client."""
+        import google.generativeai as genai
+
+        route = (key_index, model_index)
+        with self._lock:
+            model = self._model_cache.get(route)
+            if model is None:
+                client = self._clients.get(key_index)
+                if client is None:
+                    client = self._client_factory(self.api_keys[key_index])
+                    self._clients[key_index] = client
+                model = genai.GenerativeModel(self.models[model_index])
+                model._client = client
+                self._model_cache[route] = model
+        return model
+
+    def warm(self):
+        """Builds every key's client and model up front, so the first query skips it."""
+        for key_index in range(len(self.api_keys)):
+            for model_index in range(len(self.models)):
+                self._get_model(key_index, model_index)
+
+    def routes(self):
+        """
+        (key index, model index) pairs in the order to try them: healthy pairs by
+        latency, then pairs still cooling down, soonest available first.
+        """
+        now = self._clock()
+        with self._lock:
+            healthy = [r for r, h in self._health.items() if h.cooldown_until <= now]
+            cooling = [r for r, h in self._health.items() if h.cooldown_until > now]
+            healthy.sort(key=lambda r: (
+                self._health[r].latency is None,
+                self._health[r].latency or 0.0,
+                r[1],
+                r[0],
+            ))
+            cooling.sort(key=lambda r: self._health[r].cooldown_until)
+        return healthy + cooling
+
+    def record_success(self, route, latency):
+        with self._lock:
+            health = self._health[route]
+            health.failures = 0
+            health.cooldown_until = 0.0
+            if health.latency is None:
+                health.latency = latency
+            else:
+                health.latency += LATENCY_SMOOTHING * (latency - health.latency)
+
+    def record_failure(self, route, error):
+        """Puts a route in cooldown; returns the cooldown in seconds."""
+        base = QUOTA_COOLDOWN if is_quota_error(error) else ERROR_COOLDOWN
+        with self._lock:
+            health = self._health[route]
+            health.failures += 1
+            cooldown = min(base * 2 ** (health.failures - 1), MAX_COOLDOWN)
+            health.cooldown_until = self._clock() + cooldown
+        return cooldown
+
+    def generate(self, prompt, generation_config):
+        """
+        Streams a response from the best available route. Routes in cooldown are
+        only tried once every healthy one has failed. Raises the last error if
+        all routes fail.
+        """
+        last_error = None
+        for route in self.routes():
+            key_index, model_index = route
+            model_name = self.models[model_index]
+            try:
+                model = self._get_model(key_index, model_index)
+                started = self._clock()
+                # With stream=True the first chunk is fetched here, so quota and
+                # availability errors surface before any text is yielded
+                response = model.generate_content(prompt, generation_config=generation_config, stream=True)
+                self.record_success(route, self._clock() - started)
+                return response
+            except Exception as e:
+                cooldown = self.record_failure(route, e)
+                print(f"⚠️ Key #{key_index+1} | Model {model_name} failed: {e} (cooling down {cooldown:.0f}s)")
+                increment("llm_failovers", key=key_index + 1, model=model_name,
+                          reason="quota" if is_quota_error(e) else "error")
+                last_error = e
+
+        if last_error:
+            raise last_error
         raise ValueError("No Google API keys found. Please check secrets.toml.")
 
-    last_error = None
-
-    # 🔄 Outer Loop: Iterate through API Keys
-    for key_index, api_key in enumerate(current_api_keys):
-        try:
-            # Configure with the current key
-            genai.configure(api_key=api_key)
-            
-            # 🔄 Inner Loop: Iterate through Models
-            for model_name in models_to_try:
-                try:
-                    model = genai.GenerativeModel(model_name)
-                    response = model.generate_content(
-                        prompt,
-                        generation_config={
-                            "temperature": temperature,
-                            "max_output_tokens": 1024
-                        },
-                        stream=True
-                    )
-                    return response
-                except Exception as e:
-                    print(f"⚠️ Key #{key_index+1} | Model {model_name} failed: {e}")
-                    last_error = e
-                    continue
-            
-            print(f"⚠️ All models failed for Key #{key_index+1}. Switching to next key...")
-            
-        except Exception as e:
-            print(f"⚠️ Critical error with Key #{key_index+1}: {e}")
-            last_error = e
-            continue
-
-    # If all models fail, raise the last error
-    if last_error:
-        raise last_error
+
+_router = None
+_router_lock = threading.Lock()
+
+
+def get_router():
+    """Returns the process-wide router, rebuilt if the configured API keys change."""
+    global _router
+    api_keys = get_google_api_keys()
+    if not api_keys:
+        raise ValueError("No Google API keys found. Please check secrets.toml.")
+    with _router_lock:
+        if _router is None or _router.api_keys != api_keys:
+            _router = ModelRouter(api_keys)
+        return _router
+
+
+def generate_answer(prompt, temperature=0.3):
+    """Streams an answer from the healthiest, fastest (key, model) pair."""
+    return get_router().generate(
+        prompt,
+        generation_config={
+            "temperature": temperature,
+            "max_output_tokens": 1024
+        },
+    )
@@ -1,4 +1,5 @@
-import pdfplumber
+import os
+import tempfile
 import pandas as pd
 from docx import Document as DocxDocument
 from langchain_core.documents import Document
@@ -6,6 +7,8 @@ from langchain_core.documents import Document
 import pytesseract
 from pdf2image import convert_from_bytes
 
+from ingestion.pdf_text import extract_pdf_pages
+
 
 def load_document(uploaded_file):
 
@@ -16,9 +19,14 @@ def load_document(uploaded_file):
 
     if name.endswith(".pdf"):
 
-        # Try normal extraction first
-        with pdfplumber.open(uploaded_file) as pdf:
-            text = "\n".join([page.extract_text() or "" for page in pdf.pages])
+        # Try normal extraction first (pages are extracted in parallel for long PDFs)
+        with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as temp_file:
+            temp_file.write(uploaded_file.read())
+            temp_path = temp_file.name
+        try:
+            text = "\n".join(extract_pdf_pages(temp_path)["pages"])
+        finally:
+            os.remove(temp_path)
 
         # If empty → use OCR
         if not text.strip():
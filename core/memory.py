@@ -0,0 +1,201 @@
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from core.config import get_setting
+from core.context_builder import estimate_tokens
+from core.embeddings import encode_local
+from core.llm import generate_answer
+
+# Token budgets for each part of the history block in the prompt
+DEFAULT_RECENT_TOKENS = 1500
+DEFAULT_SUMMARY_TOKENS = 400
+# Older turns recalled by similarity to the question, and their size cap
+DEFAULT_RECALL_K = 3
+RECALL_TURN_TOKENS = 300
+RECALL_MIN_SIMILARITY = 0.3
+# Threads for background turn updates, shared by every ConversationMemory
+MEMORY_WORKERS = 4
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=MEMORY_WORKERS, thread_name_prefix="memory")
+        return _executor
+
+
+def _clip(text, tokens):
+    """Cuts text to roughly `tokens` tokens."""
+    limit = tokens * 4
+    return text if len(text) <= limit else text[:limit].rstrip() + " …"
+
+
+def summarize_with_llm(summary, turns, max_tokens=DEFAULT_SUMMARY_TOKENS):
+    """Folds `turns` into the running `summary` with the answer model."""
+    exchanges = "\n".join(f"User: {t['user']}\nAssistant: {t['assistant']}" for t in turns)
+    prompt = f"""Update the running summary of a conversation between a user and a document assistant.
+Keep facts, names, numbers and open questions the user may refer back to. Drop pleasantries.
+Write at most {max_tokens * 3 // 4} words.
+
+### Current summary:
+{summary or "(none)"}
+
+### New exchanges:
+{exchanges}
+
+### Updated summary:"""
+    parts = []
+    for chunk in generate_answer(prompt, temperature=0.0):
+        try:
+            if chunk.text:
+                parts.append(chunk.text)
+        except Exception:
+            pass
+    return "".join(parts).strip()
+
+
+class ConversationMemory:
+    """
+    Chat history for the answer prompt, bounded in size however long the session runs.
+
+    The history block has three parts:
+    - the most recent turns, as many as fit `recent_tokens`;
+    - a running summary of the turns that fell out of that window, updated on a
+      background thread after each answer so it never delays a response;
+    - up to `recall_k` older turns most similar to the current question, found
+      with a small per-session vector index (local embeddings) over all turns.
+
+    `summarize(summary, turns)` and `embed(texts)` can be replaced, e.g. offline.
+    """
+
+    def __init__(self, recent_tokens=None, summary_tokens=None, recall_k=None,
+                 summarize=summarize_with_llm, embed=encode_local):
+        self.recent_tokens = recent_tokens or get_setting("MEMORY_RECENT_TOKENS", DEFAULT_RECENT_TOKENS, cast=int)
+        self.summary_tokens = summary_tokens or get_setting("MEMORY_SUMMARY_TOKENS", DEFAULT_SUMMARY_TOKENS, cast=int)
+        self.recall_k = get_setting("MEMORY_RECALL_K", DEFAULT_RECALL_K, cast=int) if recall_k is None else recall_k
+        self.summarize = summarize
+        self.embed = embed
+        # {"user", "assistant", "vector"}, oldest first
+        self.turns = []
+        self.summary = ""
+        # Turns before this index are covered by the summary
+        self._summarized = 0
+        self._lock = threading.Lock()
+        # Turns waiting for their update; one drain task at a time applies them in order
+        self._queue = deque()
+        self._draining = False
+        self._pending = None
+
+    def __len__(self):
+        return len(self.turns)
+
+    def add_turn(self, user, assistant):
+        """Records an exchange; embedding and summarizing happen in the background."""
+        turn = {"user": user, "assistant": assistant, "vector": None}
+        with self._lock:
+            self.turns.append(turn)
+            self._queue.append(turn)
+            if not self._draining:
+                self._draining = True
+                self._pending = _get_executor().submit(self._drain)
+
+    def _drain(self):
+        while True:
+            with self._lock:
+                if not self._queue:
+                    self._draining = False
+                    return
+                turn = self._queue.popleft()
+            self._update(turn)
+
+    def _update(self, turn):
+        try:
+            turn["vector"] = np.asarray(self.embed([f"{turn['user']}\n{turn['assistant']}"])[0], dtype="float32")
+        except Exception as e:
+            print(f"⚠️ Could not embed conversation turn: {e}")
+
+        with self._lock:
+            start = self._window_start()
+            pending = self.turns[self._summarized:start]
+            summary = self.summary
+        if not pending:
+            return
+        try:
+            summary = _clip(self.summarize(summary, pending), self.summary_tokens)
+        except Exception as e:
+            # The turns stay unsummarized and are retried after the next answer
+            print(f"⚠️ Could not update conversation summary: {e}")
+            return
+        with self._lock:
+            self.summary = summary
+            self._summarized = max(self._summarized, start)
+
+    def wait(self):
+        """Blocks until background updates for the turns added so far are done."""
+        pending = self._pending
+        if pending is not None:
+            pending.result()
+
+    def _turn_tokens(self, turn):
+        return estimate_tokens(turn["user"]) + estimate_tokens(turn["assistant"])
+
+    def _window_start(self):
+        """Index of the oldest turn in the recent window (call with the lock held)."""
+        used = 0
+        start = len(self.turns)
+        while start > 0:
+            used += self._turn_tokens(self.turns[start - 1])
+            if used > self.recent_tokens and start < len(self.turns):
+                break
+            start -= 1
+        return start
+
+    def _recall(self, query, older):
+        """Older turns most similar to `query`, in conversation order."""
+        candidates = [turn for turn in older if turn["vector"] is not None]
+        if not candidates or not self.recall_k:
+            return []
+        try:
+            query_vector = np.asarray(self.embed([query])[0], dtype="float32")
+        except Exception as e:
+            print(f"⚠️ Could not embed question for history recall: {e}")
+            return []
+        scores = np.stack([turn["vector"] for turn in candidates]) @ query_vector
+        best = [i for i in np.argsort(-scores)[:self.recall_k] if scores[i] >= RECALL_MIN_SIMILARITY]
+        return [candidates[i] for i in sorted(best)]
+
+    def build_history(self, query):
+        """The history block for the prompt, or "" if there is no conversation yet."""
+        with self._lock:
+            start = self._window_start()
+            recent = self.turns[start:]
+            older = self.turns[:start]
+            summary = self.summary
+
+        sections = []
+        if summary:
+            sections.append(f"Summary of earlier conversation:\n{summary}")
+        recalled = self._recall(query, older)
+        if recalled:
+            sections.append("Relevant earlier exchanges:\n" + "\n".join(
+                f"User: {_clip(t['user'], RECALL_TURN_TOKENS)}\nAssistant: {_clip(t['assistant'], RECALL_TURN_TOKENS)}"
+                for t in recalled
+            ))
+        if recent:
+            lines = []
+            for t in recent:
+                user, assistant = t["user"], t["assistant"]
+                if self._turn_tokens(t) > self.recent_tokens:
+                    # Only the newest turn can exceed the window; clip it to fit
+                    user = _clip(user, self.recent_tokens // 4)
+                    assistant = _clip(assistant, self.recent_tokens * 3 // 4)
+                lines.append(f"User: {user}\nAssistant: {assistant}")
+            sections.append("Recent messages:\n" + "\n".join(lines))
+        return "\n\n".join(sections)
@@ -1,86 +1,152 @@
-from ingestion.loader import load_document
-from core.embeddings import create_vectorstore, get_embeddings_model, get_local_embeddings
+import asyncio
+import time
+
+from ingestion.chunker import PooledSemanticChunker
+from ingestion.loader import iter_document
+from ingestion.stream import prefetch, split_stream
+from ingestion.tabular import get_table_params
+from core.embeddings import (
+    EMBEDDING_MODEL,
+    LOCAL_EMBEDDING_MODEL,
+    build_vectorstore,
+    create_vectorstore,
+    encode_local,
+    get_default_embeddings,
+    get_docstore_chunks,
+    get_embedding_dim,
+    get_index_params,
+    get_indexing_mode,
+    get_local_embeddings,
+)
+from core.answer_cache import get_answer_cache, replay, scope_key
+from core.concurrency import run_in_thread, run_sync
+from core.config import get_setting
+from core.index_cache import compute_cache_key, file_fingerprint, get_index_cache
+from core.context_builder import build_context, estimate_tokens, get_context_params
 from core.llm import generate_answer
+from core.retriever import hybrid_search_async
 from core.search_tool import search_web
+from core.table_query import answer_table_query, looks_tabular
+from core.telemetry import Trace, current_trace, record_span, span, traced, use_trace
+
+# Fallback splitter settings (used when semantic chunking fails)
+CHUNK_SIZE = 1000
+CHUNK_OVERLAP = 200
+# Chunks buffered between the loader/splitter thread and the embedder
+PREFETCH_DEPTH = 256
+# Default per-stage query time limits (seconds)
+RETRIEVAL_TIMEOUT = 30.0
+WEB_SEARCH_TIMEOUT = 5.0
+TABLE_QUERY_TIMEOUT = 5.0
+
+
+def get_index_settings():
+    """Settings that change the produced index; part of the index cache key."""
+    local = get_indexing_mode() == "local"
+    return {
+        "loader": "paged",
+        "chunker": "semantic-pooled" if local else "semantic",
+        "chunker_model": LOCAL_EMBEDDING_MODEL,
+        "fallback_chunk_size": CHUNK_SIZE,
+        "fallback_chunk_overlap": CHUNK_OVERLAP,
+        "embedding_model": LOCAL_EMBEDDING_MODEL if local else EMBEDDING_MODEL,
+        "embedding_dim": None if local else get_embedding_dim(),
+        "table": get_table_params(),
+        # Build-time index settings only; search knobs can change without a rebuild
+        "index": {
+            k: v for k, v in get_index_params().items()
+            if k in ("kind", "flat_max", "hnsw_max", "quantization", "rescore")
+        },
+    }
 
-from langchain_core.documents import Document
-from langchain_experimental.text_splitter import SemanticChunker
-from langchain_text_splitters import RecursiveCharacterTextSplitter
 
 def index_document(file):
     """
     Processes the uploaded file: loads, splits, and creates a vector store.
     Returns (vectorstore, split_docs) to be cached in session state.
+    Indexes are cached on disk by file content and index settings, so
+    re-uploading the same bytes skips loading, chunking and embedding.
+    Stage timings and sizes are recorded as an "index" telemetry trace.
+    Raises DocumentLoadError if the file cannot be read to the end; nothing is cached then.
     """
     if not file:
         return None, []
 
-    documents = load_document(file)
-    if not documents:
-        return None, []
+    trace = Trace("index", source=file.name)
+    with use_trace(trace):
+        vectorstore, split_docs = _index_document(file)
+    trace.finish(chunks=len(split_docs))
+    return vectorstore, split_docs
 
-    split_docs = []
 
-    try:
-        # Try Semantic Chunking first
-        splitter = SemanticChunker(get_local_embeddings())
-        split_docs = splitter.split_documents(documents)
-    except Exception as e:
-        # Handle Rate Limits (429) by falling back to standard splitter
-        if "429" in str(e) or "RESOURCE_EXHAUSTED" in str(e):
-            print("⚠️ Quota exceeded for Semantic Chunking. Falling back to standard chunking.")
-            splitter = RecursiveCharacterTextSplitter(
-                chunk_size=1000,
-                chunk_overlap=200
-            )
-            split_docs = splitter.split_documents(documents)
-        else:
-            raise e
-
-    if split_docs:
-        # 3️⃣ Create vector store
-        vectorstore = create_vectorstore(split_docs)
-        return vectorstore, split_docs
-    
-    return None, []
+def _document_sizes(doc):
+    unit = "pages" if "page" in doc.metadata else "blocks"
+    return {unit: 1, "bytes": len(doc.page_content.encode("utf-8"))}
 
 
-def get_rag_response(query, vectorstore=None, chunks=None, chat_history=None, enable_search=False):
-    """
-    Generates an answer using the pre-computed vectorstore.
-    """
-    docs = []
+def _chunk_sizes(chunk):
+    return {"chunks": 1, "bytes": len(chunk.page_content.encode("utf-8"))}
 
-    # 4️⃣ Retrieve relevant docs
-    if vectorstore:
-        # Retrieve top 15 chunks
-        docs = vectorstore.similarity_search(query, k=15)
-        
-        # Always include the beginning of the doc where Table of Contents usually lives
-        if chunks:
-            docs.extend(chunks[:2])
 
-    # 4.5️⃣ Web Search (Optional)
-    if enable_search:
-        try:
-            web_results = search_web(query)
-            if web_results:
-                print(f"✅ Web Search Results Found: {len(web_results)} chars")
-                docs.append(Document(page_content=f"Web Search Results:\n{web_results}", metadata={"source": "DuckDuckGo"}))
-            else:
-                print("⚠️ Web Search returned empty results.")
-        except Exception as e:
-            print(f"⚠️ Web search failed: {e}")
+def _index_document(file):
+    cache = get_index_cache()
+    cache_key = None
+    if cache is not None:
+        cache_key = compute_cache_key(file_fingerprint(file), get_index_settings())
+        with span("cache_load"):
+            cached = cache.get(cache_key, get_default_embeddings())
+        if cached:
+            vectorstore, split_docs = cached
+            print(f"✅ Loaded cached index for {file.name} ({len(split_docs)} chunks)")
+            vectorstore.docstore.set_source(file.name)
+            return vectorstore, split_docs
 
-    # 5️⃣ Generate answer
-    if docs:
-        context_text = "\n\n".join([doc.page_content for doc in docs])
+    # Stream pages → chunks → embedded windows, so memory stays bounded on huge files.
+    # Loading and splitting run one window ahead of embedding in a background thread.
+    documents = traced(iter_document(file), span("load"), _document_sizes)
+    if get_indexing_mode() == "local":
+        # Fully local: chunk vectors are pooled from the chunker's own sentence
+        # embeddings, so each sentence is embedded once and nothing leaves the machine
+        embedded = traced(
+            PooledSemanticChunker(encode_local).stream(documents), span("chunk"), lambda pair: _chunk_sizes(pair[0])
+        )
+        vectorstore = build_vectorstore(prefetch(embedded, depth=PREFETCH_DEPTH), get_local_embeddings())
     else:
+        from langchain_experimental.text_splitter import SemanticChunker
+        from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+        chunks = traced(split_stream(
+            documents,
+            SemanticChunker(get_local_embeddings()),
+            fallback_splitter=RecursiveCharacterTextSplitter(
+                chunk_size=CHUNK_SIZE,
+                chunk_overlap=CHUNK_OVERLAP
+            ),
+        ), span("chunk"), _chunk_sizes)
+
+        # 3️⃣ Create vector store
+        vectorstore = create_vectorstore(prefetch(chunks, depth=PREFETCH_DEPTH))
+    if vectorstore is None:
+        return None, []
+
+    if cache is not None:
+        cache.put(cache_key, vectorstore, metadata={"source": file.name})
+    # Chunks are read back from the docstore so the text is held only once
+    return vectorstore, get_docstore_chunks(vectorstore)
+
+
+def build_rag_prompt(query, context_text, chat_history=None, history_text=None):
+    """
+    Builds the answer prompt from packed context, chat history and the question.
+    `history_text` (e.g. from ConversationMemory) replaces the last-10-messages window.
+    """
+    context_text = context_text.strip()
+    if not context_text:
         context_text = "No specific document context provided. Answer based on general knowledge."
         
     # Format Chat History
-    history_text = ""
-    if chat_history:
+    history_text = history_text or ""
+    if chat_history and not history_text:
         for msg in chat_history[-10:]:  # Include last 10 messages for context
             role = "User" if msg["role"] == "user" else "Assistant"
             history_text += f"{role}: {msg['content']}\n"
@@ -89,7 +155,7 @@ def get_rag_response(query, vectorstore=None, chunks=None, chat_history=None, en
         history_text = "No previous conversation."
 
     # Improved Prompt Engineering
-    prompt = f"""You are an intelligent AI assistant specialized in analyzing documents and web search results.
+    return f"""You are an intelligent AI assistant specialized in analyzing documents and web search results.
 
 ### Instructions:
 1. **Context-Driven**: Answer the question using the information provided in the 'Context' section below. This context includes **Document Content** and **Web Search Results**.
@@ -110,12 +176,259 @@ def get_rag_response(query, vectorstore=None, chunks=None, chat_history=None, en
 
 ### Answer:"""
 
+
+def get_query_timeouts():
+    """Per-stage time limits in seconds (QUERY_RETRIEVAL_TIMEOUT, QUERY_WEB_SEARCH_TIMEOUT, QUERY_TABLE_TIMEOUT)."""
+    return {
+        "retrieval": get_setting("QUERY_RETRIEVAL_TIMEOUT", RETRIEVAL_TIMEOUT, cast=float),
+        "web_search": get_setting("QUERY_WEB_SEARCH_TIMEOUT", WEB_SEARCH_TIMEOUT, cast=float),
+        "table_query": get_setting("QUERY_TABLE_TIMEOUT", TABLE_QUERY_TIMEOUT, cast=float),
+    }
+
+
+def _table_query(query, tables, sources):
+    """`answer_table_query` on a worker thread, timed there as the "table_query" span."""
+    with span("table_query"):
+        return answer_table_query(query, tables, generate_answer, sources)
+
+
+async def prepare_prompt_async(query, vectorstore=None, chunks=None, chat_history=None, enable_search=False,
+                               sources=None, lexical_index=None, memory=None, tables=None):
+    """
+    Retrieves context and builds the answer prompt. The web search starts first
+    and runs on its own thread while the query is embedded and searched, so its
+    latency overlaps retrieval. If it has not finished by its deadline, the prompt
+    is built without it. With a ConversationMemory, the history block is
+    assembled alongside retrieval too. With a TableStore (`tables`), questions
+    that read like filters or aggregates are also planned and computed over the
+    tables in pandas, and only the small result goes into the prompt.
+    Records "retrieve" and "prompt" spans in the current telemetry trace, and the
+    docstore IDs of the chunks put in the prompt as its "chunk_ids" attribute.
+    """
+    timeouts = get_query_timeouts()
+    started = time.perf_counter()
+
+    # 4.5️⃣ Web Search (Optional), started before retrieval so the two overlap
+    web_task = None
+    if enable_search:
+        web_task = asyncio.ensure_future(run_in_thread(search_web, query))
+    history_task = None
+    if memory is not None:
+        history_task = asyncio.ensure_future(run_in_thread(memory.build_history, query))
+    table_task = None
+    if tables is not None and len(tables) and looks_tabular(query, tables, sources):
+        table_task = asyncio.ensure_future(run_in_thread(_table_query, query, tables, sources))
+
+    # 4️⃣ Retrieve relevant docs
+    docs = []
+    if vectorstore or lexical_index is not None:
+        # Over-fetch; context packing below keeps what fits the token budget
+        fetch_k = get_context_params()["fetch_k"]
+        docs = await hybrid_search_async(
+            query, vectorstore, lexical_index, k=fetch_k, sources=sources, timeout=timeouts["retrieval"]
+        )
+
+        # Always include the beginning of the doc where Table of Contents usually lives
+        if chunks:
+            docs.extend(chunks[:2])
+    retrieval_seconds = time.perf_counter() - started
+    record_span("retrieve", retrieval_seconds, chunks=len(docs))
+
+    # Deduplicate, diversify and pack into the token budget, with source/page labels
+    prompt_span = span("prompt")
+    with prompt_span.time():
+        context_text, packed = build_context(query, docs)
+    trace = current_trace()
+    if trace is not None:
+        trace.attributes["chunk_ids"] = [doc.id for doc in packed if doc.id]
+
+    if web_task is not None:
+        remaining = max(0.0, timeouts["web_search"] - (time.perf_counter() - started))
+        try:
+            web_results = await asyncio.wait_for(web_task, remaining)
+            if web_results:
+                print(f"✅ Web Search Results Found: {len(web_results)} chars "
+                      f"(retrieval {retrieval_seconds:.2f}s, total {time.perf_counter() - started:.2f}s)")
+                context_text += f"\n\n[Source: DuckDuckGo]\nWeb Search Results:\n{web_results}"
+            else:
+                print("⚠️ Web Search returned empty results.")
+        except asyncio.TimeoutError:
+            print(f"⚠️ Web search exceeded {timeouts['web_search']}s. Answering without it.")
+        except Exception as e:
+            print(f"⚠️ Web search failed: {e}")
+
+    if table_task is not None:
+        remaining = max(0.0, timeouts["table_query"] - (time.perf_counter() - started))
+        try:
+            table_result = await asyncio.wait_for(table_task, remaining)
+            if table_result:
+                context_text = f"{table_result}\n\n{context_text}"
+        except asyncio.TimeoutError:
+            print(f"⚠️ Table query exceeded {timeouts['table_query']}s. Answering without it.")
+        except Exception as e:
+            print(f"⚠️ Table query failed: {e}")
+
+    history_text = await history_task if history_task is not None else None
+    with prompt_span.time():
+        prompt = build_rag_prompt(query, context_text, chat_history, history_text)
+    prompt_span.add(chunks=len(packed), tokens=estimate_tokens(prompt))
+    prompt_span.end()
+    return prompt
+
+
+def _chunk_text(chunk):
+    try:
+        if hasattr(chunk, "text") and chunk.text:
+            return chunk.text
+    except Exception:
+        # Skip chunks blocked by safety filters to prevent crashing
+        pass
+    return None
+
+
+def _record_answer(trace, started, first_token, answer):
+    """Records the "last_token" span (first to last streamed token) and closes the query trace."""
+    record_span("last_token", time.perf_counter() - (first_token or started), trace,
+                tokens=estimate_tokens(answer), bytes=len(answer.encode("utf-8")))
+    trace.finish()
+
+
+def _answer_cache_scope(corpus_key, enable_search, sources):
+    """The answer cache and scope for a query, or (None, None) if it should not be cached."""
+    # Answers that include live web results are not reused
+    if not corpus_key or enable_search:
+        return None, None
+    cache = get_answer_cache()
+    if cache is None:
+        return None, None
+    return cache, scope_key(corpus_key, sources)
+
+
+async def get_rag_response_async(query, vectorstore=None, chunks=None, chat_history=None, enable_search=False,
+                                 sources=None, lexical_index=None, corpus_key=None, memory=None, trace=None,
+                                 tables=None):
+    """
+    Async version of `get_rag_response`: an async generator of answer text.
+    Blocking calls (embedding, FAISS, web search, the Gemini stream) run on worker threads.
+    """
+    trace = trace or Trace("query")
+    cache, scope = _answer_cache_scope(corpus_key, enable_search, sources)
+    if cache is not None:
+        with use_trace(trace), span("cache_lookup"):
+            cached = await run_in_thread(cache.lookup, scope, query, chat_history)
+        if cached is not None:
+            trace.finish(cached=True)
+            for text in replay(cached):
+                yield text
+            if memory is not None:
+                memory.add_turn(query, cached)
+            return
+
+    with use_trace(trace):
+        prompt = await prepare_prompt_async(
+            query, vectorstore, chunks, chat_history, enable_search, sources, lexical_index, memory, tables
+        )
+
+    # 5️⃣ Generate answer
+    started = time.perf_counter()
+    first_token = None
+    response_stream = iter(await run_in_thread(generate_answer, prompt))
+    done = object()
+    parts = []
+    while True:
+        chunk = await run_in_thread(next, response_stream, done)
+        if chunk is done:
+            break
+        text = _chunk_text(chunk)
+        if text:
+            if first_token is None:
+                first_token = time.perf_counter()
+                record_span("first_token", first_token - started, trace)
+            parts.append(text)
+            yield text
+
+    answer = "".join(parts)
+    _record_answer(trace, started, first_token, answer)
+    if cache is not None:
+        await run_in_thread(cache.store, scope, query, answer, chat_history)
+    if memory is not None:
+        memory.add_turn(query, answer)
+
+
+def get_rag_response(query, vectorstore=None, chunks=None, chat_history=None, enable_search=False, sources=None,
+                     lexical_index=None, corpus_key=None, memory=None, trace=None, tables=None):
+    """
+    Generates an answer using the pre-computed vectorstore.
+    If `sources` is given, only chunks whose metadata["source"] is in it are retrieved.
+    With a `lexical_index` (BM25), retrieval is hybrid; exact-lookup queries are
+    answered lexically without embedding the query.
+    Retrieval and web search run concurrently (see `prepare_prompt_async`); the
+    answer is streamed as a plain generator.
+    With a `corpus_key` (the corpus fingerprint), answers are cached and repeated
+    or near-duplicate questions are replayed without retrieval or generation.
+    With a `memory` (ConversationMemory), history in the prompt comes from it and
+    the finished exchange is recorded in it.
+    With `tables` (the corpus TableStore), filter/aggregate/lookup questions over
+    spreadsheets are computed directly (see `core.table_query`).
+    Stage timings go to a telemetry Trace ("query"); pass `trace` to read the
+    breakdown afterwards.
+    """
+    yield from start_rag_response(
+        query, vectorstore, chunks, chat_history, enable_search, sources, lexical_index, corpus_key, memory,
+        trace, tables,
+    )
+
+
+def start_rag_response(query, vectorstore=None, chunks=None, chat_history=None, enable_search=False, sources=None,
+                       lexical_index=None, corpus_key=None, memory=None, trace=None, tables=None):
+    """
+    `get_rag_response` in two steps: the answer cache lookup and the prompt
+    (retrieval, web search, table query) happen now, and the returned generator
+    streams the answer. Callers that lock the index while it is searched (e.g.
+    the HTTP service) call this under the lock and stream outside it.
+    """
+    trace = trace or Trace("query")
+    cache, scope = _answer_cache_scope(corpus_key, enable_search, sources)
+    if cache is not None:
+        with use_trace(trace), span("cache_lookup"):
+            cached = cache.lookup(scope, query, chat_history)
+        if cached is not None:
+            return _replay_answer(query, cached, memory, trace)
+
+    with use_trace(trace):
+        prompt = run_sync(prepare_prompt_async(
+            query, vectorstore, chunks, chat_history, enable_search, sources, lexical_index, memory, tables
+        ))
+    return _stream_answer(query, prompt, chat_history, memory, trace, cache, scope)
+
+
+def _replay_answer(query, cached, memory, trace):
+    trace.finish(cached=True)
+    yield from replay(cached)
+    if memory is not None:
+        memory.add_turn(query, cached)
+
+
+def _stream_answer(query, prompt, chat_history, memory, trace, cache, scope):
+    # 5️⃣ Generate answer
+    started = time.perf_counter()
+    first_token = None
     response_stream = generate_answer(prompt)
 
+    parts = []
     for chunk in response_stream:
-        try:
-            if hasattr(chunk, "text") and chunk.text:
-                yield chunk.text
-        except Exception:
-            # Skip chunks blocked by safety filters to prevent crashing
-            pass
+        text = _chunk_text(chunk)
+        if text:
+            if first_token is None:
+                first_token = time.perf_counter()
+                record_span("first_token", first_token - started, trace)
+            parts.append(text)
+            yield text
+
+    # Only complete answers are cached and remembered
+    answer = "".join(parts)
+    _record_answer(trace, started, first_token, answer)
+    if cache is not None:
+        cache.store(scope, query, answer, chat_history)
+    if memory is not None:
+        memory.add_turn(query, answer)
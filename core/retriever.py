@@ -1,8 +1,106 @@
+import asyncio
+import time
+
 import numpy as np
 
+from core.concurrency import run_in_thread
+from core.lexical_index import is_exact_lookup, reciprocal_rank_fusion
+
+# Candidates scanned when retrieval is restricted to some sources
+FILTER_FETCH_K = 200
+
+
 def retrieve(query_embedding, index, chunks, top_k=4):
     D, I = index.search(
         np.array([query_embedding]).astype("float32"), top_k
     )
     return [chunks[i] for i in I[0]]
 
+
+def _chunk_store_search(vectorstore, query, k, sources):
+    """
+    Vector search straight over a ChunkStore docstore: source filtering runs on
+    the store's row arrays, and Documents are built only for the `k` results.
+    """
+    import faiss
+
+    store = vectorstore.docstore
+    vector = np.array([vectorstore.embeddings.embed_query(query)], dtype="float32")
+    if vectorstore._normalize_L2:
+        faiss.normalize_L2(vector)
+    _, positions = vectorstore.index.search(vector, k if sources is None else FILTER_FETCH_K)
+    rows = [store.row(vectorstore.index_to_docstore_id[p]) for p in positions[0] if p != -1]
+    rows = [row for row in rows if row is not None]
+    if sources is not None:
+        allowed = set(sources)
+        rows = [row for row in rows if store.source(row) in allowed]
+    return [store.document(row) for row in rows[:k]]
+
+
+def vector_search(vectorstore, query, k=15, sources=None):
+    """Top `k` chunks by embedding similarity, optionally only from `sources`."""
+    from core.chunk_store import ChunkStore
+
+    if isinstance(vectorstore.docstore, ChunkStore) and vectorstore.embeddings is not None:
+        return _chunk_store_search(vectorstore, query, k, sources)
+    if sources is None:
+        return vectorstore.similarity_search(query, k=k)
+    allowed = set(sources)
+    return vectorstore.similarity_search(
+        query,
+        k=k,
+        filter=lambda metadata: metadata.get("source") in allowed,
+        fetch_k=FILTER_FETCH_K,
+    )
+
+
+def _lexical_candidates(query, lexical_index, k, sources):
+    """BM25 results, and whether they alone answer the query (the lexical fast path)."""
+    if lexical_index is None:
+        return [], False
+    started = time.perf_counter()
+    lexical = [doc for doc, _ in lexical_index.search(query, k=k, sources=sources)]
+    if lexical and is_exact_lookup(query):
+        elapsed = (time.perf_counter() - started) * 1000
+        print(f"✅ Lexical fast path: {len(lexical)} chunks in {elapsed:.1f}ms")
+        return lexical, True
+    return lexical, False
+
+
+def _fuse(dense, lexical, k):
+    if not lexical:
+        return dense
+    if not dense:
+        return lexical
+    return reciprocal_rank_fusion([dense, lexical])[:k]
+
+
+def hybrid_search(query, vectorstore=None, lexical_index=None, k=15, sources=None):
+    """
+    Retrieves the top `k` chunks for `query`.
+
+    Queries that look like exact lookups (identifiers, part numbers, quoted
+    phrases) are answered from the BM25 index alone when it has matches, which
+    skips the query embedding call. Other queries run vector and BM25 search
+    and merge both rankings with reciprocal rank fusion.
+    """
+    lexical, done = _lexical_candidates(query, lexical_index, k, sources)
+    if done or vectorstore is None:
+        return lexical
+    return _fuse(vector_search(vectorstore, query, k=k, sources=sources), lexical, k)
+
+
+async def hybrid_search_async(query, vectorstore=None, lexical_index=None, k=15, sources=None, timeout=None):
+    """
+    Async `hybrid_search`: the vector search (query embedding call + FAISS) runs on
+    a worker thread. If it exceeds `timeout` seconds, the BM25 results are used alone.
+    """
+    lexical, done = _lexical_candidates(query, lexical_index, k, sources)
+    if done or vectorstore is None:
+        return lexical
+    try:
+        dense = await run_in_thread(vector_search, vectorstore, query, k, sources, timeout=timeout)
+    except asyncio.TimeoutError:
+        print(f"⚠️ Vector search timed out after {timeout}s. Using keyword results only.")
+        return lexical
+    return _fuse(dense, lexical, k)
@@ -1,29 +1,344 @@
-from ddgs import DDGS
+import html
+import http.client
+import ipaddress
+import re
+import socket
+import threading
+import urllib.parse
+import urllib.request
 import warnings
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from core.answer_cache import normalize_query
+from core.config import get_setting
+from core.embeddings import encode_local
+from core.lexical_index import TOKEN_PATTERN
+from core.telemetry import span
+from core.ttl_cache import TTLCache
+
+DEFAULT_MAX_RESULTS = 5
+# Passages (snippets or page excerpts) that reach the prompt
+DEFAULT_TOP_PASSAGES = 3
+# Passages scoring below this cosine similarity to the query are dropped
+DEFAULT_MIN_RELEVANCE = 0.25
+SEARCH_CACHE_TTL = 15 * 60
+SEARCH_CACHE_MAX_ENTRIES = 256
+# Page fetching limits
+FETCH_TIMEOUT = 5.0
+FETCH_MAX_BYTES = 512 * 1024
+FETCH_SCHEMES = ("http", "https")
+FETCH_MAX_REDIRECTS = 5
+PASSAGE_CHARS = 600
+MAX_PASSAGES_PER_PAGE = 20
+MAX_WORKERS = 8
+
+_STOPWORDS = {
+    "a", "an", "the", "is", "are", "was", "were", "what", "which", "who", "whom", "how",
+    "why", "when", "where", "do", "does", "did", "can", "could", "should", "would", "of",
+    "in", "on", "for", "to", "and", "or", "about", "tell", "me", "please", "explain",
+}
+_SCRIPT_STYLE = re.compile(r"<(script|style|noscript)[^>]*>.*?</\1>", re.IGNORECASE | re.DOTALL)
+_TAG = re.compile(r"<[^>]+>")
+_WHITESPACE = re.compile(r"\s+")
+
+
+class DDGSClient:
+    """DuckDuckGo search through `ddgs`, reusing one session per worker thread."""
+
+    def __init__(self):
+        self._local = threading.local()
+
+    def text(self, query, max_results=DEFAULT_MAX_RESULTS):
+        session = getattr(self._local, "session", None)
+        if session is None:
+            from ddgs import DDGS
+
+            session = self._local.session = DDGS()
+        return list(session.text(query, max_results=max_results))
+
+
+class StubSearchClient:
+    """
+    Offline search client for tests: `results` maps a query to its result dicts
+    ({"title", "body", "href"}), or is a callable taking the query.
+    """
+
+    def __init__(self, results=None):
+        self.results = results or {}
+        self.calls = []
+
+    def text(self, query, max_results=DEFAULT_MAX_RESULTS):
+        self.calls.append(query)
+        results = self.results(query) if callable(self.results) else self.results.get(query, [])
+        return list(results)[:max_results]
 
-def search_web(query):
-    # Suppress the RuntimeWarning about package renaming
-    warnings.filterwarnings("ignore", category=RuntimeWarning, module="duckduckgo_search")
-    
-    results_text = ""
 
+def reformulate(query):
+    """The query itself plus, if different, a keyword-only form of it."""
+    keywords = " ".join(t for t in TOKEN_PATTERN.findall(query.lower()) if t not in _STOPWORDS)
+    if keywords and keywords != normalize_query(query):
+        return [query, keywords]
+    return [query]
+
+
+def _check_scheme(url):
+    scheme = urllib.parse.urlsplit(url).scheme.lower()
+    if scheme not in FETCH_SCHEMES:
+        raise ValueError(f"Refusing to fetch {scheme or 'relative'} URL {url}")
+
+
+def _public_addresses(host, port):
+    """IP addresses of `host`; ValueError if any is loopback, private, link-local or otherwise not public."""
     try:
-        with DDGS() as ddgs:
-            # Convert to list to ensure execution and handle empty results
-            results = list(ddgs.text(query, max_results=5))
+        infos = socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)
+    except socket.gaierror as e:
+        raise ValueError(f"Could not resolve {host}: {e}") from e
+    addresses = []
+    for *_, sockaddr in infos:
+        address = ipaddress.ip_address(sockaddr[0].split("%")[0])
+        if not address.is_global or address.is_multicast:
+            raise ValueError(f"Refusing to fetch {host}: {address} is not a public address")
+        addresses.append(str(address))
+    return addresses
+
+
+def _public_connection(address, timeout, source_address=None, *args):
+    """socket.create_connection to an address that was checked to be public (also after DNS changes)."""
+    host, port = address
+    return socket.create_connection((_public_addresses(host, port)[0], port), timeout, source_address)
+
+
+class _PublicHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._create_connection = _public_connection
+
+
+class _PublicHTTPSConnection(http.client.HTTPSConnection):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._create_connection = _public_connection
+
+
+class _PublicHTTPHandler(urllib.request.HTTPHandler):
+    def http_open(self, req):
+        return self.do_open(_PublicHTTPConnection, req)
+
+
+class _PublicHTTPSHandler(urllib.request.HTTPSHandler):
+    def https_open(self, req):
+        return self.do_open(_PublicHTTPSConnection, req, context=self._context)
+
+
+class _CheckedRedirectHandler(urllib.request.HTTPRedirectHandler):
+    max_redirections = FETCH_MAX_REDIRECTS
 
-            if not results:
-                return ""
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        _check_scheme(newurl)
+        return super().redirect_request(req, fp, code, msg, headers, newurl)
 
-            for r in results[:3]:
-                results_text += f"""
+
+def _page_opener():
+    """
+    An opener for untrusted result URLs: http(s) only (no file:, ftp: or data:),
+    no proxies, at most FETCH_MAX_REDIRECTS redirects, and every connection,
+    redirects included, goes only to public internet addresses.
+    """
+    opener = urllib.request.OpenerDirector()
+    for handler in (_PublicHTTPHandler(), _PublicHTTPSHandler(), _CheckedRedirectHandler(),
+                    urllib.request.HTTPDefaultErrorHandler(), urllib.request.HTTPErrorProcessor()):
+        opener.add_handler(handler)
+    return opener
+
+
+def fetch_page(url, timeout=FETCH_TIMEOUT, max_bytes=FETCH_MAX_BYTES):
+    """
+    Downloads at most `max_bytes` of an HTML or text page and returns its visible text.
+    Only public http(s) addresses are fetched (see `_page_opener`); others raise ValueError.
+    """
+    _check_scheme(url)
+    request = urllib.request.Request(url, headers={"User-Agent": "Mozilla/5.0 (RAG Document Assistant)"})
+    with _page_opener().open(request, timeout=timeout) as response:
+        content_type = response.headers.get("Content-Type", "")
+        if "html" not in content_type and "text/plain" not in content_type:
+            return ""
+        charset = response.headers.get_content_charset() or "utf-8"
+        # Larger bodies are cut off, never read whole
+        raw = response.read(max_bytes)
+    text = raw.decode(charset, errors="ignore")
+    if "html" in content_type:
+        text = html.unescape(_TAG.sub(" ", _SCRIPT_STYLE.sub(" ", text)))
+    return _WHITESPACE.sub(" ", text).strip()
+
+
+def split_passages(text, size=PASSAGE_CHARS, limit=MAX_PASSAGES_PER_PAGE):
+    """Cuts page text into up to `limit` passages of about `size` characters, at word boundaries."""
+    passages = []
+    start = 0
+    while start < len(text) and len(passages) < limit:
+        end = min(start + size, len(text))
+        if end < len(text):
+            space = text.rfind(" ", start, end)
+            end = space if space > start else end
+        passages.append(text[start:end].strip())
+        start = end + 1
+    return [p for p in passages if p]
+
+
+def embedding_scores(query, texts):
+    """Cosine similarity of each text to the query, using the local embedding model."""
+    vectors = encode_local([query] + list(texts))
+    return vectors[1:] @ vectors[0]
+
+
+class WebSearch:
+    """
+    Web search for the RAG prompt.
+
+    Result lists are cached by normalized query (TTL + LRU), so repeated and
+    follow-up questions do not hit DuckDuckGo again. Query reformulations and
+    optional page fetches run in parallel. Snippets, plus passages of fetched
+    pages, are scored against the query with the local embedding model and only
+    the most relevant ones are returned.
+
+    `client` is anything with `text(query, max_results)`, e.g. StubSearchClient offline.
+    """
+
+    def __init__(self, client=None, fetch_pages=False, reformulations=False, top_passages=DEFAULT_TOP_PASSAGES,
+                 min_relevance=DEFAULT_MIN_RELEVANCE, scorer=embedding_scores, fetcher=fetch_page,
+                 cache_ttl=SEARCH_CACHE_TTL, max_workers=MAX_WORKERS):
+        self.client = client or DDGSClient()
+        self.fetch_pages = fetch_pages
+        self.reformulations = reformulations
+        self.top_passages = top_passages
+        self.min_relevance = min_relevance
+        self.scorer = scorer
+        self.fetcher = fetcher
+        self._results = TTLCache(SEARCH_CACHE_MAX_ENTRIES, cache_ttl)
+        self._pages = TTLCache(SEARCH_CACHE_MAX_ENTRIES, cache_ttl)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="web-search")
+
+    def _search_one(self, query, max_results):
+        key = (normalize_query(query), max_results)
+        results = self._results.get(key)
+        if results is None:
+            results = self.client.text(query, max_results=max_results)
+            self._results.put(key, results)
+        return results
+
+    def search(self, query, max_results=DEFAULT_MAX_RESULTS):
+        """Result dicts for the query (and its reformulations, searched in parallel), deduplicated by URL."""
+        queries = reformulate(query) if self.reformulations else [query]
+        futures = [self._executor.submit(self._search_one, q, max_results) for q in queries]
+        merged = {}
+        for future in futures:
+            try:
+                for result in future.result():
+                    merged.setdefault(result.get("href") or result.get("title"), result)
+            except Exception as e:
+                print(f"⚠️ Search failed: {e}")
+        return list(merged.values())
+
+    def _page_text(self, url):
+        text = self._pages.get(url)
+        if text is None:
+            try:
+                text = self.fetcher(url)
+            except Exception as e:
+                print(f"⚠️ Could not fetch {url}: {e}")
+                text = ""
+            self._pages.put(url, text)
+        return text
+
+    def passages(self, results):
+        """(result, passage text) candidates: every snippet, plus page passages when fetching is on."""
+        candidates = [(r, r.get("body", "")) for r in results if r.get("body")]
+        if self.fetch_pages:
+            urls = [r.get("href") for r in results]
+            pages = self._executor.map(lambda url: self._page_text(url) if url else "", urls)
+            for result, text in zip(results, pages):
+                candidates.extend((result, passage) for passage in split_passages(text))
+        return candidates
+
+    def relevant_passages(self, query, results):
+        """The `top_passages` candidates most similar to the query, at most one per result URL."""
+        candidates = self.passages(results)
+        if not candidates:
+            return []
+        try:
+            scores = np.asarray(self.scorer(query, [text for _, text in candidates]), dtype="float32")
+        except Exception as e:
+            # Without the local model, keep DuckDuckGo's own ranking
+            print(f"⚠️ Could not score search results: {e}")
+            scores = np.linspace(1.0, 0.5, len(candidates), dtype="float32")
+
+        chosen = []
+        seen = set()
+        for i in np.argsort(-scores, kind="stable"):
+            result, text = candidates[i]
+            url = result.get("href", "#")
+            if scores[i] < self.min_relevance or url in seen:
+                continue
+            seen.add(url)
+            chosen.append((result, text))
+            if len(chosen) == self.top_passages:
+                break
+        return chosen
+
+    def search_text(self, query, max_results=DEFAULT_MAX_RESULTS):
+        """Relevant results formatted for the prompt, or "" if none."""
+        results_text = ""
+        for r, passage in self.relevant_passages(query, self.search(query, max_results)):
+            results_text += f"""
 Title: {r.get('title', 'No Title')}
-Snippet: {r.get('body', 'No Snippet')}
+Snippet: {passage}
 URL: {r.get('href', '#')}
 
 """
+        return results_text
+
+
+_web_search = None
+_web_search_lock = threading.Lock()
+
+
+def get_web_search():
+    """
+    Returns the process-wide WebSearch, configured by WEB_SEARCH_FETCH_PAGES,
+    WEB_SEARCH_REFORMULATE, WEB_SEARCH_TOP_PASSAGES, WEB_SEARCH_MIN_RELEVANCE and
+    WEB_SEARCH_CACHE_TTL (seconds).
+    """
+    global _web_search
+    with _web_search_lock:
+        if _web_search is None:
+            _web_search = WebSearch(
+                fetch_pages=get_setting("WEB_SEARCH_FETCH_PAGES", False, cast=bool),
+                reformulations=get_setting("WEB_SEARCH_REFORMULATE", False, cast=bool),
+                top_passages=get_setting("WEB_SEARCH_TOP_PASSAGES", DEFAULT_TOP_PASSAGES, cast=int),
+                min_relevance=get_setting("WEB_SEARCH_MIN_RELEVANCE", DEFAULT_MIN_RELEVANCE, cast=float),
+                cache_ttl=get_setting("WEB_SEARCH_CACHE_TTL", SEARCH_CACHE_TTL, cast=float),
+            )
+        return _web_search
+
+
+def set_web_search(web_search):
+    """Replaces the process-wide WebSearch, e.g. with one built on StubSearchClient."""
+    global _web_search
+    with _web_search_lock:
+        _web_search = web_search
+
+
+def search_web(query):
+    # Suppress the RuntimeWarning about package renaming
+    warnings.filterwarnings("ignore", category=RuntimeWarning, module="duckduckgo_search")
+
+    try:
+        with span("search") as search_span:
+            text = get_web_search().search_text(query)
+            search_span.add(bytes=len(text.encode("utf-8")))
+        return text
     except Exception as e:
         print(f"⚠️ Search failed: {e}")
         return ""
-        
-    return results_text
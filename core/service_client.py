@@ -0,0 +1,160 @@
+import hashlib
+import json
+import urllib.error
+import urllib.parse
+import urllib.request
+import uuid
+
+from core.config import get_setting
+
+REQUEST_TIMEOUT = 30.0
+# Uploads wait for the service to load, chunk and embed the whole file
+INDEX_TIMEOUT = 30 * 60.0
+QUERY_TIMEOUT = 5 * 60.0
+
+
+class ServiceError(Exception):
+    """Error reported by the RAG service (`status` is its HTTP status), or failure to reach it."""
+
+    def __init__(self, message, status=None):
+        super().__init__(message)
+        self.status = status
+
+
+class RemoteCorpus:
+    """
+    Client of the HTTP service in server.py with the parts of Corpus the UI uses
+    (`sync`, `sources`, `len()`), plus `query()` to stream answers. Lets the
+    Streamlit app run as a thin front end while indexes live in the service.
+
+    The service-side corpus is created on first upload. Conversation memory is
+    kept by the service under this client's `session` ID.
+    """
+
+    def __init__(self, base_url, token=None, corpus_id=None):
+        self.base_url = base_url.rstrip("/")
+        self.token = token if token is not None else get_setting("RAG_SERVICE_TOKEN")
+        self.corpus_id = corpus_id
+        # fingerprint -> document name on the service, in upload order
+        self.documents = {}
+        # Fingerprints of files that produced no text, so they are not retried
+        self._empty = set()
+        # fingerprint -> error message, for files the service could not index
+        self.failures = {}
+        self.session = uuid.uuid4().hex
+        # Stage timings of the last answer, as sent by the service
+        self.last_trace = None
+
+    def __len__(self):
+        return len(self.documents)
+
+    @property
+    def sources(self):
+        return list(self.documents.values())
+
+    def _request(self, method, path, body=None, content_type="application/json", timeout=REQUEST_TIMEOUT):
+        headers = {"Content-Type": content_type}
+        if self.token:
+            headers["Authorization"] = f"Bearer {self.token}"
+        if body is not None and content_type == "application/json":
+            body = json.dumps(body).encode("utf-8")
+        request = urllib.request.Request(f"{self.base_url}{path}", data=body, headers=headers, method=method)
+        try:
+            return urllib.request.urlopen(request, timeout=timeout)
+        except urllib.error.HTTPError as e:
+            try:
+                message = json.loads(e.read()).get("error", e.reason)
+            except Exception:
+                message = e.reason
+            raise ServiceError(f"{method} {path}: {e.code} {message}", status=e.code) from e
+        except urllib.error.URLError as e:
+            raise ServiceError(f"RAG service unreachable at {self.base_url}: {e.reason}") from e
+
+    def _call(self, method, path, body=None, **kwargs):
+        with self._request(method, path, body, **kwargs) as response:
+            return json.loads(response.read() or b"{}")
+
+    def _ensure_corpus(self):
+        if self.corpus_id is None:
+            self.corpus_id = self._call("POST", "/corpora", {})["id"]
+        return self.corpus_id
+
+    def _refresh(self, description):
+        names = {doc["fingerprint"]: doc["name"] for doc in description["documents"]}
+        self.documents = {fp: names[fp] for fp in list(self.documents) + list(names) if fp in names}
+
+    def add_document(self, file):
+        """Uploads and indexes a file. Returns its fingerprint, or None if it produced no text."""
+        corpus_id = self._ensure_corpus()
+        path = f"/corpora/{corpus_id}/documents?name={urllib.parse.quote(file.name)}"
+        try:
+            result = self._call("POST", path, file.getvalue(), content_type="application/octet-stream",
+                                timeout=INDEX_TIMEOUT)
+        except ServiceError as e:
+            if e.status == 422:
+                fingerprint = hashlib.sha256(file.getvalue()).hexdigest()
+                self._empty.add(fingerprint)
+                self.failures[fingerprint] = str(e)
+                return None
+            raise
+        self._refresh(result["corpus"])
+        return result["fingerprint"]
+
+    def remove_document(self, fingerprint):
+        if self.corpus_id is None or fingerprint not in self.documents:
+            return False
+        self._call("DELETE", f"/corpora/{self.corpus_id}/documents/{fingerprint}")
+        del self.documents[fingerprint]
+        return True
+
+    def sync(self, files):
+        """Makes the service-side corpus match `files`, like Corpus.sync. Returns (added, removed)."""
+        # Same fingerprint as the service computes (SHA-256 of the bytes)
+        wanted = {hashlib.sha256(file.getvalue()).hexdigest(): file for file in files}
+        self.failures = {fp: error for fp, error in self.failures.items() if fp in wanted}
+        removed = 0
+        for fingerprint in list(self.documents):
+            if fingerprint not in wanted:
+                removed += self.remove_document(fingerprint)
+        added = 0
+        for fingerprint, file in wanted.items():
+            if fingerprint in self.documents or fingerprint in self._empty:
+                continue
+            if self.add_document(file):
+                added += 1
+        return added, removed
+
+    def new_session(self):
+        """Starts a new conversation; the service forgets the old one's memory."""
+        try:
+            self._call("DELETE", f"/sessions/{self.session}")
+        except ServiceError as e:
+            print(f"⚠️ Could not clear the conversation on the service: {e}")
+        self.session = uuid.uuid4().hex
+
+    def query(self, query, chat_history=None, enable_search=False, sources=None):
+        """Streams the answer text from the service (server-sent events)."""
+        self.last_trace = None
+        corpus_id = self._ensure_corpus()
+        body = {
+            "query": query,
+            "chat_history": chat_history or [],
+            "enable_search": enable_search,
+            "sources": sources,
+            "session": self.session,
+        }
+        with self._request("POST", f"/corpora/{corpus_id}/query", body, timeout=QUERY_TIMEOUT) as response:
+            event = None
+            for raw in response:
+                line = raw.decode("utf-8").rstrip("\r\n")
+                if line.startswith("event:"):
+                    event = line[len("event:"):].strip()
+                elif line.startswith("data:"):
+                    data = json.loads(line[len("data:"):])
+                    if event == "token":
+                        yield data["text"]
+                    elif event == "done":
+                        self.last_trace = data.get("trace")
+                        return
+                    elif event == "error":
+                        raise ServiceError(data.get("error", "Query failed"))
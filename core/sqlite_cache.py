@@ -0,0 +1,139 @@
+import os
+import sqlite3
+import threading
+import time
+
+
+class SQLiteCache:
+    """
+    Persistent key/value cache in one SQLite table, shared by the embedding and
+    extraction caches. Rows are keyed by (`key_column`, text_hash) and hold one
+    `value_column`; least-recently-used rows are evicted once the stored values
+    exceed `max_bytes`. Their size is summed once at open and then kept as a
+    running total, recounted only when it passes the cap (other processes may
+    write to the same file).
+    """
+
+    table = None
+    key_column = None
+    value_column = None
+    value_type = "BLOB"
+
+    def __init__(self, path, max_bytes):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            f"""CREATE TABLE IF NOT EXISTS {self.table} (
+                {self.key_column} TEXT NOT NULL,
+                text_hash TEXT NOT NULL,
+                {self.value_column} {self.value_type} NOT NULL,
+                last_used REAL NOT NULL,
+                PRIMARY KEY ({self.key_column}, text_hash)
+            )"""
+        )
+        self._conn.execute(
+            f"CREATE INDEX IF NOT EXISTS idx_{self.table}_last_used ON {self.table}(last_used)"
+        )
+        self._conn.commit()
+        self._bytes = self._stored_bytes()
+
+    def _stored_bytes(self):
+        return self._conn.execute(
+            f"SELECT COALESCE(SUM(LENGTH({self.value_column})), 0) FROM {self.table}"
+        ).fetchone()[0]
+
+    def _get_many(self, key, hashes):
+        """{hash: stored value} for the `hashes` found under `key`; marks them used."""
+        found = {}
+        with self._lock:
+            # Stay well under SQLite's bound-parameter limit
+            for start in range(0, len(hashes), 500):
+                batch = list(set(hashes[start:start + 500]))
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT text_hash, {self.value_column} FROM {self.table} "
+                    f"WHERE {self.key_column} = ? AND text_hash IN ({placeholders})",
+                    [key, *batch],
+                ).fetchall()
+                found.update(rows)
+
+            if found:
+                now = time.time()
+                self._conn.executemany(
+                    f"UPDATE {self.table} SET last_used = ? WHERE {self.key_column} = ? AND text_hash = ?",
+                    [(now, key, h) for h in found],
+                )
+                self._conn.commit()
+
+            hits = sum(1 for h in hashes if h in found)
+            self.hits += hits
+            self.misses += len(hashes) - hits
+        return found
+
+    def _put_many(self, key, items):
+        """Stores (hash, value) pairs under `key`, then evicts old rows if over the size cap."""
+        now = time.time()
+        items = dict(items)
+        hashes = list(items)
+        with self._lock:
+            # Rows being replaced no longer count towards the total
+            replaced = 0
+            for start in range(0, len(hashes), 500):
+                batch = hashes[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                replaced += self._conn.execute(
+                    f"SELECT COALESCE(SUM(LENGTH({self.value_column})), 0) FROM {self.table} "
+                    f"WHERE {self.key_column} = ? AND text_hash IN ({placeholders})",
+                    [key, *batch],
+                ).fetchone()[0]
+            self._conn.executemany(
+                f"INSERT OR REPLACE INTO {self.table} ({self.key_column}, text_hash, {self.value_column}, last_used) "
+                f"VALUES (?, ?, ?, ?)",
+                [(key, h, value, now) for h, value in items.items()],
+            )
+            self._conn.commit()
+            self._bytes += sum(len(value) for value in items.values()) - replaced
+        if self._bytes > self.max_bytes:
+            self.evict()
+
+    def evict(self):
+        """Deletes least-recently-used rows until stored values fit in `max_bytes`."""
+        with self._lock:
+            total = self._bytes = self._stored_bytes()
+            if total <= self.max_bytes:
+                return
+            excess = total - self.max_bytes
+            freed = 0
+            stale = []
+            for key, h, size in self._conn.execute(
+                f"SELECT {self.key_column}, text_hash, LENGTH({self.value_column}) FROM {self.table} "
+                f"ORDER BY last_used"
+            ):
+                stale.append((key, h))
+                freed += size
+                if freed >= excess:
+                    break
+            self._conn.executemany(
+                f"DELETE FROM {self.table} WHERE {self.key_column} = ? AND text_hash = ?", stale
+            )
+            self._conn.commit()
+            self._bytes = total - freed
+
+    def stats(self):
+        """Hit/miss counters for this process, plus the number of stored rows."""
+        with self._lock:
+            entries = self._conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": entries,
+        }
@@ -1,10 +1,69 @@
 import os
+from concurrent.futures import ThreadPoolExecutor
+
+from core.config import get_setting
+from core.extraction_cache import get_extraction_cache, task_key
+from core.telemetry import span
+
 try:
     import langextract as lx
     LANGEXTRACT_AVAILABLE = True
 except ImportError:
     LANGEXTRACT_AVAILABLE = False
 
+# Chunks extracted concurrently (each is one model call)
+DEFAULT_EXTRACTION_WORKERS = 8
+
+
+def _normalize(text):
+    return " ".join(str(text).lower().split())
+
+
+def _extraction_dicts(result):
+    """Plain dicts {"class", "text", "attributes", "start", "end"} from a langextract result."""
+    extractions = []
+    for extraction in getattr(result, "extractions", None) or []:
+        interval = getattr(extraction, "char_interval", None)
+        extractions.append({
+            "class": extraction.extraction_class,
+            "text": extraction.extraction_text,
+            "attributes": dict(extraction.attributes or {}),
+            "start": getattr(interval, "start_pos", None),
+            "end": getattr(interval, "end_pos", None),
+        })
+    return extractions
+
+
+def merge_extractions(per_chunk):
+    """
+    Merges [(chunk, extraction dicts)] into entities deduplicated by class and
+    normalized text, each listing its mentions with source, page, chunk ID and
+    offsets within the chunk. Attributes of repeated mentions are combined.
+    """
+    entities = {}
+    seen = set()
+    for chunk, extractions in per_chunk:
+        for extraction in extractions:
+            key = (extraction["class"], _normalize(extraction["text"]))
+            entity = entities.get(key)
+            if entity is None:
+                entity = entities[key] = {
+                    "class": extraction["class"],
+                    "text": extraction["text"],
+                    "attributes": {},
+                    "mentions": [],
+                }
+            for name, value in extraction["attributes"].items():
+                entity["attributes"].setdefault(name, value)
+            mention = (chunk.metadata.get("source"), chunk.metadata.get("page"), chunk.id,
+                       extraction["start"], extraction["end"])
+            if (key, mention) in seen:
+                continue
+            seen.add((key, mention))
+            entity["mentions"].append(dict(zip(("source", "page", "chunk_id", "start", "end"), mention)))
+    return list(entities.values())
+
+
 class StructuredExtractor:
     """
     Wrapper for LangExtract to perform structured information extraction 
@@ -12,6 +71,7 @@ class StructuredExtractor:
     """
     def __init__(self, model_id="gemini-2.5-flash"):
         self.model_id = model_id
+        self.max_workers = get_setting("EXTRACTION_WORKERS", DEFAULT_EXTRACTION_WORKERS, cast=int)
         if not LANGEXTRACT_AVAILABLE:
             print("Warning: langextract library is not installed.")
 
@@ -36,4 +96,90 @@ class StructuredExtractor:
             )
             return result
         except Exception as e:
-            return {"error": f"Extraction failed: {str(e)}"}
\ No newline at end of file
+            return {"error": f"Extraction failed: {str(e)}"}
+
+    def _extract_chunk(self, text, prompt_description, examples, task, cache):
+        """Extraction dicts for one chunk's text, from the cache or the model."""
+        if cache is not None:
+            cached = cache.get(task, text)
+            if cached is not None:
+                return cached, True
+        result = lx.extract(
+            text_or_documents=text,
+            prompt_description=prompt_description,
+            examples=examples,
+            model_id=self.model_id
+        )
+        extractions = _extraction_dicts(result)
+        if cache is not None:
+            cache.put(task, text, extractions)
+        return extractions, False
+
+    def extract_chunks(self, chunks, prompt_description, examples, max_workers=None):
+        """
+        Batch extraction over already split chunks (LangChain Documents, e.g. from
+        `index_document` or `Corpus.get_chunks()`, which may span many documents).
+
+        Chunks run on a pool of `max_workers` threads (EXTRACTION_WORKERS), each
+        distinct chunk text once. Results are cached by chunk text, prompt,
+        examples and model, so a rerun makes no model calls.
+
+        Returns {"entities": [...], "chunks", "cached", "errors": [{"chunk_id", "error"}]}
+        with entities as built by `merge_extractions`.
+        """
+        if not LANGEXTRACT_AVAILABLE:
+            return {"error": "langextract library is missing."}
+
+        chunks = list(chunks)
+        cache = get_extraction_cache()
+        task = None
+        if cache is not None:
+            try:
+                task = task_key(prompt_description, examples, self.model_id)
+            except TypeError as e:
+                print(f"⚠️ Extraction results will not be cached: {e}")
+                cache = None
+        # Repeated chunk texts (headers, footers, re-uploads) are extracted once
+        texts = list(dict.fromkeys(chunk.page_content for chunk in chunks))
+        results, failures = {}, {}
+        cached = 0
+
+        with span("extract", chunks=len(texts)) as s, \
+                ThreadPoolExecutor(max_workers=max_workers or self.max_workers) as executor:
+            futures = {
+                text: executor.submit(self._extract_chunk, text, prompt_description, examples, task, cache)
+                for text in texts
+            }
+            for text, future in futures.items():
+                try:
+                    results[text], hit = future.result()
+                    cached += hit
+                except Exception as e:
+                    failures[text] = f"Extraction failed: {str(e)}"
+            s.add(cached=cached)
+
+        if failures:
+            print(f"⚠️ Extraction failed for {len(failures)} of {len(texts)} chunks: {next(iter(failures.values()))}")
+        entities = merge_extractions(
+            (chunk, results[chunk.page_content]) for chunk in chunks if chunk.page_content in results
+        )
+        failed = [
+            {"chunk_id": chunk.id, "error": failures[chunk.page_content]}
+            for chunk in chunks if chunk.page_content in failures
+        ]
+        print(f"✅ Extracted {len(entities)} entities from {len(chunks)} chunks ({cached} cached)")
+        return {"entities": entities, "chunks": len(chunks), "cached": cached, "errors": failed}
+
+    def extract_documents(self, files, prompt_description, examples, max_workers=None):
+        """
+        Batch extraction over several uploaded files in one job. Each file is split
+        with `index_document` (so already indexed files come from the index cache),
+        then all chunks go through `extract_chunks`.
+        """
+        from core.rag_pipeline import index_document
+
+        chunks = []
+        for file in files:
+            _, split_docs = index_document(file)
+            chunks.extend(split_docs)
+        return self.extract_chunks(chunks, prompt_description, examples, max_workers=max_workers)
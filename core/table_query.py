@@ -0,0 +1,270 @@
+import json
+import re
+import threading
+
+import numpy as np
+
+# Rows of a query result passed to the answer prompt
+MAX_RESULT_ROWS = 50
+# Example values per column shown to the planner
+SAMPLE_VALUES = 3
+OPERATORS = ("==", "!=", ">", ">=", "<", "<=", "contains", "in", "between")
+AGGREGATES = ("sum", "mean", "median", "min", "max", "count", "nunique")
+
+# Wording of aggregate and filter questions; only counts together with a column name
+_TABULAR_WORDS = re.compile(
+    r"\b(total|sum|average|avg|mean|median|count|how many|how much|number of|maximum|minimum|"
+    r"highest|lowest|largest|smallest|top \d+|bottom \d+|per|group(?:ed)? by|greater than|less than|"
+    r"more than|fewer than|at least|at most|between|above|below|sorted|ranked)\b"
+)
+_JSON_OBJECT = re.compile(r"\{.*\}", re.DOTALL)
+
+
+class TableStore:
+    """
+    In-process columnar store of a corpus's spreadsheets: one pandas DataFrame
+    per table (CSV file or workbook sheet), queried with vectorized operations
+    instead of through the embedded row-group chunks.
+    """
+
+    def __init__(self):
+        # table name -> {"source": document name, "frame": DataFrame}
+        self._tables = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._tables)
+
+    def add(self, source, tables):
+        """Adds a document's {table name: DataFrame}."""
+        with self._lock:
+            for name, frame in tables.items():
+                self._tables[name] = {"source": source, "frame": frame}
+
+    def remove(self, source):
+        with self._lock:
+            for name in [n for n, t in self._tables.items() if t["source"] == source]:
+                del self._tables[name]
+
+    def names(self, sources=None):
+        """Table names, optionally only those of the given documents."""
+        with self._lock:
+            return [n for n, t in self._tables.items() if sources is None or t["source"] in sources]
+
+    def get(self, name, sources=None):
+        """The named table; ValueError if there is none (among the tables of `sources`, if given)."""
+        with self._lock:
+            table = self._tables.get(name)
+        if table is None or (sources is not None and table["source"] not in sources):
+            raise ValueError(f"No table named {name!r}")
+        return table["frame"]
+
+    def schema(self, sources=None):
+        """Text description of the tables (rows, columns, types, example values) for the planner."""
+        lines = []
+        for name in self.names(sources):
+            frame = self.get(name)
+            lines.append(f"Table {json.dumps(name)} ({len(frame)} rows):")
+            for column in frame.columns:
+                samples = frame[column].dropna().unique()[:SAMPLE_VALUES]
+                examples = ", ".join(str(v) for v in samples)
+                lines.append(f"  - {json.dumps(column)} ({frame[column].dtype}): e.g. {examples}")
+        return "\n".join(lines)
+
+
+def _mentions(text, name):
+    """True if `name` (a column, underscores read as spaces) appears as whole words in `text`."""
+    name = str(name).lower().strip()
+    if len(name) < 3:
+        return False
+    return any(re.search(rf"\b{re.escape(form)}\b", text) for form in {name, name.replace("_", " ")})
+
+
+def looks_tabular(query, store, sources=None):
+    """
+    True if the question asks for an aggregate or a filter over a named column of
+    one of the tables, e.g. "total Revenue per Region". Only then is a (model) plan
+    worth making; other questions are answered from the row-group chunks.
+    """
+    text = query.lower()
+    if not _TABULAR_WORDS.search(text):
+        return False
+    for name in store.names(sources):
+        if any(_mentions(text, column) for column in store.get(name).columns):
+            return True
+    return False
+
+
+def build_plan_prompt(query, schema):
+    return f"""You translate questions about tables into a JSON query plan.
+
+### Tables:
+{schema}
+
+### Plan format (JSON only, no prose):
+{{"table": "<table name>",
+  "filters": [{{"column": "<column>", "op": "one of {', '.join(OPERATORS)}", "value": <value or [low, high] or [values]>}}],
+  "group_by": ["<column>"],
+  "aggregates": [{{"column": "<column or *>", "func": "one of {', '.join(AGGREGATES)}"}}],
+  "select": ["<column>"],
+  "sort": {{"column": "<column or aggregate output like sum_Revenue>", "descending": true}},
+  "limit": <number>}}
+All keys except "table" are optional. Use exact table and column names from above.
+If the question cannot be answered from these tables, reply {{"table": null}}.
+
+### Question:
+{query}
+
+### Plan:"""
+
+
+def parse_plan(text):
+    """The JSON object in a planner reply, or None."""
+    match = _JSON_OBJECT.search(text or "")
+    if not match:
+        return None
+    try:
+        plan = json.loads(match.group(0))
+    except json.JSONDecodeError:
+        return None
+    return plan if isinstance(plan, dict) else None
+
+
+def _column(frame, name):
+    """The frame's column called `name`, matched case-insensitively."""
+    if name in frame.columns:
+        return name
+    for column in frame.columns:
+        if str(column).lower() == str(name).lower():
+            return column
+    raise ValueError(f"No column named {name!r}")
+
+
+def _mask(frame, condition):
+    import pandas as pd
+
+    column = frame[_column(frame, condition["column"])]
+    op, value = condition.get("op", "=="), condition.get("value")
+    if op not in OPERATORS:
+        raise ValueError(f"Unknown filter operator {op!r}")
+    numeric = pd.api.types.is_numeric_dtype(column)
+    if op == "contains":
+        return column.astype(str).str.contains(str(value), case=False, regex=False, na=False).to_numpy()
+    if op == "in":
+        values = value if isinstance(value, list) else [value]
+        if numeric:
+            return column.isin(pd.to_numeric(pd.Series(values), errors="coerce")).to_numpy()
+        return column.astype(str).str.lower().isin([str(v).lower() for v in values]).to_numpy()
+    if op == "between":
+        low, high = value
+        if numeric:
+            low, high = float(low), float(high)
+        return column.between(low, high).to_numpy()
+    if numeric:
+        value = float(value)
+    elif op in ("==", "!="):
+        # Text matches ignore case
+        column, value = column.astype(str).str.lower(), str(value).lower()
+    result = {
+        "==": column == value, "!=": column != value,
+        ">": column > value, ">=": column >= value, "<": column < value, "<=": column <= value,
+    }[op]
+    return result.to_numpy()
+
+
+def execute_plan(plan, store, sources=None):
+    """
+    Runs a query plan (see `build_plan_prompt`) against the store with vectorized
+    pandas operations; with `sources`, only tables of those documents can be queried.
+    Returns (result DataFrame, rows matched by the filters).
+    """
+    frame = store.get(plan["table"], sources)
+    mask = np.ones(len(frame), dtype=bool)
+    for condition in plan.get("filters") or []:
+        mask &= _mask(frame, condition)
+    rows = frame[mask]
+
+    aggregates = plan.get("aggregates") or []
+    group_by = [_column(frame, c) for c in plan.get("group_by") or []]
+    if aggregates:
+        outputs = {}
+        for aggregate in aggregates:
+            func = aggregate.get("func", "count")
+            if func not in AGGREGATES:
+                raise ValueError(f"Unknown aggregate {func!r}")
+            column = aggregate.get("column") or "*"
+            if column == "*":
+                outputs["count"] = (rows.columns[0], "size")
+            else:
+                column = _column(frame, column)
+                outputs[f"{func}_{column}"] = (column, func)
+        if group_by:
+            result = rows.groupby(group_by, observed=True).agg(**outputs).reset_index()
+        else:
+            import pandas as pd
+            result = pd.DataFrame([{
+                name: (len(rows) if func == "size" else rows[column].agg(func))
+                for name, (column, func) in outputs.items()
+            }])
+    else:
+        select = [_column(frame, c) for c in plan.get("select") or []]
+        result = rows[group_by + [c for c in select if c not in group_by]] if select or group_by else rows
+
+    sort = plan.get("sort") or {}
+    if sort.get("column"):
+        by = sort["column"] if sort["column"] in result.columns else _column(result, sort["column"])
+        result = result.sort_values(by, ascending=not sort.get("descending", False))
+    limit = plan.get("limit")
+    if isinstance(limit, int) and limit > 0:
+        result = result.head(limit)
+    return result, len(rows)
+
+
+def describe_plan(plan):
+    """One-line summary of a plan, shown with its result."""
+    parts = []
+    if plan.get("aggregates"):
+        parts.append(", ".join(f"{a.get('func', 'count')}({a.get('column') or '*'})" for a in plan["aggregates"]))
+    elif plan.get("select"):
+        parts.append(", ".join(plan["select"]))
+    if plan.get("filters"):
+        parts.append("where " + " and ".join(f"{f['column']} {f.get('op', '==')} {f.get('value')}"
+                                             for f in plan["filters"]))
+    if plan.get("group_by"):
+        parts.append("by " + ", ".join(plan["group_by"]))
+    if (plan.get("sort") or {}).get("column"):
+        order = "descending" if plan["sort"].get("descending") else "ascending"
+        parts.append(f"sorted by {plan['sort']['column']} {order}")
+    if plan.get("limit"):
+        parts.append(f"limit {plan['limit']}")
+    return " ".join(parts) or "all rows"
+
+
+def answer_table_query(query, store, generate, sources=None):
+    """
+    Answers a filter/aggregate/lookup question over the store's tables: `generate`
+    (the LLM stream) turns the question into a JSON plan, which runs in pandas.
+    Returns a small text block with the computed result for the answer prompt,
+    or None if the question is not about the tables.
+    """
+    schema = store.schema(sources)
+    if not schema:
+        return None
+    reply = "".join(getattr(chunk, "text", "") or "" for chunk in generate(build_plan_prompt(query, schema)))
+    plan = parse_plan(reply)
+    if not plan or not plan.get("table"):
+        return None
+    try:
+        result, matched = execute_plan(plan, store, sources)
+    except (ValueError, KeyError, TypeError) as e:
+        print(f"⚠️ Table query plan could not run: {e}")
+        return None
+
+    shown = result.head(MAX_RESULT_ROWS)
+    note = f" (first {len(shown)} of {len(result)} result rows)" if len(result) > len(shown) else ""
+    print(f"✅ Table query on {plan['table']}: {len(result)} result rows from {matched} matching rows")
+    return (
+        f"[Source: {plan['table']} (computed over {matched} matching rows)]\n"
+        f"Query: {describe_plan(plan)}{note}\n"
+        f"{shown.to_csv(index=False)}"
+    )
@@ -0,0 +1,342 @@
+import contextvars
+import json
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+from core.config import get_setting
+
+# Upper bounds (seconds) of the stage duration histogram buckets
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+METRIC_PREFIX = "rag"
+
+_current_trace = contextvars.ContextVar("rag_trace", default=None)
+# Per-thread stack of spans being timed, so nested spans are not counted twice
+_active = threading.local()
+_LABEL_UNSAFE = re.compile(r"[^a-zA-Z0-9_]")
+
+
+class Trace:
+    """The spans of one query or indexing job, for a per-request timing breakdown."""
+
+    def __init__(self, name, **attributes):
+        self.name = name
+        self.attributes = attributes
+        self.started_at = time.time()
+        self._started = time.perf_counter()
+        self.seconds = None
+        self._spans = []
+        self._lock = threading.Lock()
+
+    def elapsed(self):
+        return time.perf_counter() - self._started
+
+    def add(self, span):
+        with self._lock:
+            self._spans.append(span)
+
+    @property
+    def spans(self):
+        with self._lock:
+            return list(self._spans)
+
+    def finish(self, **attributes):
+        """Stops the clock and hands the trace to the telemetry sink (once)."""
+        if self.seconds is not None:
+            return
+        self.attributes.update(attributes)
+        self.seconds = self.elapsed()
+        get_telemetry().record_trace(self)
+
+    def breakdown(self):
+        """Seconds per stage name, in order of first appearance."""
+        totals = {}
+        for span in self.spans:
+            totals[span.name] = totals.get(span.name, 0.0) + span.seconds
+        return totals
+
+    def to_dict(self):
+        return {
+            "trace": self.name,
+            "started_at": self.started_at,
+            "seconds": self.seconds if self.seconds is not None else self.elapsed(),
+            **self.attributes,
+            "spans": [span.to_dict() for span in self.spans],
+        }
+
+
+class Span:
+    """
+    One timed pipeline stage with its sizes (pages, chunks, tokens, bytes...).
+
+    Used as a context manager around a block, or kept open for streaming stages:
+    each `time()` block adds to its duration and `end()` records it. Durations
+    are self time: time spent in a span nested on the same thread is counted
+    only for the inner stage, so a trace's stages add up to its wall time
+    (apart from stages that ran concurrently on other threads).
+    The span joins the trace active where it was created.
+    """
+
+    __slots__ = ("name", "sizes", "seconds", "offset", "error", "trace", "_timer", "_ended")
+
+    def __init__(self, name, trace=None, **sizes):
+        self.name = name
+        self.sizes = {}
+        self.seconds = 0.0
+        self.error = None
+        self.trace = trace if trace is not None else _current_trace.get()
+        self.offset = self.trace.elapsed() if self.trace is not None else None
+        self._timer = None
+        self._ended = False
+        self.add(**sizes)
+
+    def add(self, **sizes):
+        for key, value in sizes.items():
+            self.sizes[key] = self.sizes.get(key, 0) + value
+        return self
+
+    @contextmanager
+    def time(self):
+        stack = getattr(_active, "stack", None)
+        if stack is None:
+            stack = _active.stack = []
+        parent = stack[-1] if stack else None
+        stack.append(self)
+        started = time.perf_counter()
+        try:
+            yield self
+        except BaseException as e:
+            self.error = type(e).__name__
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            stack.pop()
+            self.seconds += elapsed
+            if parent is not None:
+                parent.seconds -= elapsed
+
+    def __enter__(self):
+        self._timer = self.time()
+        self._timer.__enter__()
+        return self
+
+    def __exit__(self, *exc):
+        self._timer.__exit__(*exc)
+        self.end()
+        return False
+
+    def end(self):
+        if self._ended:
+            return
+        self._ended = True
+        if self.trace is not None:
+            self.trace.add(self)
+        get_telemetry().record_span(self)
+
+    def to_dict(self):
+        data = {"span": self.name, "seconds": round(self.seconds, 6), **self.sizes}
+        if self.offset is not None:
+            data["offset"] = round(self.offset, 6)
+        if self.error:
+            data["error"] = self.error
+        return data
+
+
+def span(name, **sizes):
+    """A Span in the current trace; `with span("retrieve", chunks=n) as s: ...`."""
+    return Span(name, **sizes)
+
+
+def record_span(name, seconds, trace=None, **sizes):
+    """Records a stage the caller timed itself and that ends now, e.g. one spanning a streamed response."""
+    s = Span(name, trace=trace, **sizes)
+    s.seconds = seconds
+    if s.offset is not None:
+        s.offset = max(0.0, s.offset - seconds)
+    s.end()
+    return s
+
+
+def traced(iterable, span, sizes=None):
+    """
+    Yields from `iterable`, adding the time spent producing each item to `span`
+    and `sizes(item)` (a dict) to its sizes. The span ends when the stream does.
+    """
+    done = object()
+    iterator = iter(iterable)
+    try:
+        while True:
+            with span.time():
+                item = next(iterator, done)
+            if item is done:
+                return
+            if sizes is not None:
+                span.add(**sizes(item))
+            yield item
+    finally:
+        span.end()
+
+
+def current_trace():
+    return _current_trace.get()
+
+
+@contextmanager
+def use_trace(trace):
+    """
+    Makes `trace` the current trace. Spans created inside it, including on threads
+    started through `core.concurrency` or `prefetch`, join it.
+    """
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _current_trace.reset(token)
+
+
+def increment(name, amount=1, **labels):
+    """Adds to a process-wide counter, e.g. increment("llm_failovers", model=..., reason="quota")."""
+    get_telemetry().increment(name, amount, **labels)
+
+
+def _metric_name(name):
+    return _LABEL_UNSAFE.sub("_", name)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{_metric_name(k)}="{_escape(v)}"' for k, v in labels) + "}"
+
+
+class Telemetry:
+    """
+    Process-wide metrics: a duration histogram and size totals per stage, and
+    labelled counters (failovers and the like). Exported as Prometheus text or
+    a JSON snapshot; with `jsonl_path`, every span, finished trace and counter
+    increment is also appended there as one JSON line.
+    """
+
+    def __init__(self, jsonl_path=None, buckets=DURATION_BUCKETS):
+        self.jsonl_path = jsonl_path
+        self.buckets = tuple(buckets)
+        # stage -> {"count", "sum", "buckets": [...], "sizes": {unit: total}}
+        self._stages = {}
+        # (name, ((label, value), ...)) -> total
+        self._counters = {}
+        self._lock = threading.Lock()
+        self._file_lock = threading.Lock()
+
+    def _write(self, event):
+        if not self.jsonl_path:
+            return
+        line = json.dumps(event, default=str)
+        with self._file_lock:
+            try:
+                with open(self.jsonl_path, "a", encoding="utf-8") as f:
+                    f.write(line + "\n")
+            except OSError as e:
+                print(f"⚠️ Could not write telemetry to {self.jsonl_path}: {e}")
+                self.jsonl_path = None
+
+    def record_span(self, span):
+        with self._lock:
+            stage = self._stages.get(span.name)
+            if stage is None:
+                stage = self._stages[span.name] = {
+                    "count": 0, "sum": 0.0, "buckets": [0] * len(self.buckets), "sizes": {}
+                }
+            stage["count"] += 1
+            stage["sum"] += span.seconds
+            for i, bound in enumerate(self.buckets):
+                if span.seconds <= bound:
+                    stage["buckets"][i] += 1
+            for unit, value in span.sizes.items():
+                stage["sizes"][unit] = stage["sizes"].get(unit, 0) + value
+        self._write({"type": "span", "time": time.time(),
+                     "trace": span.trace.name if span.trace is not None else None, **span.to_dict()})
+
+    def record_trace(self, trace):
+        self._write({"type": "trace", **trace.to_dict()})
+
+    def increment(self, name, amount=1, **labels):
+        key = (name, tuple(sorted((k, str(v)) for k, v in labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+        self._write({"type": "counter", "time": time.time(), "counter": name, "amount": amount, **labels})
+
+    def counter(self, name, **labels):
+        """Total of a counter; without labels, summed over all label values."""
+        wanted = {(k, str(v)) for k, v in labels.items()}
+        with self._lock:
+            return sum(v for (n, l), v in self._counters.items() if n == name and wanted <= set(l))
+
+    def snapshot(self):
+        """JSON-serializable copy of all metrics."""
+        with self._lock:
+            return {
+                "stages": {
+                    name: {"count": s["count"], "seconds": s["sum"], **s["sizes"]}
+                    for name, s in self._stages.items()
+                },
+                "counters": [
+                    {"counter": name, **dict(labels), "value": value}
+                    for (name, labels), value in self._counters.items()
+                ],
+            }
+
+    def prometheus_text(self):
+        """All metrics in the Prometheus text exposition format."""
+        lines = []
+        seconds_metric = f"{METRIC_PREFIX}_stage_seconds"
+        sizes_metric = f"{METRIC_PREFIX}_stage_size_total"
+        with self._lock:
+            stages = {name: dict(s, buckets=list(s["buckets"]), sizes=dict(s["sizes"]))
+                      for name, s in self._stages.items()}
+            counters = dict(self._counters)
+
+        lines.append(f"# HELP {seconds_metric} Time spent in each pipeline stage.")
+        lines.append(f"# TYPE {seconds_metric} histogram")
+        for name, s in sorted(stages.items()):
+            for bound, count in zip(self.buckets, s["buckets"]):
+                lines.append(f"{seconds_metric}_bucket{_labels([('stage', name), ('le', bound)])} {count}")
+            lines.append(f"{seconds_metric}_bucket{_labels([('stage', name), ('le', '+Inf')])} {s['count']}")
+            lines.append(f"{seconds_metric}_sum{_labels([('stage', name)])} {s['sum']}")
+            lines.append(f"{seconds_metric}_count{_labels([('stage', name)])} {s['count']}")
+
+        lines.append(f"# HELP {sizes_metric} Items processed by each pipeline stage (pages, chunks, tokens, bytes).")
+        lines.append(f"# TYPE {sizes_metric} counter")
+        for name, s in sorted(stages.items()):
+            for unit, value in sorted(s["sizes"].items()):
+                lines.append(f"{sizes_metric}{_labels([('stage', name), ('unit', unit)])} {value}")
+
+        for counter in sorted({name for name, _ in counters}):
+            metric = f"{METRIC_PREFIX}_{_metric_name(counter)}_total"
+            lines.append(f"# TYPE {metric} counter")
+            for (name, labels), value in sorted(counters.items()):
+                if name == counter:
+                    lines.append(f"{metric}{_labels(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+    def reset(self):
+        with self._lock:
+            self._stages.clear()
+            self._counters.clear()
+
+
+_telemetry = None
+_telemetry_lock = threading.Lock()
+
+
+def get_telemetry():
+    """Returns the process-wide Telemetry; TELEMETRY_JSONL names a file to append events to."""
+    global _telemetry
+    with _telemetry_lock:
+        if _telemetry is None:
+            _telemetry = Telemetry(jsonl_path=get_setting("TELEMETRY_JSONL"))
+        return _telemetry
@@ -0,0 +1,39 @@
+import threading
+import time
+
+
+def is_quota_error(error):
+    """True if an API error means the key is rate limited or out of quota."""
+    message = str(error)
+    return "429" in message or "RESOURCE_EXHAUSTED" in message or "quota" in message.lower()
+
+
+class RateLimiter:
+    """
+    Spaces out calls so that one API key stays under `requests_per_minute`.
+    Thread-safe: concurrent callers are queued one interval apart.
+    """
+
+    def __init__(self, requests_per_minute):
+        self.interval = 60.0 / requests_per_minute if requests_per_minute else 0.0
+        self._next_time = 0.0
+        self._lock = threading.Lock()
+
+    def reserve(self):
+        """Books the next call slot and returns how many seconds to wait for it."""
+        with self._lock:
+            now = time.monotonic()
+            wait = max(0.0, self._next_time - now)
+            self._next_time = max(now, self._next_time) + self.interval
+        return wait
+
+    def acquire(self):
+        """Blocks until the next call is allowed."""
+        wait = self.reserve()
+        if wait:
+            time.sleep(wait)
+
+    def penalize(self, seconds):
+        """Pushes the next allowed call back, e.g. after a quota error."""
+        with self._lock:
+            self._next_time = max(self._next_time, time.monotonic() + seconds)
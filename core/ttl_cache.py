@@ -0,0 +1,66 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class TTLCache:
+    """
+    Thread-safe in-memory cache with a time-to-live per entry and least-recently-used
+    eviction once it holds `max_entries`. Expired entries are dropped lazily.
+    """
+
+    def __init__(self, max_entries=512, ttl=3600.0, clock=time.monotonic):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._clock = clock
+        # key -> (expires_at, value), least recently used first
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+    def get(self, key, default=None):
+        """Returns the value for `key` (marking it recently used), or `default` if missing or expired."""
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                return default
+            if item[0] <= self._clock():
+                del self._entries[key]
+                return default
+            self._entries.move_to_end(key)
+            return item[1]
+
+    def put(self, key, value, ttl=None):
+        with self._lock:
+            self._entries[key] = (self._clock() + (self.ttl if ttl is None else ttl), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def pop(self, key, default=None):
+        with self._lock:
+            item = self._entries.pop(key, None)
+        return default if item is None else item[1]
+
+    def items(self):
+        """Snapshot of live (key, value) pairs, without changing recency."""
+        now = self._clock()
+        with self._lock:
+            for key in [k for k, (expires, _) in self._entries.items() if expires <= now]:
+                del self._entries[key]
+            return [(key, value) for key, (_, value) in self._entries.items()]
+
+    def discard(self, predicate):
+        """Removes every entry whose key satisfies `predicate`; returns how many were removed."""
+        with self._lock:
+            keys = [key for key in self._entries if predicate(key)]
+            for key in keys:
+                del self._entries[key]
+        return len(keys)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
@@ -0,0 +1,89 @@
+import importlib
+import threading
+import time
+
+from core.config import get_setting
+
+# Heavy modules the pipeline imports on first use, in the order a first query needs them
+WARMUP_MODULES = (
+    "core.rag_pipeline",
+    "core.corpus",
+    "langchain_community.vectorstores",
+    "langchain_huggingface",
+    "langchain_experimental.text_splitter",
+    "langchain_text_splitters",
+    "langchain_google_genai",
+    "google.generativeai",
+    "google.ai.generativelanguage",
+)
+
+_status = {}
+_status_lock = threading.Lock()
+_started = False
+_start_lock = threading.Lock()
+
+
+def _step(name, fn):
+    started = time.perf_counter()
+    try:
+        fn()
+        result = {"seconds": round(time.perf_counter() - started, 3)}
+    except Exception as e:
+        print(f"⚠️ Warm-up step {name} failed: {e}")
+        result = {"seconds": round(time.perf_counter() - started, 3), "error": str(e)}
+    with _status_lock:
+        _status[name] = result
+
+
+def _warm_router():
+    from core.llm import get_router
+    get_router().warm()
+
+
+def _warm_local_embeddings():
+    from core.embeddings import get_local_embeddings
+    get_local_embeddings()
+
+
+def _warm_web_search():
+    from core.search_tool import get_web_search
+    get_web_search()
+
+
+def warm_up():
+    """
+    Imports the heavy modules, then loads the local embedding model and builds
+    the Gemini clients and web search client. Failures are logged and recorded,
+    never raised: the same work is simply redone on first use.
+    """
+    started = time.perf_counter()
+    for module in WARMUP_MODULES:
+        _step(f"import {module}", lambda: importlib.import_module(module))
+    _step("local embeddings", _warm_local_embeddings)
+    _step("llm clients", _warm_router)
+    _step("web search", _warm_web_search)
+    print(f"✅ Warm-up finished in {time.perf_counter() - started:.1f}s")
+
+
+def start_warmup():
+    """
+    Runs `warm_up` on a daemon thread, once per process, so the first query does
+    not pay for imports and model loading. Skipped when WARMUP_DISABLED is set.
+    Returns the thread, or None if it was not started now.
+    """
+    global _started
+    if get_setting("WARMUP_DISABLED", False, cast=bool):
+        return None
+    with _start_lock:
+        if _started:
+            return None
+        _started = True
+    thread = threading.Thread(target=warm_up, name="rag-warmup", daemon=True)
+    thread.start()
+    return thread
+
+
+def warmup_status():
+    """{step: {"seconds", "error"?}} for the warm-up steps finished so far."""
+    with _status_lock:
+        return dict(_status)
@@ -1,3 +1,17 @@
+import re
+
+import numpy as np
+from langchain_core.documents import Document
+
+from ingestion.stream import batched
+
+# Same sentence boundaries and breakpoint rule as LangChain's SemanticChunker defaults
+SENTENCE_SPLIT = re.compile(r"(?<=[.?!])\s+")
+BREAKPOINT_PERCENTILE = 95
+# Documents (e.g. PDF pages) whose sentences are encoded in one batched call
+DOCUMENTS_PER_BATCH = 32
+
+
 def chunk_text(text, chunk_size=1000, overlap=200):
     chunks = []
     start = 0
@@ -8,3 +22,79 @@ def chunk_text(text, chunk_size=1000, overlap=200):
         start += chunk_size - overlap
 
     return chunks
+
+
+def sentence_windows(sentences, buffer_size=1):
+    """Each sentence joined with `buffer_size` neighbours on either side, as SemanticChunker embeds them."""
+    return [
+        " ".join(sentences[max(0, i - buffer_size):i + buffer_size + 1])
+        for i in range(len(sentences))
+    ]
+
+
+def semantic_groups(vectors, percentile=BREAKPOINT_PERCENTILE):
+    """
+    Splits a run of unit-length sentence vectors where the cosine distance to the
+    next sentence is above the given percentile. Returns [(start, end)] ranges.
+    """
+    n = len(vectors)
+    if n < 2:
+        return [(0, n)] if n else []
+    distances = 1.0 - np.sum(vectors[:-1] * vectors[1:], axis=1)
+    threshold = np.percentile(distances, percentile)
+    groups = []
+    start = 0
+    for index in np.flatnonzero(distances > threshold):
+        groups.append((start, int(index) + 1))
+        start = int(index) + 1
+    if start < n:
+        groups.append((start, n))
+    return groups
+
+
+class PooledSemanticChunker:
+    """
+    Semantic chunker that also returns a vector for every chunk.
+
+    Sentences are split and grouped like SemanticChunker, but the sentence
+    embeddings it computes for breakpoint detection are kept: each chunk's vector
+    is the normalized mean of its sentences' vectors. Every sentence is embedded
+    exactly once and no second embedding pass is needed for indexing.
+
+    `encode` maps a list of texts to an array of unit-length vectors.
+    """
+
+    def __init__(self, encode, buffer_size=1, breakpoint_percentile=BREAKPOINT_PERCENTILE):
+        self.encode = encode
+        self.buffer_size = buffer_size
+        self.breakpoint_percentile = breakpoint_percentile
+
+    def split_documents_with_vectors(self, documents):
+        """Returns [(chunk Document, vector)] for `documents`, encoding all their sentences in one call."""
+        # Table row groups keep their header: each is one chunk, embedded whole
+        sentence_lists = [
+            [doc.page_content] if doc.metadata.get("tabular")
+            else [s for s in SENTENCE_SPLIT.split(doc.page_content) if s.strip()]
+            for doc in documents
+        ]
+        windows = [w for sentences in sentence_lists for w in sentence_windows(sentences, self.buffer_size)]
+        if not windows:
+            return []
+        vectors = np.asarray(self.encode(windows), dtype="float32")
+
+        results = []
+        offset = 0
+        for doc, sentences in zip(documents, sentence_lists):
+            doc_vectors = vectors[offset:offset + len(sentences)]
+            offset += len(sentences)
+            for start, end in semantic_groups(doc_vectors, self.breakpoint_percentile):
+                pooled = doc_vectors[start:end].mean(axis=0)
+                pooled /= max(float(np.linalg.norm(pooled)), 1e-12)
+                chunk = Document(page_content=" ".join(sentences[start:end]), metadata=dict(doc.metadata))
+                results.append((chunk, pooled))
+        return results
+
+    def stream(self, documents, batch_documents=DOCUMENTS_PER_BATCH):
+        """Yields (chunk Document, vector) pairs from a stream of documents, one batch of documents at a time."""
+        for batch in batched(documents, batch_documents):
+            yield from self.split_documents_with_vectors(batch)
@@ -1,83 +1,142 @@
 import os
+import shutil
 import tempfile
-import pdfplumber
-import docx
-import pandas as pd
 from langchain_core.documents import Document
 
-# Try importing OCR tools (optional dependency handling)
-try:
-    import pytesseract
-    from pdf2image import convert_from_path
-    OCR_AVAILABLE = True
-except ImportError:
-    OCR_AVAILABLE = False
+from core.telemetry import span
+from ingestion.ocr import OCR_AVAILABLE, needs_ocr, ocr_pages
+from ingestion.pdf_text import iter_pdf_text
+from ingestion.tabular import TABULAR_EXTENSIONS, iter_frames, row_group_documents
 
-def load_document(uploaded_file):
+# PDF pages extracted (and OCR'd) per step of the stream
+PAGE_WINDOW = 32
+# Target size of the text blocks streamed from DOCX/TXT/MD files
+BLOCK_CHARS = 8000
+
+
+class DocumentLoadError(Exception):
+    """A document could not be read to the end (bad encoding, corrupt file, I/O error)."""
+
+
+def _pdf_pages(path):
+    """Yields (page_number, text) for a PDF, one window of pages at a time."""
+    for start, window in iter_pdf_text(path, window=PAGE_WINDOW):
+        # OCR only the pages in this window without a usable text layer
+        missing = [start + i + 1 for i, page_text in enumerate(window) if needs_ocr(page_text)]
+        if missing and OCR_AVAILABLE:
+            try:
+                with span("ocr", pages=len(missing)):
+                    recognized = ocr_pages(path, missing)
+                for page_number, page_text in recognized.items():
+                    if len(page_text.strip()) > len(window[page_number - start - 1].strip()):
+                        window[page_number - start - 1] = page_text
+            except Exception as e:
+                print(f"OCR warning (Poppler might be missing): {e}")
+
+        for i, page_text in enumerate(window):
+            yield start + i + 1, page_text
+
+
+def _blocks(lines):
+    """Groups lines into blocks of roughly BLOCK_CHARS characters."""
+    block = []
+    size = 0
+    for line in lines:
+        block.append(line)
+        size += len(line)
+        if size >= BLOCK_CHARS:
+            yield "".join(block)
+            block = []
+            size = 0
+    if block:
+        yield "".join(block)
+
+
+def _text_blocks(f):
+    """Reads a text file in blocks of about BLOCK_CHARS, cut at a line or word boundary."""
+    carry = ""
+    while True:
+        data = f.read(BLOCK_CHARS)
+        if not data:
+            break
+        buffer = carry + data
+        cut = buffer.rfind("\n")
+        if cut < len(buffer) // 2:
+            cut = max(buffer.rfind(" "), cut)
+        if cut <= 0:
+            cut = len(buffer) - 1
+        yield buffer[:cut + 1]
+        carry = buffer[cut + 1:]
+    if carry:
+        yield carry
+
+
+def iter_document(uploaded_file):
     """
-    Loads a document (PDF, DOCX, XLSX, CSV, TXT, MD) and returns a list of Document objects.
-    Includes OCR fallback for scanned PDFs using pdf2image and pytesseract.
+    Streams a document (PDF, DOCX, XLSX, CSV, TXT, MD) as a sequence of Document objects.
+
+    PDFs yield one Document per page with a 1-based "page" in metadata; spreadsheets
+    yield row groups that keep their column header (see ingestion/tabular.py); other
+    formats yield blocks of paragraphs or lines. Only a bounded window of the file's
+    text is held in memory at a time, so callers can split and embed as they go.
+    Scanned PDF pages (no text layer) are OCR'd in parallel using pdf2image and pytesseract.
+    Raises DocumentLoadError if the file fails part-way, so a partial document
+    is never indexed as if it were complete.
     """
     if uploaded_file is None:
-        return []
+        return
+
+    source = uploaded_file.name
+    file_extension = source.split(".")[-1].lower()
 
-    file_extension = uploaded_file.name.split(".")[-1].lower()
-    text = ""
-    
     # Create a temporary file to handle the upload
+    uploaded_file.seek(0)
     with tempfile.NamedTemporaryFile(delete=False, suffix=f".{file_extension}") as temp_file:
-        temp_file.write(uploaded_file.getvalue())
+        shutil.copyfileobj(uploaded_file, temp_file)
         temp_path = temp_file.name
 
     try:
         if file_extension == "pdf":
-            # 1. Try standard text extraction
-            with pdfplumber.open(temp_path) as pdf:
-                for page in pdf.pages:
-                    extracted = page.extract_text()
-                    if extracted:
-                        text += extracted + "\n"
-            
-            # 2. OCR Fallback if text is empty (for scanned PDFs)
-            if not text.strip() and OCR_AVAILABLE:
-                try:
-                    # Note: Poppler must be installed and in PATH for this to work on Windows
-                    images = convert_from_path(temp_path)
-                    for img in images:
-                        text += pytesseract.image_to_string(img) + "\n"
-                except Exception as e:
-                    print(f"OCR warning (Poppler might be missing): {e}")
+            for page_number, page_text in _pdf_pages(temp_path):
+                if page_text.strip():
+                    yield Document(page_content=page_text, metadata={"source": source, "page": page_number})
 
         elif file_extension == "docx":
+            import docx
             doc = docx.Document(temp_path)
-            for para in doc.paragraphs:
-                text += para.text + "\n"
-        
-        elif file_extension in ["xlsx", "xls"]:
-            # Excel handling
-            df = pd.read_excel(temp_path)
-            text = df.to_string(index=False)
-            
-        elif file_extension == "csv":
-            # CSV handling
-            df = pd.read_csv(temp_path)
-            text = df.to_string(index=False)
-            
+            paragraphs = (para.text + "\n" for para in doc.paragraphs)
+            for block in _blocks(paragraphs):
+                if block.strip():
+                    yield Document(page_content=block, metadata={"source": source})
+
+        elif file_extension in TABULAR_EXTENSIONS:
+            # CSV/Excel handling, streamed in row groups (each chunk keeps its header line)
+            yield from row_group_documents(iter_frames(temp_path, source), source)
+
         elif file_extension in ["txt", "md"]:
             # Text and Markdown handling
             with open(temp_path, "r", encoding="utf-8") as f:
-                text = f.read()
+                for block in _text_blocks(f):
+                    if block.strip():
+                        yield Document(page_content=block, metadata={"source": source})
 
     except Exception as e:
         print(f"Error parsing document: {e}")
-        return []
-        
+        raise DocumentLoadError(f"Could not extract text from {source}: {e}") from e
+
     finally:
         # Clean up temp file
         if os.path.exists(temp_path):
             os.remove(temp_path)
 
-    if not text.strip():
-        return []
 
-    return [Document(page_content=text, metadata={"source": uploaded_file.name})]
\ No newline at end of file
+def load_document(uploaded_file):
+    """
+    Loads a document (PDF, DOCX, XLSX, CSV, TXT, MD) and returns a list of Document objects,
+    one per PDF page or text block, or [] if the file could not be read.
+    See `iter_document` for the streaming version.
+    """
+    try:
+        return list(iter_document(uploaded_file))
+    except DocumentLoadError:
+        return []
@@ -0,0 +1,59 @@
+import importlib.util
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+# OCR tools are optional; checked without importing them (pytesseract loads pandas)
+OCR_AVAILABLE = all(importlib.util.find_spec(name) is not None for name in ("pytesseract", "pdf2image"))
+
+# Pages with fewer extracted characters than this are treated as scanned
+MIN_TEXT_CHARS = 20
+OCR_DPI = 200
+
+
+def needs_ocr(text):
+    """True if a page's extracted text layer is missing or too thin to be useful."""
+    return len((text or "").strip()) < MIN_TEXT_CHARS
+
+
+def _limit_worker_threads():
+    # Tesseract spawns OpenMP threads per call; with one process per core that
+    # oversubscribes the CPU, so each worker is pinned to a single thread.
+    os.environ["OMP_THREAD_LIMIT"] = "1"
+
+
+def _ocr_page(args):
+    """Renders and OCRs a single page. Runs in a worker process."""
+    import pytesseract
+    from pdf2image import convert_from_path
+
+    path, page_number, dpi = args
+    # Note: Poppler must be installed and in PATH for this to work on Windows
+    images = convert_from_path(path, dpi=dpi, first_page=page_number, last_page=page_number)
+    try:
+        return page_number, "\n".join(pytesseract.image_to_string(img) for img in images)
+    finally:
+        for img in images:
+            img.close()
+
+
+def ocr_pages(path, page_numbers, max_workers=None, dpi=OCR_DPI):
+    """
+    OCRs only the given 1-based pages of the PDF at `path`.
+
+    Each page is rendered on its own inside a worker, so peak memory is one page
+    image per worker regardless of document length. Work is spread over a
+    process pool sized to the CPU count. Returns {page_number: text} in page order.
+    """
+    page_numbers = sorted(page_numbers)
+    if not page_numbers or not OCR_AVAILABLE:
+        return {}
+
+    tasks = [(path, page_number, dpi) for page_number in page_numbers]
+    workers = min(max_workers or os.cpu_count() or 1, len(tasks))
+
+    if workers == 1:
+        return dict(_ocr_page(task) for task in tasks)
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_limit_worker_threads) as executor:
+        # map() yields in submission order, so results come back in page order
+        return dict(executor.map(_ocr_page, tasks))
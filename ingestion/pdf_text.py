@@ -0,0 +1,89 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import pdfplumber
+
+# Below this many pages, process pool startup costs more than it saves
+MIN_PAGES_FOR_PARALLEL = 16
+# Smallest page range handed to one worker (each task re-opens the file)
+MIN_PAGES_PER_TASK = 4
+
+
+def count_pages(path):
+    """Returns the number of pages in the PDF at `path`."""
+    with pdfplumber.open(path) as pdf:
+        return len(pdf.pages)
+
+
+def _extract_range(args):
+    """Extracts text for pages [start, end) of the PDF at `path`. Runs in a worker process."""
+    path, start, end = args
+    texts = []
+    with pdfplumber.open(path) as pdf:
+        for page in pdf.pages[start:end]:
+            texts.append(page.extract_text() or "")
+            # Drop pdfplumber's per-page layout caches as we go
+            page.close()
+    return texts
+
+
+def _split_range(start, end, parts):
+    size = max(MIN_PAGES_PER_TASK, -(-(end - start) // parts))
+    return [(s, min(s + size, end)) for s in range(start, end, size)]
+
+
+def iter_pdf_text(path, window=32, max_workers=None):
+    """
+    Yields (start_page_index, [page texts]) for the PDF at `path`, one window at a time.
+
+    pdfplumber layout analysis is CPU-bound, so for long documents each window is
+    split into page ranges extracted by a process pool (workers open the file by
+    path), with the next window already in flight while the current one is
+    consumed. Short documents are extracted serially.
+    """
+    total = count_pages(path)
+    workers = max_workers or os.cpu_count() or 1
+    parallel = workers > 1 and total >= MIN_PAGES_FOR_PARALLEL
+    started = time.perf_counter()
+
+    if not parallel:
+        for start in range(0, total, window):
+            yield start, _extract_range((path, start, min(start + window, total)))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            def submit(start):
+                end = min(start + window, total)
+                return [
+                    executor.submit(_extract_range, (path, s, e))
+                    for s, e in _split_range(start, end, workers)
+                ]
+
+            starts = list(range(0, total, window))
+            in_flight = submit(starts[0]) if starts else []
+            for i, start in enumerate(starts):
+                current = in_flight
+                in_flight = submit(starts[i + 1]) if i + 1 < len(starts) else []
+                yield start, [text for future in current for text in future.result()]
+
+    elapsed = time.perf_counter() - started
+    mode = f"parallel, {workers} workers" if parallel else "serial"
+    print(f"✅ Extracted text from {total} pages in {elapsed:.2f}s ({mode})")
+
+
+def extract_pdf_pages(path, max_workers=None):
+    """
+    Extracts every page's text from the PDF at `path`, in page order.
+    Returns a dict with "pages", "seconds" and "mode" ("parallel" or "serial").
+    """
+    started = time.perf_counter()
+    total = count_pages(path)
+    workers = max_workers or os.cpu_count() or 1
+    pages = []
+    for _, texts in iter_pdf_text(path, window=max(total, 1), max_workers=workers):
+        pages.extend(texts)
+    return {
+        "pages": pages,
+        "seconds": time.perf_counter() - started,
+        "mode": "parallel" if workers > 1 and total >= MIN_PAGES_FOR_PARALLEL else "serial",
+    }
@@ -0,0 +1,85 @@
+import contextvars
+import queue
+import threading
+
+from core.throttle import is_quota_error
+
+_DONE = object()
+
+
+def batched(iterable, size):
+    """Yields lists of up to `size` items from `iterable`."""
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def prefetch(iterable, depth=2):
+    """
+    Runs `iterable` in a background thread, at most `depth` items ahead of the consumer.
+
+    Lets loading/OCR of the next window overlap with embedding of the current one,
+    while the bounded queue applies backpressure so memory stays flat.
+    """
+    buffer = queue.Queue(maxsize=depth)
+    stop = threading.Event()
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                buffer.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        try:
+            for item in iterable:
+                if not put(item):
+                    return
+            put(_DONE)
+        except BaseException as e:
+            put(e)
+
+    # The producer sees the consumer's context variables (e.g. the telemetry trace)
+    thread = threading.Thread(target=contextvars.copy_context().run, args=(produce,), daemon=True)
+    thread.start()
+    try:
+        while True:
+            item = buffer.get()
+            if item is _DONE:
+                return
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+    finally:
+        # Consumer stopped early: let the producer exit
+        stop.set()
+
+
+def split_stream(documents, splitter, fallback_splitter=None):
+    """
+    Splits a stream of Documents one at a time, yielding chunks as they are produced.
+    If `splitter` fails with a quota error, the rest of the stream uses `fallback_splitter`.
+    Table row groups (metadata["tabular"]) are already chunk-sized and pass through unsplit.
+    """
+    for document in documents:
+        if document.metadata.get("tabular"):
+            yield document
+            continue
+        try:
+            chunks = splitter.split_documents([document])
+        except Exception as e:
+            # Handle Rate Limits (429) by falling back to standard splitter
+            if fallback_splitter is None or not is_quota_error(e):
+                raise
+            print("⚠️ Quota exceeded for Semantic Chunking. Falling back to standard chunking.")
+            splitter, fallback_splitter = fallback_splitter, None
+            chunks = splitter.split_documents([document])
+        yield from chunks
@@ -0,0 +1,155 @@
+import os
+import shutil
+import tempfile
+
+from langchain_core.documents import Document
+
+from core.config import get_setting
+
+TABULAR_EXTENSIONS = ("csv", "xlsx", "xls")
+# Rows parsed per step while streaming a sheet
+READ_ROWS = 20000
+# Rows per retrieval chunk; each chunk repeats the column header
+DEFAULT_CHUNK_ROWS = 50
+# Row-group chunks embedded per table; later rows are reached through table queries only
+DEFAULT_MAX_CHUNKS = 2000
+# Text columns with at most this share of distinct values are stored as categories
+CATEGORY_RATIO = 0.5
+
+
+def is_tabular(name):
+    return name.split(".")[-1].lower() in TABULAR_EXTENSIONS
+
+
+def get_table_params():
+    """Row-group chunking of tables (TABLE_CHUNK_ROWS, TABLE_MAX_CHUNKS; 0 means no limit)."""
+    return {
+        "chunk_rows": get_setting("TABLE_CHUNK_ROWS", DEFAULT_CHUNK_ROWS, cast=int),
+        "max_chunks": get_setting("TABLE_MAX_CHUNKS", DEFAULT_MAX_CHUNKS, cast=int),
+    }
+
+
+def _column_names(header):
+    """String column names, with blanks filled in and duplicates numbered."""
+    names = []
+    for i, name in enumerate(header):
+        name = str(name).strip() if name is not None else ""
+        name = name or f"column_{i + 1}"
+        base, n = name, 2
+        while name in names:
+            name = f"{base}_{n}"
+            n += 1
+        names.append(name)
+    return names
+
+
+def _xlsx_frames(path, source, read_rows):
+    import openpyxl
+    import pandas as pd
+
+    # Read-only mode streams rows instead of loading the whole workbook
+    workbook = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    try:
+        sheets = workbook.worksheets
+        for sheet in sheets:
+            table = source if len(sheets) == 1 else f"{source} [{sheet.title}]"
+            rows = sheet.iter_rows(values_only=True)
+            header = next(rows, None)
+            if header is None:
+                continue
+            columns = _column_names(header)
+            batch = []
+            for row in rows:
+                if any(value is not None for value in row):
+                    batch.append(row[:len(columns)])
+                if len(batch) >= read_rows:
+                    yield table, pd.DataFrame(batch, columns=columns).infer_objects()
+                    batch = []
+            if batch:
+                yield table, pd.DataFrame(batch, columns=columns).infer_objects()
+    finally:
+        workbook.close()
+
+
+def iter_frames(path, source, read_rows=READ_ROWS):
+    """
+    Streams a CSV or Excel file as (table name, DataFrame) row groups of up to
+    `read_rows` rows. A CSV is one table named after the file; each sheet of a
+    workbook is its own table.
+    """
+    import pandas as pd
+
+    extension = source.split(".")[-1].lower()
+    if extension == "csv":
+        for df in pd.read_csv(path, chunksize=read_rows):
+            df.columns = _column_names(df.columns)
+            yield source, df
+    elif extension == "xlsx":
+        yield from _xlsx_frames(path, source, read_rows)
+    else:
+        # Legacy .xls has no streaming reader
+        sheets = pd.read_excel(path, sheet_name=None)
+        for name, df in sheets.items():
+            df.columns = _column_names(df.columns)
+            yield (source if len(sheets) == 1 else f"{source} [{name}]"), df
+
+
+def row_group_documents(frames, source, chunk_rows=None, max_chunks=None):
+    """
+    Turns streamed (table, DataFrame) row groups into retrieval chunks of
+    `chunk_rows` rows, each with the table name and column header, so every
+    chunk reads on its own. Metadata marks them "tabular" (already chunk-sized,
+    not split further) with the 1-based "rows" range they cover.
+    """
+    params = get_table_params()
+    chunk_rows = chunk_rows or params["chunk_rows"]
+    max_chunks = params["max_chunks"] if max_chunks is None else max_chunks
+    emitted = {}
+    offsets = {}
+    for table, df in frames:
+        offset = offsets.get(table, 0)
+        offsets[table] = offset + len(df)
+        for start in range(0, len(df), chunk_rows):
+            if max_chunks and emitted.get(table, 0) >= max_chunks:
+                break
+            emitted[table] = emitted.get(table, 0) + 1
+            block = df.iloc[start:start + chunk_rows]
+            first = offset + start + 1
+            yield Document(
+                page_content=f"Table: {table} (rows {first}-{first + len(block) - 1})\n{block.to_csv(index=False)}",
+                metadata={"source": source, "table": table, "rows": f"{first}-{first + len(block) - 1}",
+                          "tabular": True},
+            )
+    for table, rows in offsets.items():
+        if max_chunks and rows > max_chunks * chunk_rows:
+            print(f"✅ {table}: first {max_chunks * chunk_rows} of {rows} rows indexed for search; "
+                  f"all rows are available to table queries")
+
+
+def compact(df):
+    """Stores repetitive text columns as categories, which keeps large tables small in memory."""
+    from pandas.api.types import is_object_dtype, is_string_dtype
+
+    for column in df.columns:
+        text = is_object_dtype(df[column]) or is_string_dtype(df[column])
+        if text and len(df) and df[column].nunique() <= CATEGORY_RATIO * len(df):
+            df[column] = df[column].astype("category")
+    return df
+
+
+def load_tables(file):
+    """Reads an uploaded CSV/Excel file into {table name: DataFrame}, streamed in row groups."""
+    import pandas as pd
+
+    extension = file.name.split(".")[-1].lower()
+    file.seek(0)
+    with tempfile.NamedTemporaryFile(delete=False, suffix=f".{extension}") as temp_file:
+        shutil.copyfileobj(file, temp_file)
+        temp_path = temp_file.name
+    try:
+        groups = {}
+        for table, df in iter_frames(temp_path, file.name):
+            groups.setdefault(table, []).append(df)
+        return {table: compact(pd.concat(frames, ignore_index=True)) for table, frames in groups.items()}
+    finally:
+        os.remove(temp_path)
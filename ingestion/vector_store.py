@@ -1,8 +1,319 @@
+import math
+import time
+
 import faiss
 import numpy as np
 
-def build_faiss_index(embeddings):
-    dim = len(embeddings[0])
-    index = faiss.IndexFlatL2(dim)
-    index.add(np.array(embeddings).astype("float32"))
+# Default size thresholds (number of vectors) for choosing an index type
+FLAT_MAX_VECTORS = 20000
+HNSW_MAX_VECTORS = 1000000
+
+HNSW_M = 32
+HNSW_EF_CONSTRUCTION = 80
+DEFAULT_EF_SEARCH = 64
+DEFAULT_NPROBE = 16
+# FAISS wants at least this many training points per IVF centroid
+IVF_MIN_POINTS_PER_LIST = 39
+
+INDEX_KINDS = ("flat", "hnsw", "ivf")
+QUANTIZATIONS = ("none", "sq8", "pq")
+# PQ trains 256 centroids per sub-quantizer
+PQ_MIN_TRAINING_POINTS = 256 * IVF_MIN_POINTS_PER_LIST
+# Re-scoring re-ranks this many times k candidates with float vectors
+RESCORE_K_FACTOR = 4
+
+
+def choose_index_kind(num_vectors, flat_max=FLAT_MAX_VECTORS, hnsw_max=HNSW_MAX_VECTORS):
+    """Picks flat search for small corpora, HNSW for medium ones and IVF above that."""
+    if num_vectors <= flat_max:
+        return "flat"
+    if num_vectors <= hnsw_max:
+        return "hnsw"
+    return "ivf"
+
+
+def truncate_vectors(vectors, dim=None):
+    """
+    Keeps the first `dim` components of each vector and re-normalizes to unit length.
+    gemini-embedding-001 is trained so that prefixes remain usable embeddings.
+    """
+    vectors = np.asarray(vectors, dtype="float32")
+    if dim and dim < vectors.shape[1]:
+        vectors = vectors[:, :dim]
+    vectors = np.ascontiguousarray(vectors, dtype="float32").copy()
+    faiss.normalize_L2(vectors)
+    return vectors
+
+
+def effective_quantization(num_vectors, quantization):
+    """The quantization `build_faiss_index` actually uses: PQ needs enough vectors to train."""
+    if quantization == "pq" and num_vectors < PQ_MIN_TRAINING_POINTS:
+        return "sq8"
+    return quantization
+
+
+def _pq_subquantizers(dim):
+    """Largest PQ code size (bytes per vector) with at least 8 dims per sub-quantizer."""
+    for m in range(max(1, dim // 8), 0, -1):
+        if dim % m == 0:
+            return m
+    return 1
+
+
+def build_faiss_index(embeddings, kind="flat", quantization="none", rescore=False, nlist=None,
+                      hnsw_m=HNSW_M, ef_construction=HNSW_EF_CONSTRUCTION, nprobe=DEFAULT_NPROBE,
+                      ef_search=DEFAULT_EF_SEARCH, pq_m=None):
+    """
+    Builds an L2 FAISS index over `embeddings`.
+
+    kind: "flat" (exhaustive), "hnsw" (graph), "ivf" (inverted lists with a trained
+    coarse quantizer) or "auto" to choose by corpus size.
+    quantization: "none" (float32), "sq8" (int8 scalar, 4x smaller) or "pq"
+    (product quantization, `pq_m` bytes per vector; sq8 below PQ_MIN_TRAINING_POINTS).
+    rescore: keep a float copy and re-rank the top candidates exactly, which buys
+    back recall at the cost of the float copy's memory.
+    """
+    vectors = np.ascontiguousarray(np.asarray(embeddings, dtype="float32"))
+    n, dim = vectors.shape
+    if kind == "auto":
+        kind = choose_index_kind(n)
+    if kind not in INDEX_KINDS:
+        raise ValueError(f"Unknown index kind: {kind!r}. Expected one of {INDEX_KINDS} or 'auto'.")
+    if quantization not in QUANTIZATIONS:
+        raise ValueError(f"Unknown quantization: {quantization!r}. Expected one of {QUANTIZATIONS}.")
+
+    pq_m = pq_m or _pq_subquantizers(dim)
+    if effective_quantization(n, quantization) != quantization:
+        print(f"⚠️ Too few vectors ({n}) to train PQ. Using sq8 instead.")
+        quantization = effective_quantization(n, quantization)
+
+    sq8 = faiss.ScalarQuantizer.QT_8bit
+    if kind == "flat":
+        if quantization == "sq8":
+            index = faiss.IndexScalarQuantizer(dim, sq8)
+        elif quantization == "pq":
+            index = faiss.IndexPQ(dim, pq_m, 8)
+        else:
+            index = faiss.IndexFlatL2(dim)
+    elif kind == "hnsw":
+        if quantization == "sq8":
+            index = faiss.IndexHNSWSQ(dim, sq8, hnsw_m)
+        elif quantization == "pq":
+            index = faiss.IndexHNSWPQ(dim, pq_m, hnsw_m)
+        else:
+            index = faiss.IndexHNSWFlat(dim, hnsw_m)
+        index.hnsw.efConstruction = ef_construction
+    else:
+        # ~4·sqrt(n) lists, capped so every centroid gets enough training points
+        nlist = nlist or int(4 * math.sqrt(n))
+        nlist = max(1, min(nlist, n // IVF_MIN_POINTS_PER_LIST))
+        quantizer = faiss.IndexFlatL2(dim)
+        if quantization == "sq8":
+            index = faiss.IndexIVFScalarQuantizer(quantizer, dim, nlist, sq8)
+        elif quantization == "pq":
+            index = faiss.IndexIVFPQ(quantizer, dim, nlist, pq_m, 8)
+        else:
+            index = faiss.IndexIVFFlat(quantizer, dim, nlist)
+        index.own_fields = True
+        quantizer.this.disown()
+
+    if rescore and quantization != "none":
+        index = faiss.IndexRefineFlat(index)
+        index.k_factor = RESCORE_K_FACTOR
+
+    if not index.is_trained:
+        index.train(vectors)
+    index.add(vectors)
+
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        # Keeps reconstruct() working, which incremental corpus updates rely on
+        ivf.set_direct_map_type(faiss.DirectMap.Hashtable)
+    configure_search(index, nprobe=nprobe, ef_search=ef_search)
     return index
+
+
+def _base_index(index):
+    """Unwraps a re-scoring wrapper to the index that does the candidate search."""
+    if isinstance(index, faiss.IndexRefine):
+        return faiss.downcast_index(index.base_index)
+    return index
+
+
+def index_kind(index):
+    """Returns "flat", "hnsw" or "ivf" for an index built by build_faiss_index."""
+    index = _base_index(index)
+    if isinstance(index, faiss.IndexHNSW):
+        return "hnsw"
+    if faiss.try_extract_index_ivf(index) is not None:
+        return "ivf"
+    return "flat"
+
+
+def index_quantization(index):
+    """Returns "none", "sq8" or "pq" for an index built by build_faiss_index."""
+    index = _base_index(index)
+    if isinstance(index, faiss.IndexHNSW):
+        index = faiss.downcast_index(index.storage)
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        index = faiss.downcast_index(ivf)
+    if isinstance(index, (faiss.IndexScalarQuantizer, faiss.IndexIVFScalarQuantizer)):
+        return "sq8"
+    if isinstance(index, (faiss.IndexPQ, faiss.IndexIVFPQ)):
+        return "pq"
+    return "none"
+
+
+def configure_search(index, nprobe=None, ef_search=None):
+    """Sets query-time accuracy/speed knobs: IVF `nprobe`, HNSW `efSearch`."""
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None and nprobe:
+        ivf.nprobe = nprobe
+    base = _base_index(index)
+    if isinstance(base, faiss.IndexHNSW) and ef_search:
+        base.hnsw.efSearch = ef_search
+    return index
+
+
+def supports_compacting_remove(index):
+    """
+    True if remove_ids() renumbers the remaining vectors 0..n-1 (flat code indexes),
+    which is what LangChain's FAISS.delete assumes. IVF keeps IDs, HNSW cannot remove.
+    """
+    return isinstance(index, faiss.IndexFlatCodes)
+
+
+def save_index(index, path):
+    """Writes an index to disk."""
+    faiss.write_index(index, path)
+
+
+def load_index(path, mmap=True):
+    """
+    Reads an index from disk. With `mmap`, vector data is memory-mapped read-only,
+    so processes opening the same file share its pages. Memory-mapped indexes must
+    not be modified: use `owned_copy` first.
+    """
+    return faiss.read_index(path, mmap_flags() if mmap else 0)
+
+
+def mmap_flags():
+    """FAISS read flags for shared, read-only memory-mapped indexes."""
+    return faiss.IO_FLAG_MMAP_IFC | faiss.IO_FLAG_READ_ONLY
+
+
+def owned_copy(index):
+    """
+    Copies `index` into private memory (e.g. from a memory-mapped one) so it can be
+    modified. The copy is byte-for-byte, so quantized codes are not re-quantized.
+    """
+    return faiss.deserialize_index(faiss.serialize_index(index))
+
+
+def has_exact_vectors(index):
+    """True if `index_vectors` returns the original vectors, not decoded quantized codes."""
+    return index_quantization(index) == "none" or isinstance(index, faiss.IndexRefine)
+
+
+def index_vectors(index):
+    """
+    Returns every vector stored in a FAISS index as a float32 array of shape (n, d).
+    For quantized indexes without a float copy these are lossy reconstructions.
+    """
+    if index.ntotal == 0:
+        return np.zeros((0, index.d), dtype="float32")
+    return index.reconstruct_n(0, index.ntotal)
+
+
+def exact_neighbors(vectors, queries, k=10):
+    """Ground-truth k nearest neighbors by exhaustive float32 search."""
+    vectors = np.asarray(vectors, dtype="float32")
+    exact = faiss.IndexFlatL2(vectors.shape[1])
+    exact.add(vectors)
+    _, truth = exact.search(np.asarray(queries, dtype="float32"), min(k, len(vectors)))
+    return truth
+
+
+def recall_at_k(index, vectors, queries, k=10, truth=None):
+    """
+    Measures an approximate index against exact flat search over the same vectors
+    (or against precomputed `truth` neighbor IDs).
+    Returns {"recall": mean recall@k, "latency_ms": mean query latency}.
+    """
+    queries = np.asarray(queries, dtype="float32")
+    if truth is None:
+        truth = exact_neighbors(vectors, queries, k)
+    k = truth.shape[1]
+
+    started = time.perf_counter()
+    _, found = index.search(queries, k)
+    latency_ms = (time.perf_counter() - started) * 1000 / max(len(queries), 1)
+
+    hits = sum(len(set(t) & set(f)) for t, f in zip(truth, found))
+    return {"recall": hits / (len(queries) * k), "latency_ms": latency_ms}
+
+
+def index_memory_bytes(index):
+    """Serialized size of an index, a close proxy for its resident memory."""
+    return int(faiss.serialize_index(index).size)
+
+
+def rescore_memory_bytes(index):
+    """Size of the float copy a re-scoring index keeps next to its codes (0 without one)."""
+    if not isinstance(index, faiss.IndexRefine):
+        return 0
+    return index_memory_bytes(faiss.downcast_index(index.refine_index))
+
+
+def compare_index_configs(vectors, queries, configs, k=10):
+    """
+    Builds one index per config and reports memory and recall@k against exact
+    search on the full-width float vectors. "memory_bytes" and "compression" cover
+    the searched index (codes, graph, lists); a re-scoring config's float copy is
+    reported apart as "rescore_bytes".
+
+    Each config is a dict with optional "dim" (truncate + re-normalize),
+    "kind", "quantization" and "rescore" keys.
+    """
+    vectors = truncate_vectors(vectors)
+    queries = truncate_vectors(queries)
+    truth = exact_neighbors(vectors, queries, k)
+    baseline = vectors.nbytes
+
+    report = []
+    for config in configs:
+        dim = config.get("dim")
+        index = build_faiss_index(
+            truncate_vectors(vectors, dim),
+            kind=config.get("kind", "flat"),
+            quantization=config.get("quantization", "none"),
+            rescore=config.get("rescore", False),
+        )
+        stats = recall_at_k(index, None, truncate_vectors(queries, dim), truth=truth)
+        rescore_bytes = rescore_memory_bytes(index)
+        memory = index_memory_bytes(index) - rescore_bytes
+        report.append({
+            **config,
+            "memory_bytes": memory,
+            "rescore_bytes": rescore_bytes,
+            "compression": baseline / memory if memory else 0.0,
+            **stats,
+        })
+    return report
+
+
+def sweep_search_params(vectors, queries, kind, values, k=10):
+    """
+    Builds one `kind` index and reports recall@k and latency for each `nprobe`
+    (IVF) or `efSearch` (HNSW) in `values`, so settings can be picked with evidence.
+    """
+    index = build_faiss_index(vectors, kind=kind)
+    report = []
+    for value in values:
+        if kind == "ivf":
+            configure_search(index, nprobe=value)
+        else:
+            configure_search(index, ef_search=value)
+        report.append({"kind": kind, "param": value, **recall_at_k(index, vectors, queries, k)})
+    return report
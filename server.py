@@ -0,0 +1,278 @@
+"""
+Headless HTTP service for indexing documents and streaming answers.
+
+    python server.py --host 0.0.0.0 --port 8000 --workers 16
+
+All requests are served from one process, so every client querying a corpus
+shares its single in-memory index; `--workers` threads handle requests
+concurrently. Point the Streamlit UI at it with RAG_SERVICE_URL to run it as a
+thin client. If RAG_SERVICE_TOKEN is set, requests need "Authorization: Bearer <token>".
+
+Endpoints (JSON bodies and responses unless noted):
+    GET    /health
+    GET    /metrics                                   Prometheus text
+    GET    /corpora                                   all corpora
+    POST   /corpora                                   {"name"?} -> new corpus
+    GET    /corpora/<id>
+    DELETE /corpora/<id>
+    POST   /corpora/<id>/documents?name=<file name>   raw file bytes -> index them
+    DELETE /corpora/<id>/documents/<fingerprint>
+    POST   /corpora/<id>/query                        {"query", "chat_history"?, "enable_search"?,
+                                                       "sources"?, "session"?} -> text/event-stream
+    DELETE /sessions/<session>                        forget a session's conversation memory
+
+Query streams send `token` events ({"text"}), then `done` ({"trace"}: stage
+timings) or `error` ({"error"}).
+"""
+import argparse
+import hmac
+import json
+import re
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from core.config import get_setting
+from core.corpus_registry import get_corpus_registry
+from core.rag_pipeline import start_rag_response
+from core.telemetry import Trace, get_telemetry
+from core.warmup import start_warmup
+from ingestion.loader import DocumentLoadError
+
+DEFAULT_PORT = 8000
+DEFAULT_WORKERS = 16
+DEFAULT_MAX_UPLOAD_MB = 200
+
+_ROUTES = []
+
+
+def route(method, pattern):
+    """Registers a handler method for `method` requests whose path matches `pattern`."""
+    def register(fn):
+        _ROUTES.append((method, re.compile(f"^{pattern}$"), fn))
+        return fn
+    return register
+
+
+class PooledHTTPServer(HTTPServer):
+    """HTTPServer that handles each connection on a fixed pool of worker threads."""
+
+    def __init__(self, address, handler, workers=DEFAULT_WORKERS):
+        super().__init__(address, handler)
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="rag-service")
+
+    def process_request(self, request, client_address):
+        self._executor.submit(self._process, request, client_address)
+
+    def _process(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def server_close(self):
+        super().server_close()
+        self._executor.shutdown(wait=False)
+
+
+class ServiceHandler(BaseHTTPRequestHandler):
+    server_version = "RAGService/1.0"
+
+    # ---------- plumbing ----------
+
+    def _dispatch(self, method):
+        url = urlparse(self.path)
+        self.query_params = parse_qs(url.query)
+        token = get_setting("RAG_SERVICE_TOKEN")
+        if token and not hmac.compare_digest(self.headers.get("Authorization", ""), f"Bearer {token}"):
+            return self._json(401, {"error": "Missing or invalid token"})
+        for route_method, pattern, handler in _ROUTES:
+            match = pattern.match(url.path)
+            if match and route_method == method:
+                try:
+                    return handler(self, *match.groups())
+                except (BrokenPipeError, ConnectionResetError):
+                    return None
+                except Exception as e:
+                    print(f"⚠️ {method} {url.path} failed: {e}")
+                    return self._json(500, {"error": str(e)})
+        return self._json(404, {"error": f"No route for {method} {url.path}"})
+
+    def do_GET(self):
+        self._dispatch("GET")
+
+    def do_POST(self):
+        self._dispatch("POST")
+
+    def do_DELETE(self):
+        self._dispatch("DELETE")
+
+    def _read_body(self, limit):
+        length = int(self.headers.get("Content-Length") or 0)
+        if length > limit:
+            raise ValueError(f"Body of {length} bytes exceeds the {limit}-byte limit")
+        return self.rfile.read(length) if length else b""
+
+    def _read_json(self):
+        """The request body as a JSON object ({} if empty); ValueError if it is not one."""
+        body = self._read_body(limit=16 * 2 ** 20)
+        payload = json.loads(body) if body else {}
+        if not isinstance(payload, dict):
+            raise ValueError("expected a JSON object")
+        return payload
+
+    def _send(self, status, body, content_type):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _json(self, status, payload):
+        self._send(status, json.dumps(payload).encode("utf-8"), "application/json")
+
+    def _event(self, event, payload):
+        self.wfile.write(f"event: {event}\ndata: {json.dumps(payload)}\n\n".encode("utf-8"))
+        self.wfile.flush()
+
+    # ---------- endpoints ----------
+
+    @route("GET", "/health")
+    def health(self):
+        self._json(200, {"status": "ok"})
+
+    @route("GET", "/metrics")
+    def metrics(self):
+        self._send(200, get_telemetry().prometheus_text().encode("utf-8"), "text/plain; version=0.0.4")
+
+    @route("GET", "/corpora")
+    def list_corpora(self):
+        self._json(200, {"corpora": get_corpus_registry().list()})
+
+    @route("POST", "/corpora")
+    def create_corpus(self):
+        registry = get_corpus_registry()
+        try:
+            body = self._read_json()
+        except ValueError as e:
+            return self._json(400, {"error": f"Invalid JSON body: {e}"})
+        corpus_id = registry.create(body.get("name"))
+        self._json(201, registry.describe(corpus_id))
+
+    @route("GET", "/corpora/([0-9a-f]+)")
+    def get_corpus(self, corpus_id):
+        description = get_corpus_registry().describe(corpus_id)
+        if description is None:
+            return self._json(404, {"error": "No such corpus"})
+        self._json(200, description)
+
+    @route("DELETE", "/corpora/([0-9a-f]+)")
+    def delete_corpus(self, corpus_id):
+        if not get_corpus_registry().delete(corpus_id):
+            return self._json(404, {"error": "No such corpus"})
+        self._json(200, {"deleted": corpus_id})
+
+    @route("POST", "/corpora/([0-9a-f]+)/documents")
+    def add_document(self, corpus_id):
+        registry = get_corpus_registry()
+        if registry.get(corpus_id) is None:
+            return self._json(404, {"error": "No such corpus"})
+        name = (self.query_params.get("name") or [""])[0]
+        if not name:
+            return self._json(400, {"error": "Missing ?name=<file name>"})
+        limit = get_setting("SERVICE_MAX_UPLOAD_MB", DEFAULT_MAX_UPLOAD_MB, cast=int) * 2 ** 20
+        try:
+            data = self._read_body(limit)
+        except ValueError as e:
+            return self._json(413, {"error": str(e)})
+
+        try:
+            fingerprint = registry.add_document(corpus_id, name, data)
+        except DocumentLoadError as e:
+            return self._json(422, {"error": str(e)})
+        if fingerprint is None:
+            return self._json(422, {"error": f"No text could be extracted from {name}"})
+        self._json(201, {"fingerprint": fingerprint, "corpus": registry.describe(corpus_id)})
+
+    @route("DELETE", "/corpora/([0-9a-f]+)/documents/([0-9a-f]+)")
+    def remove_document(self, corpus_id, fingerprint):
+        corpus = get_corpus_registry().get(corpus_id)
+        if corpus is None:
+            return self._json(404, {"error": "No such corpus"})
+        if not corpus.remove_document(fingerprint):
+            return self._json(404, {"error": "No such document"})
+        self._json(200, {"deleted": fingerprint})
+
+    @route("DELETE", "/sessions/([0-9A-Za-z_-]+)")
+    def drop_session(self, session_id):
+        self._json(200, {"deleted": get_corpus_registry().drop_memory(session_id)})
+
+    @route("POST", "/corpora/([0-9a-f]+)/query")
+    def query(self, corpus_id):
+        registry = get_corpus_registry()
+        corpus = registry.get(corpus_id)
+        if corpus is None:
+            return self._json(404, {"error": "No such corpus"})
+        try:
+            body = self._read_json()
+        except ValueError as e:
+            return self._json(400, {"error": f"Invalid JSON body: {e}"})
+        query = (body.get("query") or "").strip()
+        if not query:
+            return self._json(400, {"error": "Missing query"})
+        sources = body.get("sources")
+        session = body.get("session")
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+
+        trace = Trace("query", corpus=corpus_id)
+        stream = None
+        try:
+            # The index must not change while it is searched: the lock covers
+            # retrieval and prompt building only, generation runs unlocked
+            with corpus.reading():
+                stream = start_rag_response(
+                    query, corpus.vectorstore, corpus.get_chunks(sources),
+                    chat_history=body.get("chat_history"), enable_search=bool(body.get("enable_search")),
+                    sources=sources, lexical_index=corpus.lexical_index, corpus_key=corpus.fingerprint,
+                    memory=registry.memory(session) if session else None, trace=trace, tables=corpus.tables,
+                )
+            for text in stream:
+                self._event("token", {"text": text})
+            self._event("done", {"trace": trace.to_dict()})
+        except (BrokenPipeError, ConnectionResetError):
+            # Client went away: stop generating (an unfinished answer is not cached)
+            if stream is not None:
+                stream.close()
+        except Exception as e:
+            print(f"⚠️ Query failed: {e}")
+            self._event("error", {"error": str(e)})
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="RAG indexing and query service.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--workers", type=int, default=get_setting("SERVICE_WORKERS", DEFAULT_WORKERS, cast=int),
+                        help="concurrent requests (each streaming query holds one)")
+    args = parser.parse_args(argv)
+
+    server = PooledHTTPServer((args.host, args.port), ServiceHandler, workers=args.workers)
+    # Load the local model and LLM clients while the first requests come in
+    start_warmup()
+    print(f"✅ RAG service listening on http://{args.host}:{args.port} ({args.workers} workers)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,7 @@
 import streamlit as st
 
+from core.telemetry import Trace, get_telemetry
+
 def render_sidebar():
     st.sidebar.header("🧭 Navigation")
 
@@ -10,3 +12,40 @@ def render_sidebar():
     )
 
     return page
+
+
+def render_timings(trace):
+    """
+    Sidebar breakdown of where the last answer's time went: a telemetry Trace,
+    or its `to_dict()` form as sent by the RAG service.
+    """
+    local = isinstance(trace, Trace)
+    if local:
+        trace = trace.to_dict() if trace.seconds is not None else None
+
+    with st.sidebar.expander("⏱️ Last query timings", expanded=True):
+        if not trace:
+            st.caption("Ask a question to see the timing breakdown.")
+            return
+        if trace.get("cached"):
+            st.caption("Answered from the answer cache.")
+
+        rows = [
+            {
+                "stage": span["span"],
+                "ms": round(span["seconds"] * 1000, 1),
+                "starts at ms": round(span.get("offset", 0.0) * 1000, 1),
+                "sizes": ", ".join(
+                    f"{v} {k}" for k, v in span.items() if k not in ("span", "seconds", "offset", "error")
+                ),
+            }
+            for span in trace["spans"]
+        ]
+        st.dataframe(rows, hide_index=True)
+        st.caption(f"Total: {trace['seconds'] * 1000:.0f} ms")
+        if local:
+            st.download_button(
+                "📈 Download metrics (Prometheus)",
+                get_telemetry().prometheus_text(),
+                file_name="rag_metrics.prom",
+            )